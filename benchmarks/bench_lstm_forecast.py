@@ -0,0 +1,79 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models.lstm_model import build_lstm_model, forecast_direct, forecast_recursive
+
+
+def predict_loop(model, window, horizon):
+    """The original forecasting loop: one model.predict call per step."""
+    look_back = window.shape[-1]
+    last_input = window.reshape(-1)
+    preds = []
+    for _ in range(horizon):
+        x_input = last_input.reshape((1, look_back, 1))
+        yhat = model.predict(x_input, verbose=0)[0][0]
+        preds.append(yhat)
+        last_input = np.append(last_input[1:], yhat)
+    return np.array(preds)
+
+
+def time_call(func, repeats):
+    """Returns per-call latencies in milliseconds after one warm-up call."""
+    func()
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies)
+
+
+def main(look_back=60, horizon=30, repeats=20, output=None):
+    # Latency does not depend on the weights, so untrained models are enough
+    rng = np.random.default_rng(0)
+    window = rng.random((1, look_back)).astype(np.float32)
+    one_step = build_lstm_model(look_back)
+    multi_output = build_lstm_model(look_back, outputs=horizon)
+
+    # The compiled recursive path must reproduce the original loop
+    max_diff = np.abs(predict_loop(one_step, window, horizon) - forecast_recursive(one_step, window, horizon)[0]).max()
+    print(f"Max |predict loop - compiled recursive|: {max_diff:.2e}")
+
+    cases = {
+        "predict_loop": lambda: predict_loop(one_step, window, horizon),
+        "recursive": lambda: forecast_recursive(one_step, window, horizon),
+        "direct": lambda: forecast_direct(multi_output, window),
+    }
+    results = {}
+    print(f"\nLatency per {horizon}-step forecast (look_back={look_back}, {repeats} runs):")
+    for name, func in cases.items():
+        latencies = time_call(func, repeats)
+        results[name] = {
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p90_ms": float(np.percentile(latencies, 90)),
+            "mean_ms": float(latencies.mean()),
+        }
+        print(f"    {name:<13} p50 {results[name]['p50_ms']:8.2f} ms   p90 {results[name]['p90_ms']:8.2f} ms")
+
+    if output:
+        with open(output, "w") as f:
+            json.dump({"look_back": look_back, "horizon": horizon, "max_diff": float(max_diff),
+                       "results": results}, f, indent=2)
+        print(f"Results saved to {output}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare LSTM forecasting latency for recursive and direct modes.")
+    parser.add_argument("--look-back", type=int, default=60)
+    parser.add_argument("--horizon", type=int, default=30)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--output", default=None, help="Optional JSON file for the results.")
+    args = parser.parse_args()
+    main(look_back=args.look_back, horizon=args.horizon, repeats=args.repeats, output=args.output)
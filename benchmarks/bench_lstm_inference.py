@@ -0,0 +1,146 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models.lstm_model import configure_cpu
+from models.model_state import DEFAULT_STATE_DIR, load_state, state_path
+
+
+def rss_mb():
+    """Current resident set size in MiB."""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def time_call(func, repeats):
+    """Returns per-call latencies in milliseconds after one warm-up call."""
+    func()
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies)
+
+
+def load_or_train(state_dir, epochs):
+    """The saved one-step LSTM and its scaler, or a freshly trained one on the cleaned data."""
+    from keras.models import load_model
+    from models.lstm_model import build_lstm_model, load_config, make_windows
+    from sklearn.preprocessing import MinMaxScaler
+    from utils.storage import load_cleaned_data
+
+    close_prices = load_cleaned_data(columns=['Close'])['Close'].interpolate()
+    state = load_state(state_dir, "LSTM")
+    if state is not None and state.get("mode", "recursive") == "recursive" and \
+            os.path.exists(state_path(state_dir, "LSTM", ".keras")):
+        print(f"Using the saved LSTM from {state_dir}.")
+        return load_model(state_path(state_dir, "LSTM", ".keras")), state["scaler"], state["look_back"], close_prices
+
+    config = load_config()
+    print(f"No saved recursive LSTM in {state_dir}; training one for {epochs} epochs.")
+    scaler = MinMaxScaler()
+    scaled = scaler.fit_transform(close_prices.values.reshape(-1, 1)).astype(np.float32)
+    X, y = make_windows(scaled, config["look_back"], holdout=30)
+    model = build_lstm_model(config["look_back"], units=config["units"], dropout=config["dropout"],
+                             learning_rate=config["learning_rate"])
+    model.fit(X, y, epochs=epochs, batch_size=config["batch_size"], verbose=0)
+    return model, scaler, config["look_back"], close_prices
+
+
+def main(state_dir=DEFAULT_STATE_DIR, horizon=30, origins=20, repeats=50, epochs=5, jit=False, output=None):
+    from models.lstm_model import build_lstm_model, fixed_shape_predictor, forecast_recursive
+    from models.lstm_tflite import TFLiteForecaster, export_tflite
+
+    model, scaler, look_back, close_prices = load_or_train(state_dir, epochs)
+    values = close_prices.to_numpy(dtype=np.float64)
+    scaled = scaler.transform(values.reshape(-1, 1)).reshape(-1).astype(np.float32)
+
+    # Forecast origins spread over the last part of the series, each with a known future
+    ends = np.linspace(len(values) - horizon - 20 * origins, len(values) - horizon, origins).astype(int)
+    windows = np.stack([scaled[end - look_back:end] for end in ends])
+    actual = np.stack([values[end:end + horizon] for end in ends])
+
+    def to_prices(preds):
+        return scaler.inverse_transform(np.asarray(preds, dtype=np.float64).reshape(-1, 1)).reshape(len(ends), -1)
+
+    # The same weights in bfloat16 compute; mixed-precision layers keep float32 variables
+    bf16 = build_lstm_model(look_back, units=model.layers[0].units, precision="mixed_bfloat16")
+    bf16.set_weights(model.get_weights())
+
+    tmp_dir = tempfile.mkdtemp()
+    keras_path = os.path.join(tmp_dir, "lstm.keras")
+    model.save(keras_path)
+
+    def tflite_case(quantize):
+        path = export_tflite(model, os.path.join(tmp_dir, f"lstm_{int(quantize)}.tflite"), look_back, quantize=quantize)
+        forecaster = TFLiteForecaster(path)
+        return (lambda w: forecaster.forecast(w, horizon)), os.path.getsize(path)
+
+    cases = {
+        "keras_recursive": lambda: (lambda w: forecast_recursive(model, w, horizon), os.path.getsize(keras_path)),
+        "fixed_shape": lambda: (fixed_shape_predictor(model, look_back, horizon), None),
+        "mixed_bfloat16": lambda: (fixed_shape_predictor(bf16, look_back, horizon), None),
+        "tflite_float32": lambda: tflite_case(False),
+        "tflite_dynamic_int8": lambda: tflite_case(True),
+    }
+    if jit:
+        cases["fixed_shape_xla"] = lambda: (fixed_shape_predictor(model, look_back, horizon, jit_compile=True), None)
+
+    results = {}
+    baseline = None
+    print(f"\n{horizon}-step forecasts from {origins} origins (look_back={look_back}, {repeats} timed runs):")
+    print(f"    {'case':<20} {'p50 ms':>8} {'p90 ms':>8} {'max|diff|':>10} {'RMSE':>8} {'RSS +MiB':>9} {'size KiB':>9}")
+    for name, make in cases.items():
+        rss_before = rss_mb()
+        try:
+            predict, size = make()
+            # Predictors with a fixed shape take one window at a time
+            preds = to_prices(np.concatenate([predict(window[np.newaxis]) for window in windows]))
+        except Exception as e:
+            print(f"    {name:<20} failed: {type(e).__name__}: {e}")
+            continue
+        latencies = time_call(lambda: predict(windows[-1:]), repeats)
+        if baseline is None:
+            baseline = preds
+        results[name] = {
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p90_ms": float(np.percentile(latencies, 90)),
+            # Price units; the first case is the reference path
+            "max_abs_diff": float(np.abs(preds - baseline).max()),
+            "rmse": float(np.sqrt(np.mean((preds - actual) ** 2))),
+            "rss_delta_mb": round(rss_mb() - rss_before, 1),
+            "size_kib": None if size is None else round(size / 1024, 1),
+        }
+        r = results[name]
+        size_text = "" if r["size_kib"] is None else f"{r['size_kib']:.0f}"
+        print(f"    {name:<20} {r['p50_ms']:8.2f} {r['p90_ms']:8.2f} {r['max_abs_diff']:10.3f} "
+              f"{r['rmse']:8.1f} {r['rss_delta_mb']:9.1f} {size_text:>9}")
+
+    if output:
+        with open(output, "w") as f:
+            json.dump({"look_back": look_back, "horizon": horizon, "origins": origins, "results": results}, f, indent=2)
+        print(f"Results saved to {output}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare LSTM inference paths: accuracy, latency and memory.")
+    parser.add_argument("--state-dir", default=DEFAULT_STATE_DIR, help="Saved LSTM to benchmark.")
+    parser.add_argument("--horizon", type=int, default=30)
+    parser.add_argument("--origins", type=int, default=20, help="Forecast origins used for the accuracy check.")
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--epochs", type=int, default=5, help="Training epochs when no saved LSTM exists.")
+    parser.add_argument("--threads", type=int, default=None, help="TensorFlow intra-op threads.")
+    parser.add_argument("--jit", action="store_true", help="Also time the XLA-compiled predictor.")
+    parser.add_argument("--output", default=None, help="Optional JSON file for the results.")
+    args = parser.parse_args()
+    configure_cpu(args.threads)
+    main(state_dir=args.state_dir, horizon=args.horizon, origins=args.origins, repeats=args.repeats,
+         epochs=args.epochs, jit=args.jit, output=args.output)
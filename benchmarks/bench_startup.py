@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Entry points whose import cost is paid before any work starts
+ENTRY_POINTS = ("evaluation.evaluate_models", "pipeline")
+
+# Packages that should only be imported by the models that need them
+HEAVY_PACKAGES = ("tensorflow", "keras", "prophet", "cmdstanpy", "pmdarima", "statsmodels", "sklearn", "matplotlib")
+
+# Default budget for importing an entry point and resolving one model
+DEFAULT_TARGET_MS = 1000
+
+
+def parse_importtime(stderr):
+    """
+    Parses `python -X importtime` output.
+
+    Returns:
+        tuple: (total_us, modules) where total_us sums the cumulative time of top-level
+            imports and modules maps module name -> (self_us, cumulative_us).
+    """
+    total = 0
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        self_us, cumulative_us = int(self_us), int(cumulative_us)
+        if len(name) - len(name.lstrip()) == 1:  # nested imports are indented further
+            total += cumulative_us
+        modules[name.strip()] = (self_us, cumulative_us)
+    return total, modules
+
+
+def measure_startup(entry, models):
+    """Imports `entry` and resolves the selected models' run functions in a fresh interpreter."""
+    code = f"import {entry}\nfrom models.registry import get_model\n"
+    code += "".join(f"get_model({name!r})\n" for name in models)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [PROJECT_ROOT, os.environ.get("PYTHONPATH")])))
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=PROJECT_ROOT, env=env,
+                          capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing {entry} failed:\n{proc.stderr[-2000:]}")
+    total_us, modules = parse_importtime(proc.stderr)
+    heavy = sorted({name.split(".")[0] for name in modules if name.split(".")[0] in HEAVY_PACKAGES})
+    return wall_ms, total_us / 1000, modules, heavy
+
+
+def main(models=("ARIMA",), entries=ENTRY_POINTS, repeats=5, target_ms=DEFAULT_TARGET_MS, top=10, output=None):
+    results = {}
+    within_target = True
+    for entry in entries:
+        walls, imports = [], []
+        for _ in range(repeats):
+            wall_ms, import_ms, modules, heavy = measure_startup(entry, models)
+            walls.append(wall_ms)
+            imports.append(import_ms)
+        wall_p50 = float(np.median(walls))
+        import_p50 = float(np.median(imports))
+        slowest = sorted(modules.items(), key=lambda item: item[1][0], reverse=True)[:top]
+        results[entry] = {
+            "wall_ms": wall_p50,
+            "import_ms": import_p50,
+            "heavy_packages": heavy,
+            "slowest_modules_ms": {name: self_us / 1000 for name, (self_us, _) in slowest},
+        }
+        ok = wall_p50 <= target_ms
+        within_target &= ok
+        print(f"\n{entry} with {', '.join(models)} ({repeats} runs): "
+              f"startup {wall_p50:.0f} ms, imports {import_p50:.0f} ms "
+              f"[{'OK' if ok else 'OVER'} target {target_ms} ms]")
+        print(f"    Heavy packages imported: {', '.join(heavy) if heavy else 'none'}")
+        print("    Slowest modules (self time):")
+        for name, (self_us, _) in slowest:
+            print(f"        {self_us / 1000:8.1f} ms  {name}")
+
+    if output:
+        with open(output, "w") as f:
+            json.dump({"models": list(models), "target_ms": target_ms, "results": results}, f, indent=2)
+        print(f"Results saved to {output}")
+    return within_target
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure entry-point startup time with python -X importtime.")
+    parser.add_argument("--models", default="arima", help="Comma-separated models the run selects.")
+    parser.add_argument("--entries", default=",".join(ENTRY_POINTS), help="Comma-separated modules to import.")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--target-ms", type=float, default=DEFAULT_TARGET_MS,
+                        help="Startup budget; the script exits non-zero if any entry point exceeds it.")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest modules to list.")
+    parser.add_argument("--output", default=None, help="Optional JSON file for the results.")
+    args = parser.parse_args()
+
+    sys.path.append(PROJECT_ROOT)
+    from models.registry import parse_models
+
+    ok = main(models=parse_models(args.models), entries=[e.strip() for e in args.entries.split(",") if e.strip()],
+              repeats=args.repeats, target_ms=args.target_ms, top=args.top, output=args.output)
+    sys.exit(0 if ok else 1)
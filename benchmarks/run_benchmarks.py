@@ -0,0 +1,261 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROJECT_ROOT)
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+DEFAULT_OUTPUT = "outputs/benchmarks/results.json"
+RESULT_PREFIX = "BENCH_RESULT "
+
+# Largest series each case runs on by default (--no-caps lifts them). Preprocessing
+# needs one row per calendar day, and pandas timestamps only span ~213k days.
+CASE_CAPS = {
+    "preprocess": 100_000,
+    "arima": 100_000,
+    "sarima": 10_000,
+    "prophet": 100_000,
+    "lstm": 1_000,  # 50 training epochs take minutes even at 1k points
+    "evaluate_forecast": 1_000_000,
+    "plot": 1_000_000,
+}
+CASES = tuple(CASE_CAPS)
+
+# Fixed orders, so the benchmark times fitting rather than the order search
+ARIMA_ORDER = (2, 1, 2)
+SARIMA_ORDER = ((1, 1, 1), (1, 0, 1, 7))
+
+# Compare mode flags a metric when it is this much worse than the baseline
+DEFAULT_TOLERANCE = 0.25
+# ...and the absolute difference exceeds the noise floor
+NOISE_FLOOR = {"wall_s": 0.05, "peak_rss_mb": 20.0}
+
+
+def synthetic_prices(n, seed=0):
+    """
+    Geometric random walk with weekly seasonality, as a Close price series.
+
+    Daily dates are used while they fit in the pandas timestamp range, hourly beyond.
+    """
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(0.0003, 0.01, n) + 0.002 * np.sin(2 * np.pi * np.arange(n) / 7)
+    prices = 10_000 * np.exp(np.cumsum(steps))
+    freq = 'D' if n <= 200_000 else 'h'
+    index = pd.date_range("1700-01-01", periods=n, freq=freq, name="Date")
+    return pd.Series(prices, index=index, name="Close")
+
+
+def write_yahoo_csv(prices, path):
+    """Writes prices in the raw Yahoo Finance export format (newest first, formatted numbers)."""
+    fmt = "{:,.2f}".format
+    df = pd.DataFrame({
+        "Date": prices.index.strftime("%b %d, %Y"),
+        "Open": prices.map(fmt).values,
+        "High": (prices * 1.01).map(fmt).values,
+        "Low": (prices * 0.99).map(fmt).values,
+        "Close": prices.map(fmt).values,
+        "Adj Close": prices.map(fmt).values,
+        "Volume": (prices * 1000).astype(np.int64).map("{:,}".format).values,
+    })
+    df.iloc[::-1].to_csv(path, index=False)
+
+
+def setup_case(case, size):
+    """Prepares inputs in the current (scratch) directory; returns the timed callable."""
+    prices = synthetic_prices(size)
+
+    if case == "preprocess":
+        from data_preprocess import preprocess_yahoo_data
+
+        write_yahoo_csv(prices, "yahoo_data.csv")
+        return lambda: preprocess_yahoo_data("yahoo_data.csv", "data/cleaned_data.parquet")
+    if case == "arima":
+        from models.arima_model import run_arima
+
+        return lambda: run_arima(prices, order=ARIMA_ORDER, use_cache=False)
+    if case == "sarima":
+        from models.sarima_model import run_sarima
+
+        return lambda: run_sarima(prices, order=SARIMA_ORDER[0], seasonal_order=SARIMA_ORDER[1], use_cache=False)
+    if case == "prophet":
+        from models.prophet_model import run_prophet
+
+        return lambda: run_prophet(prices.to_frame())
+    if case == "lstm":
+        from models.lstm_model import run_lstm
+
+        return lambda: run_lstm(prices)
+    if case == "evaluate_forecast":
+        from utils.helpers import evaluate_forecast
+
+        actual = prices.to_numpy()
+        forecast = actual * (1 + np.random.default_rng(1).normal(0, 0.01, size))
+        return lambda: evaluate_forecast(actual, forecast)
+    if case == "plot":
+        from evaluation import plot_models
+        from utils.storage import forecast_path, write_table
+
+        write_table(prices.to_frame(), "data/cleaned_data.parquet")
+        for name in ("ARIMA", "SARIMA", "Prophet", "LSTM"):
+            write_table(pd.Series(prices.to_numpy()[-30:] * 1.01, name="Forecast"), forecast_path(name))
+        return plot_models.main
+    raise ValueError(f"Unknown benchmark case: {case}")
+
+
+def _rss_mb(kilobytes):
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return kilobytes / (1024 * 1024) if sys.platform == "darwin" else kilobytes / 1024
+
+
+def run_case(case, size):
+    """Runs one case in this process and returns its measurements."""
+    warnings.simplefilter("ignore")
+    os.makedirs("data", exist_ok=True)
+    os.makedirs("outputs/forecasts", exist_ok=True)
+    func = setup_case(case, size)
+    rss_before = _rss_mb(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+    self_before = resource.getrusage(resource.RUSAGE_SELF)
+    children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+    func()
+    wall = time.perf_counter() - start
+    self_after = resource.getrusage(resource.RUSAGE_SELF)
+    children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    cpu = sum(after.ru_utime - before.ru_utime + after.ru_stime - before.ru_stime
+              for before, after in ((self_before, self_after), (children_before, children_after)))
+    return {
+        "wall_s": wall,
+        "cpu_s": cpu,
+        # > 1 when several cores are busy
+        "cpu_util": cpu / wall if wall > 0 else 0.0,
+        "peak_rss_mb": _rss_mb(self_after.ru_maxrss),
+        "setup_rss_mb": rss_before,
+        "children_peak_rss_mb": _rss_mb(children_after.ru_maxrss),
+    }
+
+
+def measure(case, size, timeout=None):
+    """Runs a case in a fresh interpreter inside a scratch directory, so peak RSS is per case."""
+    env = dict(os.environ, CUDA_VISIBLE_DEVICES="", TF_CPP_MIN_LOG_LEVEL="2")
+    with tempfile.TemporaryDirectory(prefix=f"bench_{case}_") as workdir:
+        cmd = [sys.executable, os.path.abspath(__file__), "--run-case", case, "--size", str(size)]
+        try:
+            proc = subprocess.run(cmd, cwd=workdir, env=env, capture_output=True, text=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return {"status": "timeout", "error": f"exceeded {timeout}s"}
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith(RESULT_PREFIX):
+            return {"status": "ok", **json.loads(line[len(RESULT_PREFIX):])}
+    return {"status": "error", "error": (proc.stderr or proc.stdout)[-2000:]}
+
+
+def run_suite(cases=CASES, sizes=DEFAULT_SIZES, caps=True, timeout=None, output=DEFAULT_OUTPUT):
+    """
+    Benchmarks every case at every size and writes the results as JSON.
+
+    Returns:
+        dict: {'meta': ..., 'results': [{'case', 'size', 'status', 'wall_s', 'cpu_s',
+            'cpu_util', 'peak_rss_mb', ...}]}
+    """
+    results = []
+    for case in cases:
+        for size in sizes:
+            if caps and size > CASE_CAPS[case]:
+                results.append({"case": case, "size": size, "status": "skipped"})
+                continue
+            print(f"Running {case} on {size:,} points...", flush=True)
+            record = {"case": case, "size": size, **measure(case, size, timeout=timeout)}
+            results.append(record)
+            if record["status"] == "ok":
+                print(f"    {record['wall_s']:9.3f}s  cpu {record['cpu_util']:5.2f}x  "
+                      f"peak RSS {record['peak_rss_mb']:8.1f} MB")
+            else:
+                print(f"    {record['status']}: {record['error'].strip().splitlines()[-1] if record['error'] else ''}")
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "caps": CASE_CAPS if caps else None,
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {output}")
+    return report
+
+
+def compare(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Flags cases that got slower or use more memory than in the baseline report.
+
+    Returns:
+        list: (case, size, metric, baseline, current) for every regression.
+    """
+    previous = {(r["case"], r["size"]): r for r in baseline["results"] if r["status"] == "ok"}
+    regressions = []
+    print(f"\nComparison against baseline from {baseline['meta'].get('timestamp', '?')} "
+          f"(tolerance {tolerance:.0%}):")
+    for record in report["results"]:
+        old = previous.get((record["case"], record["size"]))
+        if old is None or record["status"] != "ok":
+            continue
+        for metric, floor in NOISE_FLOOR.items():
+            ratio = record[metric] / old[metric] if old[metric] else float("inf")
+            regressed = ratio > 1 + tolerance and record[metric] - old[metric] > floor
+            flag = "REGRESSION" if regressed else ""
+            print(f"    {record['case']:<18} {record['size']:>9,}  {metric:<12} "
+                  f"{old[metric]:10.3f} -> {record[metric]:10.3f}  ({ratio:5.2f}x) {flag}")
+            if regressed:
+                regressions.append((record["case"], record["size"], metric, old[metric], record[metric]))
+    print(f"{len(regressions)} regression(s) found.")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark preprocessing, models, metrics and plotting.")
+    parser.add_argument("--cases", default=",".join(CASES), help="Comma-separated cases to run.")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="Comma-separated series lengths.")
+    parser.add_argument("--no-caps", action="store_true", help="Run every case at every size.")
+    parser.add_argument("--timeout", type=float, default=1800, help="Per-case timeout in seconds.")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--compare", default=None, help="Baseline JSON to check for regressions.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--run-case", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        # Worker mode: one measurement in this fresh process
+        print(RESULT_PREFIX + json.dumps(run_case(args.run_case, args.size)))
+        sys.exit(0)
+
+    cases = [c.strip() for c in args.cases.split(",") if c.strip()]
+    unknown = [c for c in cases if c not in CASES]
+    if unknown:
+        parser.error(f"Unknown cases: {unknown}. Available: {', '.join(CASES)}")
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    output = os.path.join(PROJECT_ROOT, args.output) if not os.path.isabs(args.output) else args.output
+    report = run_suite(cases, sizes, caps=not args.no_caps, timeout=args.timeout, output=output)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        sys.exit(1 if compare(report, baseline, tolerance=args.tolerance) else 0)
@@ -1,22 +1,50 @@
 import pandas as pd
+import numpy as np
 import os
+import shutil
+import tempfile
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.storage import CLEANED_DATA_PATH, IPC_EXTENSIONS, write_table
+from utils.tracing import traced
+
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Adj Close']
+
+
+def _to_number(col):
+    """Convert a column of (possibly comma-formatted) numbers to floats."""
+    if not pd.api.types.is_numeric_dtype(col):
+        col = col.astype(str).str.replace(',', '', regex=False)
+    return pd.to_numeric(col, errors='coerce')
 
-def preprocess_yahoo_data(input_path="data/yahoo_data.csv", output_path="data/cleaned_data.csv"):
-    # Load the CSV file
-    df = pd.read_csv(input_path)
+
+def clean_yahoo_frame(df, date_format="%b %d, %Y"):
+    """
+    Clean a Yahoo Finance style frame into a daily series indexed by Date.
+
+    Parameters:
+        df (pd.DataFrame): Raw rows with Date, Open, High, Low, Close, Adj Close, Volume.
+        date_format (str or None): Format of the Date column; None lets pandas infer it.
+
+    Returns:
+        pd.DataFrame: Daily-frequency frame with interpolated Close prices.
+    """
+    df = df.copy()
 
     # Convert 'Date' to datetime
-    df['Date'] = pd.to_datetime(df['Date'], format="%b %d, %Y")
+    df['Date'] = pd.to_datetime(df['Date'], format=date_format)
 
     # Sort by date ascending
     df.sort_values('Date', inplace=True)
 
     # Remove commas and convert numeric columns
-    for col in ['Open', 'High', 'Low', 'Close', 'Adj Close']:
-        df[col] = pd.to_numeric(df[col].str.replace(',', '', regex=False), errors='coerce')
+    for col in PRICE_COLUMNS:
+        df[col] = _to_number(df[col])
 
     # Convert Volume to float (from Indian-format strings)
-    df['Volume'] = pd.to_numeric(df['Volume'].str.replace(',', '', regex=False), errors='coerce')
+    df['Volume'] = _to_number(df['Volume'])
 
     # Set Date as index and convert to daily frequency
     df.set_index('Date', inplace=True)
@@ -27,13 +55,248 @@ def preprocess_yahoo_data(input_path="data/yahoo_data.csv", output_path="data/cl
 
     # Drop rows where 'Close' is still missing (beginning or end of data)
     df.dropna(subset=['Close'], inplace=True)
+    return df
+
+
+def _parse_chunk(chunk, date_format):
+    """Parse dates and numbers of one raw chunk and sort it by date."""
+    chunk['Date'] = pd.to_datetime(chunk['Date'], format=date_format)
+    # Cells the C parser could not read as numbers are still strings; strip commas there
+    for col in PRICE_COLUMNS + ['Volume']:
+        chunk[col] = _to_number(chunk[col])
+    return chunk.sort_values('Date', kind='mergesort').reset_index(drop=True)
+
+
+def _iter_run(path, batch_rows):
+    """Yield a sorted run file back in blocks."""
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_rows):
+        yield batch.to_pandas()
+
+
+def _merge_runs(paths, batch_rows):
+    """
+    K-way merge of date-sorted run files, yielding date-sorted blocks.
+
+    Each step emits every buffered row up to the smallest "last buffered date"
+    among the runs that still have data, so only one block per run is in memory.
+    """
+    iters = [_iter_run(path, batch_rows) for path in paths]
+    buffers = [next(it, None) for it in iters]
+    while True:
+        # Refill drained buffers; drop finished runs
+        for i, it in enumerate(iters):
+            while buffers[i] is not None and buffers[i].empty:
+                buffers[i] = next(it, None)
+        active = [i for i, buf in enumerate(buffers) if buf is not None]
+        if not active:
+            return
+
+        bound = min(buffers[i]['Date'].iloc[-1] for i in active)
+        parts = []
+        for i in active:
+            n_take = int(np.searchsorted(buffers[i]['Date'].to_numpy(), bound.to_datetime64(), side='right'))
+            parts.append(buffers[i].iloc[:n_take])
+            buffers[i] = buffers[i].iloc[n_take:]
+        block = pd.concat(parts, ignore_index=True)
+        yield block.sort_values('Date', kind='mergesort')
+
+
+def _duplicate_error():
+    return ValueError("cannot reindex on an axis with duplicate labels")
+
+
+def _daily_blocks(blocks):
+    """Reindex date-sorted blocks onto one continuous daily calendar (streaming asfreq('D'))."""
+    prev_date = None
+    for block in blocks:
+        if block.empty:
+            continue
+        dates = block['Date']
+        if dates.duplicated().any() or (prev_date is not None and dates.iloc[0] <= prev_date):
+            raise _duplicate_error()
+        start = dates.iloc[0] if prev_date is None else prev_date + pd.Timedelta(days=1)
+        index = pd.date_range(start, dates.iloc[-1], freq='D', name='Date')
+        prev_date = dates.iloc[-1]
+        yield block.set_index('Date').reindex(index)
+
+
+def _interpolate_stream(blocks):
+    """
+    Linear interpolation of Close across block boundaries, then drop rows without Close.
+
+    Rows after the last known Close are held back until the next known value arrives,
+    so every gap is interpolated between the same two points as on the full series.
+    Leading missing values are dropped; trailing ones take the last known value,
+    as Series.interpolate(method='linear') followed by dropna does.
+    """
+    pending = None
+    last_value = None
+    for block in blocks:
+        frame = block if pending is None else pd.concat([pending, block])
+        close = frame['Close'].to_numpy(dtype=np.float64)
+        valid = np.flatnonzero(~np.isnan(close))
+        if len(valid) == 0:
+            # Still no Close after the last known one: keep waiting (or drop leading rows)
+            pending = frame if last_value is not None else None
+            continue
+
+        xp, fp = valid, close[valid]
+        if last_value is not None:
+            xp = np.concatenate(([-1], xp))
+            fp = np.concatenate(([last_value], fp))
+        out = frame.iloc[:valid[-1] + 1].copy()
+        positions = np.arange(len(out))
+        missing = np.isnan(close[:len(out)])
+        if last_value is None:
+            # Leading rows before the first known Close are dropped
+            missing &= positions > valid[0]
+        out.loc[missing, 'Close'] = np.interp(positions[missing], xp, fp)
+        keep = ~np.isnan(out['Close'].to_numpy(dtype=np.float64))
+        yield out[keep]
+
+        pending = frame.iloc[valid[-1] + 1:]
+        last_value = fp[-1]
+
+    if pending is not None and len(pending) and last_value is not None:
+        out = pending.copy()
+        out['Close'] = last_value
+        yield out
+
+
+class _StreamWriter:
+    """Appends DataFrame blocks to a CSV, Parquet or Arrow IPC file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = f"{path}.{os.getpid()}.tmp"
+        self.writer = None
+        self.sink = None
+        self.schema = None
+        self.first = True
+
+    def write(self, df):
+        if self.path.endswith(".csv"):
+            df.to_csv(self.tmp_path, mode='w' if self.first else 'a', header=self.first)
+        else:
+            table = pa.Table.from_pandas(df, preserve_index=True)
+            if self.writer is None:
+                self.schema = table.schema
+                if self.path.endswith(IPC_EXTENSIONS):
+                    self.sink = pa.OSFile(self.tmp_path, "wb")
+                    self.writer = pa.ipc.new_file(self.sink, self.schema)
+                else:
+                    self.writer = pq.ParquetWriter(self.tmp_path, self.schema)
+            self.writer.write_table(table.cast(self.schema))
+        self.first = False
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        if self.sink is not None:
+            self.sink.close()
+        os.replace(self.tmp_path, self.path)
+
+
+def preprocess_yahoo_data_streaming(input_path="data/yahoo_data.csv", output_path=CLEANED_DATA_PATH,
+                                    chunksize=1_000_000, date_format="%b %d, %Y", tmp_dir=None):
+    """
+    Out-of-core version of `preprocess_yahoo_data` with flat peak memory.
+
+    The export is read in chunks; comma-formatted numbers are parsed by the C parser
+    (`thousands=','`) instead of per-cell string replacement. Each chunk is sorted
+    and spilled to a temporary Parquet run, the runs are merged by date, and the
+    merged stream is reindexed to daily frequency, interpolated and appended to the
+    output block by block. The output is identical to `preprocess_yahoo_data`.
+
+    Returns:
+        str: The output path.
+    """
+    tmp_dir = tempfile.mkdtemp(prefix="preprocess_", dir=tmp_dir)
+    try:
+        # Pass 1: parse, sort and spill chunks; track what decides the output dtypes
+        runs = []
+        int_columns = None
+        n_rows, first_date, last_date = 0, None, None
+        for i, chunk in enumerate(pd.read_csv(input_path, chunksize=chunksize, thousands=',')):
+            chunk = _parse_chunk(chunk, date_format)
+            numeric = PRICE_COLUMNS + ['Volume']
+            chunk_ints = {c for c in numeric if pd.api.types.is_integer_dtype(chunk[c])}
+            int_columns = chunk_ints if int_columns is None else int_columns & chunk_ints
+            n_rows += len(chunk)
+            if len(chunk):
+                lo, hi = chunk['Date'].iloc[0], chunk['Date'].iloc[-1]
+                first_date = lo if first_date is None else min(first_date, lo)
+                last_date = hi if last_date is None else max(last_date, hi)
+            run_path = os.path.join(tmp_dir, f"run_{i:05d}.parquet")
+            pq.write_table(pa.Table.from_pandas(chunk, preserve_index=False), run_path)
+            runs.append(run_path)
+
+        # Like the in-memory path, integer columns only stay integers when the
+        # calendar has no gaps (otherwise asfreq introduces NaN)
+        no_gaps = n_rows > 0 and (last_date - first_date).days + 1 == n_rows
+        dtypes = {c: (np.int64 if no_gaps and c in int_columns else np.float64)
+                  for c in PRICE_COLUMNS + ['Volume']}
+
+        # Pass 2: merge runs and stream the daily, interpolated rows to the output
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        writer = _StreamWriter(output_path)
+        wrote = False
+        try:
+            # Split the memory budget of one chunk across the runs being merged
+            batch_rows = min(chunksize, max(1024, chunksize // max(len(runs), 1)))
+            blocks = _interpolate_stream(_daily_blocks(_merge_runs(runs, batch_rows)))
+            for block in blocks:
+                if block.empty:
+                    continue
+                block = block.astype(dtypes)
+                block.index.freq = None
+                writer.write(block)
+                wrote = True
+            if not wrote:
+                empty = pd.DataFrame(columns=list(dtypes)).astype(dtypes)
+                empty.index = pd.DatetimeIndex([], name='Date')
+                writer.write(empty)
+        finally:
+            writer.close()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print(f"Cleaned data saved to: {output_path}")
+    return output_path
+
+
+@traced("preprocess_yahoo_data")
+def preprocess_yahoo_data(input_path="data/yahoo_data.csv", output_path=CLEANED_DATA_PATH, chunksize=None):
+    """
+    Clean a Yahoo Finance CSV export and save it.
+
+    With `chunksize` set, the file is processed out of core by
+    `preprocess_yahoo_data_streaming` (same output, flat memory) and the output
+    path is returned instead of the cleaned frame.
+    """
+    if chunksize is not None:
+        return preprocess_yahoo_data_streaming(input_path, output_path, chunksize=chunksize)
+
+    # Load the CSV file
+    df = pd.read_csv(input_path)
+
+    df = clean_yahoo_frame(df)
 
     # Ensure output directory exists
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-    # Save cleaned data
-    df.to_csv(output_path)
+    # Save cleaned data (Parquet, Arrow or CSV by extension)
+    write_table(df, output_path)
     print(f"Cleaned data saved to: {output_path}")
+    return df
 
 if __name__ == "__main__":
-    preprocess_yahoo_data()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Clean a Yahoo Finance CSV export.")
+    parser.add_argument("--input", default="data/yahoo_data.csv")
+    parser.add_argument("--output", default=CLEANED_DATA_PATH)
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="Process the file out of core in chunks of this many rows.")
+    args = parser.parse_args()
+    preprocess_yahoo_data(args.input, args.output, chunksize=args.chunksize)
@@ -0,0 +1,339 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# Ensure project root is in path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from evaluation.scheduler import run_parallel
+from utils.metrics import METRIC_NAMES, mase_scale, metrics_frame
+from utils.storage import load_cleaned_data, write_table
+
+DEFAULT_OUTPUT_DIR = "outputs/backtest"
+BACKTEST_MODELS = ("ARIMA", "SARIMA", "Prophet", "LSTM")
+
+
+def make_origins(n_obs, horizon=30, step=30, n_folds=5, min_train=None):
+    """
+    Training-end positions of the backtest folds, oldest first.
+
+    The last fold forecasts the final `horizon` observations; earlier folds move
+    back by `step`. Folds with fewer than `min_train` training rows are dropped.
+    """
+    if min_train is None:
+        min_train = max(3 * horizon, 100)
+    last = n_obs - horizon
+    origins = [last - k * step for k in range(n_folds)]
+    origins = [origin for origin in origins if origin >= min_train]
+    if not origins:
+        raise ValueError(f"Series of {n_obs} rows is too short for a {horizon}-step backtest "
+                         f"with at least {min_train} training rows.")
+    return origins[::-1]
+
+
+def split_blocks(origins, n_blocks):
+    """Splits origins into contiguous blocks, so each worker walks forward through its own folds."""
+    n_blocks = max(1, min(n_blocks, len(origins)))
+    return [list(block) for block in np.array_split(origins, n_blocks)]
+
+
+def _train_slice(origin, window, train_size):
+    start = 0 if window == "expanding" else max(0, origin - train_size)
+    return slice(start, origin)
+
+
+def _statespace_folds(data, origins, horizon, window, train_size, fit):
+    """
+    ARIMA/SARIMA folds. The first fold is fitted; later folds keep its parameters
+    and only run the Kalman filter over the new rows (`append`), or over the new
+    window when it rolls (`apply`).
+    """
+    model_fit = None
+    previous = None
+    for origin in origins:
+        train = data.iloc[_train_slice(origin, window, train_size)]
+        if model_fit is None:
+            model_fit = fit(train)
+        elif window == "expanding":
+            model_fit = model_fit.append(data.iloc[previous:origin], refit=False)
+        else:
+            model_fit = model_fit.apply(train, refit=False)
+        previous = origin
+        yield origin, np.asarray(model_fit.forecast(steps=horizon), dtype=np.float64)
+
+
+def _prophet_folds(data, origins, horizon, window, train_size):
+    """Prophet folds, each fit warm-started from the previous fold's parameters."""
+    from models.prophet_model import make_prophet, stan_init
+
+    init = None
+    for origin in origins:
+        train = data.iloc[_train_slice(origin, window, train_size)]
+        df = pd.DataFrame({'ds': train.index, 'y': train.values})
+        model = make_prophet()
+        if init is None:
+            model.fit(df)
+        else:
+            model.fit(df, init=init)
+        init = stan_init(model)
+
+        future = pd.DataFrame({'ds': data.index[origin:origin + horizon]})
+        yield origin, model.predict(future)['yhat'].to_numpy(dtype=np.float64)
+
+
+def _lstm_folds(data, origins, horizon, window, train_size, config=None, epochs=None, fine_tune_epochs=3):
+    """
+    LSTM folds. The first fold trains from scratch; later folds fine-tune the same
+    network on the most recent windows, unless the new data leaves the scaling range.
+    """
+    from sklearn.preprocessing import MinMaxScaler
+    from models.lstm_model import FINE_TUNE_SAMPLES, build_lstm_model, forecast_recursive, load_config, make_windows
+
+    config = config or load_config()
+    look_back, batch_size = config["look_back"], config["batch_size"]
+    epochs = epochs or config["epochs"]
+    model = None
+    scaler = None
+    for origin in origins:
+        train = data.iloc[_train_slice(origin, window, train_size)].values
+        if scaler is not None and (train.min() < scaler.data_min_[0] or train.max() > scaler.data_max_[0]):
+            model = None
+        if model is None:
+            scaler = MinMaxScaler()
+            scaled = scaler.fit_transform(train.reshape(-1, 1))
+            X, y = make_windows(scaled, look_back, holdout=0)
+            model = build_lstm_model(look_back, units=config["units"], dropout=config["dropout"],
+                                     learning_rate=config["learning_rate"])
+            model.fit(X, y, epochs=epochs, batch_size=batch_size, verbose=0)
+        else:
+            scaled = scaler.transform(train.reshape(-1, 1))
+            X, y = make_windows(scaled, look_back, holdout=0)
+            model.fit(X[-FINE_TUNE_SAMPLES:], y[-FINE_TUNE_SAMPLES:], epochs=fine_tune_epochs,
+                      batch_size=batch_size, verbose=0)
+
+        preds = forecast_recursive(model, scaled[-look_back:].reshape(1, look_back), horizon)[0]
+        yield origin, scaler.inverse_transform(preds.reshape(-1, 1)).flatten()
+
+
+def backtest_block(model, data, origins, horizon, window="expanding", train_size=None, params=None):
+    """
+    Runs a contiguous block of folds for one model, reusing fitted state between folds.
+
+    Parameters:
+        model (str): One of BACKTEST_MODELS.
+        data (pd.Series): Full daily series.
+        origins (list): Training-end positions, in increasing order.
+        horizon (int): Forecast steps per fold.
+        window (str): 'expanding' trains on all rows before the origin; 'rolling'
+            on the last `train_size` rows.
+        train_size (int or None): Rolling window length.
+        params (dict or None): Model settings (orders for ARIMA/SARIMA, LSTM configuration and epochs).
+
+    Returns:
+        list: One dict per fold with keys 'origin', 'forecast' and 'seconds'.
+    """
+    params = params or {}
+    if model == "ARIMA":
+        from models.arima_model import fit_arima
+        folds = _statespace_folds(data, origins, horizon, window, train_size,
+                                  lambda train: fit_arima(train, params["order"]))
+    elif model == "SARIMA":
+        from models.sarima_model import fit_sarima
+        folds = _statespace_folds(data, origins, horizon, window, train_size,
+                                  lambda train: fit_sarima(train, params["order"], params["seasonal_order"]))
+    elif model == "Prophet":
+        folds = _prophet_folds(data, origins, horizon, window, train_size)
+    elif model == "LSTM":
+        folds = _lstm_folds(data, origins, horizon, window, train_size, **params)
+    else:
+        raise ValueError(f"Unknown backtest model: {model}")
+
+    results = []
+    started = time.perf_counter()
+    for origin, forecast in folds:
+        now = time.perf_counter()
+        results.append({"origin": origin, "forecast": forecast, "seconds": now - started})
+        started = now
+    return results
+
+
+def select_orders(data, origin, window, train_size, models, search_method="stepwise"):
+    """Chooses ARIMA/SARIMA orders once, on the first fold's training data."""
+    from models.order_search import search_order
+
+    train = data.iloc[_train_slice(origin, window, train_size)]
+    params = {}
+    if "ARIMA" in models:
+        order, _ = search_order(train, seasonal=False, method=search_method)
+        params["ARIMA"] = {"order": order}
+        print(f"Backtest ARIMA order: {order}")
+    if "SARIMA" in models:
+        order, seasonal_order = search_order(train, seasonal=True, m=7, method=search_method)
+        params["SARIMA"] = {"order": order, "seasonal_order": seasonal_order}
+        print(f"Backtest SARIMA order: {order} seasonal_order: {seasonal_order}")
+    return params
+
+
+def summarize(fold_metrics):
+    """Aggregates per-fold metrics into mean/std per model."""
+    summary = fold_metrics.groupby("Model", sort=False).agg(
+        **{name: (name, "mean") for name in METRIC_NAMES},
+        **{f"{name} Std": (name, "std") for name in ("MAE", "RMSE")},
+        Folds=("Fold", "count"),
+    )
+    return summary.reset_index()
+
+
+def run_backtest(data, models=BACKTEST_MODELS, horizon=30, step=30, n_folds=5, window="expanding",
+                 train_size=None, min_train=None, workers=None, threads_per_worker=None, timeout=None,
+                 blocks_per_model=None, lstm_epochs=None, output_dir=DEFAULT_OUTPUT_DIR):
+    """
+    Rolling-origin (walk-forward) backtest of the forecasting models.
+
+    Each model is evaluated at `n_folds` origins spaced `step` rows apart, forecasting
+    `horizon` rows after each. Folds are split into contiguous blocks that run in
+    parallel worker processes; within a block, later folds reuse the state fitted
+    for the earlier ones.
+
+    Parameters:
+        data (pd.Series): Time series (e.g., Close prices) with a datetime index.
+        models (iterable): Models to backtest, from BACKTEST_MODELS.
+        horizon (int): Forecast steps per fold.
+        step (int): Rows between consecutive origins.
+        n_folds (int): Number of origins.
+        window (str): 'expanding' or 'rolling' training window.
+        train_size (int or None): Rolling window length. Defaults to the first origin.
+        min_train (int or None): Minimum training rows for a fold.
+        workers (int or None): Concurrent worker processes.
+        threads_per_worker (int or None): BLAS/TensorFlow thread cap per worker.
+        timeout (float or None): Per-block time limit in seconds.
+        blocks_per_model (int or None): Fold blocks per model. More blocks add parallelism
+            but each block starts with a full fit. Defaults to spreading the workers
+            evenly across models.
+        lstm_epochs (int or None): Training epochs for each LSTM block's first fold. Defaults
+            to the tuned LSTM configuration (see models/lstm_tuning.py), like the other
+            LSTM hyperparameters.
+        output_dir (str): Where fold_metrics, fold_forecasts and summary tables are written.
+
+    Returns:
+        tuple: (fold_metrics, summary) DataFrames.
+    """
+    if window not in ("expanding", "rolling"):
+        raise ValueError(f"Unknown backtest window: {window}")
+    unknown = [m for m in models if m not in BACKTEST_MODELS]
+    if unknown:
+        raise ValueError(f"Unknown backtest models: {unknown}")
+
+    # Ensure datetime index with proper frequency, as the models do
+    if data.index.inferred_freq is None:
+        data = data.asfreq('D').interpolate()
+
+    origins = make_origins(len(data), horizon=horizon, step=step, n_folds=n_folds, min_train=min_train)
+    if window == "rolling" and train_size is None:
+        train_size = origins[0]
+    workers = workers or os.cpu_count() or 1
+    if blocks_per_model is None:
+        blocks_per_model = max(1, workers // len(models))
+    print(f"Backtesting {', '.join(models)} over {len(origins)} folds "
+          f"(horizon {horizon}, step {step}, {window} window)...")
+
+    params = select_orders(data, origins[0], window, train_size, models)
+    if "LSTM" in models:
+        from models.lstm_model import load_config
+
+        params["LSTM"] = {"config": load_config(), "epochs": lstm_epochs}
+
+    tasks = []
+    for model in models:
+        for i, block in enumerate(split_blocks(origins, blocks_per_model)):
+            tasks.append((f"{model}-{i}", backtest_block,
+                          (model, data, block, horizon, window, train_size, params.get(model)), {}))
+
+    def on_result(record):
+        if record["status"] != "ok":
+            print(f"Backtest block {record['name']} failed due to: {record['error']}")
+        else:
+            print(f"Backtest block {record['name']} completed in {record['elapsed']:.1f}s.")
+
+    records = run_parallel(tasks, max_workers=workers, timeout=timeout,
+                           threads_per_worker=threads_per_worker, on_result=on_result)
+
+    # (models x folds x horizon) forecasts; folds of failed blocks stay NaN
+    models = list(models)
+    fold_of = {origin: i for i, origin in enumerate(origins)}
+    forecasts = np.full((len(models), len(origins), horizon), np.nan)
+    seconds = np.full((len(models), len(origins)), np.nan)
+    for name, _, (model, *_), _ in tasks:
+        record = records[name]
+        if record["status"] != "ok":
+            continue
+        for fold in record["result"]:
+            forecasts[models.index(model), fold_of[fold["origin"]]] = fold["forecast"]
+            seconds[models.index(model), fold_of[fold["origin"]]] = fold["seconds"]
+
+    values = data.to_numpy(dtype=np.float64)
+    positions = np.add.outer(origins, np.arange(horizon))
+    actual = values[positions]
+    starts = [_train_slice(origin, window, train_size).start for origin in origins]
+    scale = np.array([mase_scale(values[start:origin]) for start, origin in zip(starts, origins)])
+    fold_metrics = metrics_frame(actual, forecasts, models=models, scale=scale,
+                                 last_actual=values[np.asarray(origins) - 1])
+    fold_metrics.insert(2, "Origin", np.tile(data.index[origins], len(models)))
+    fold_metrics.insert(3, "Train Size", np.tile(np.asarray(origins) - np.asarray(starts), len(models)))
+    fold_metrics["Seconds"] = seconds.reshape(-1)
+    ok = ~np.isnan(forecasts).any(axis=-1).reshape(-1)
+    fold_metrics = fold_metrics[ok].reset_index(drop=True)
+
+    fold_forecasts = pd.DataFrame({
+        "Model": np.repeat(models, len(origins) * horizon),
+        "Fold": np.tile(np.repeat(np.arange(len(origins)), horizon), len(models)),
+        "Date": np.tile(data.index[positions.reshape(-1)], len(models)),
+        "Actual": np.tile(actual.reshape(-1), len(models)),
+        "Forecast": forecasts.reshape(-1),
+    })
+    fold_forecasts = fold_forecasts[np.repeat(ok, horizon)].reset_index(drop=True)
+    summary = summarize(fold_metrics)
+
+    write_table(fold_metrics, os.path.join(output_dir, "fold_metrics.parquet"))
+    write_table(fold_forecasts, os.path.join(output_dir, "fold_forecasts.parquet"))
+    write_table(summary, os.path.join(output_dir, "summary.parquet"))
+    print(f"\nBacktest results saved to {output_dir}")
+    if not summary.empty:
+        print(summary.to_string(index=False))
+    return fold_metrics, summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Rolling-origin backtest of the forecasting models.")
+    parser.add_argument("--models", default="arima,sarima,prophet,lstm", help="Comma-separated models to run.")
+    parser.add_argument("--horizon", type=int, default=30, help="Forecast steps per fold.")
+    parser.add_argument("--step", type=int, default=30, help="Rows between consecutive origins.")
+    parser.add_argument("--folds", type=int, default=5, help="Number of origins.")
+    parser.add_argument("--window", choices=["expanding", "rolling"], default="expanding")
+    parser.add_argument("--train-size", type=int, default=None, help="Rolling window length.")
+    parser.add_argument("--min-train", type=int, default=None, help="Minimum training rows per fold.")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--threads-per-worker", type=int, default=None)
+    parser.add_argument("--timeout", type=float, default=None, help="Per-block timeout in seconds.")
+    parser.add_argument("--blocks-per-model", type=int, default=None,
+                        help="Contiguous fold blocks per model (default: workers / models).")
+    parser.add_argument("--lstm-epochs", type=int, default=None,
+                        help="LSTM training epochs (default: the tuned configuration, else 50).")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    names = {name.lower(): name for name in BACKTEST_MODELS}
+    selected = [names[m.strip().lower()] for m in args.models.split(",") if m.strip()]
+    close_prices = load_cleaned_data(columns=['Close'])['Close'].interpolate()
+    run_backtest(close_prices, models=selected, horizon=args.horizon, step=args.step, n_folds=args.folds,
+                 window=args.window, train_size=args.train_size, min_train=args.min_train,
+                 workers=args.workers, threads_per_worker=args.threads_per_worker, timeout=args.timeout,
+                 blocks_per_model=args.blocks_per_model, lstm_epochs=args.lstm_epochs,
+                 output_dir=args.output_dir)
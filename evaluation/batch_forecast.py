@@ -0,0 +1,220 @@
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+# Ensure project root is in path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from data_preprocess import clean_yahoo_frame
+from evaluation.scheduler import thread_limits
+from models.arima_model import run_arima
+from models.sarima_model import run_sarima
+from models.prophet_model import run_prophet
+from models.lstm_model import run_shared_lstm
+from models.model_state import DEFAULT_STATE_DIR
+from utils.storage import read_table, write_table
+
+DEFAULT_OUTPUT_PATH = "outputs/forecasts/batch_forecasts.parquet"
+
+# Per-ticker models. The grid search runs serially inside each worker since
+# tickers are already spread across processes.
+TICKER_MODELS = {
+    "ARIMA": (run_arima, {"n_jobs": 1}),
+    "SARIMA": (run_sarima, {"n_jobs": 1}),
+    "Prophet": (run_prophet, {}),
+}
+
+
+def load_panel(path):
+    """
+    Reads a long-format panel with one row per (ticker, date).
+
+    Column names are matched case-insensitively against ticker, Date, Open, High,
+    Low, Close, Adj Close and Volume. CSV, Parquet and Arrow IPC inputs
+    are supported.
+    """
+    if path.endswith(".csv"):
+        panel = pd.read_csv(path)
+    else:
+        panel = read_table(path).reset_index(drop=True)
+    canonical = {name.lower(): name for name in
+                 ["ticker", "Date", "Open", "High", "Low", "Close", "Adj Close", "Volume"]}
+    panel = panel.rename(columns=lambda c: canonical.get(c.strip().lower(), c))
+    missing = [c for c in canonical.values() if c not in panel.columns and c not in ("Adj Close", "Volume")]
+    if missing:
+        raise ValueError(f"Panel is missing columns: {missing}")
+    for optional in ("Adj Close", "Volume"):
+        if optional not in panel.columns:
+            panel[optional] = np.nan
+    return panel
+
+
+def clean_panel(panel, date_format=None):
+    """Returns ticker -> cleaned daily Close series."""
+    series = {}
+    for ticker, rows in panel.groupby("ticker", sort=True):
+        try:
+            df = clean_yahoo_frame(rows.drop(columns="ticker"), date_format=date_format)
+        except Exception as e:
+            print(f"Skipping {ticker}: preprocessing failed due to: {e}")
+            continue
+        series[ticker] = df['Close'].interpolate()
+    return series
+
+
+def forecast_ticker(ticker, close_prices, models, state_dir=None):
+    """Runs the per-ticker models; returns a list of (model, forecast, metrics) or error rows."""
+    rows = []
+    for name in models:
+        model_func, kwargs = TICKER_MODELS[name]
+        ticker_state = os.path.join(state_dir, str(ticker)) if state_dir else None
+        try:
+            forecast, metrics = model_func(close_prices, state_dir=ticker_state, **kwargs)
+            rows.append((name, forecast, metrics, None))
+        except Exception as e:
+            rows.append((name, None, None, f"{type(e).__name__}: {e}"))
+    return ticker, rows
+
+
+def to_frame(ticker, model, forecast, metrics, close_prices):
+    """Long-format result rows for one ticker/model."""
+    forecast = pd.Series(forecast)
+    if not isinstance(forecast.index, pd.DatetimeIndex):
+        # Forecasts without dates are aligned with the last values of the series
+        forecast.index = close_prices.index[-len(forecast):]
+    return pd.DataFrame({
+        "ticker": ticker,
+        "model": model,
+        "date": forecast.index,
+        "forecast": forecast.values.astype(np.float64),
+        "MAE": metrics["MAE"],
+        "MSE": metrics["MSE"],
+        "RMSE": metrics["RMSE"],
+    })
+
+
+def run_batch(panel, models=("ARIMA", "SARIMA", "Prophet", "LSTM"), max_workers=None, max_pending=None,
+              threads_per_worker=1, output_path=DEFAULT_OUTPUT_PATH, state_dir=DEFAULT_STATE_DIR,
+              date_format=None):
+    """
+    Forecasts every ticker in a panel and writes all results to one Parquet file.
+
+    Parameters:
+        panel (pd.DataFrame): Long-format rows (ticker, Date, OHLCV), see `load_panel`.
+        models (iterable): Models to run. LSTM is trained once, shared across tickers.
+        max_workers (int or None): Worker processes for the per-ticker models.
+        max_pending (int or None): Tickers in flight at once; bounds the memory held by
+            queued inputs and unsaved results. Defaults to 2 * max_workers.
+        threads_per_worker (int): BLAS/TensorFlow thread cap per worker.
+        output_path (str): Parquet file with columns ticker, model, date, forecast, MAE, MSE, RMSE.
+        state_dir (str or None): Root of per-ticker warm-start state.
+        date_format (str or None): Format of the Date column; None lets pandas infer it.
+
+    Returns:
+        pd.DataFrame: The written results.
+    """
+    series = clean_panel(panel, date_format=date_format)
+    ticker_models = [m for m in models if m in TICKER_MODELS]
+    max_workers = max_workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * max_workers
+    print(f"Forecasting {len(series)} tickers with {', '.join(models)}...")
+
+    frames = []
+    errors = []
+
+    def new_pool():
+        return ProcessPoolExecutor(max_workers=max_workers, mp_context=mp.get_context("spawn"))
+
+    pool = new_pool()
+    try:
+        lstm_future = None
+        if "LSTM" in models:
+            # One shared model for all tickers, trained in its own worker
+            with thread_limits(threads_per_worker):
+                lstm_future = pool.submit(run_shared_lstm, series)
+
+        # future -> ticker
+        pending = {}
+        queue = iter(series.items()) if ticker_models else iter(())
+        exhausted = False
+        while not exhausted or pending:
+            while not exhausted and len(pending) < max_pending:
+                try:
+                    ticker, close_prices = next(queue)
+                except StopIteration:
+                    exhausted = True
+                    break
+                with thread_limits(threads_per_worker):
+                    try:
+                        future = pool.submit(forecast_ticker, ticker, close_prices, ticker_models, state_dir)
+                    except BrokenProcessPool:
+                        # A worker died; the remaining tickers run in a fresh pool
+                        pool.shutdown(wait=False)
+                        pool = new_pool()
+                        future = pool.submit(forecast_ticker, ticker, close_prices, ticker_models, state_dir)
+                pending[future] = ticker
+            if not pending:
+                continue
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                ticker = pending.pop(future)
+                try:
+                    _, rows = future.result()
+                except Exception as e:
+                    # A crashed worker (BrokenProcessPool) fails every ticker it had in flight
+                    errors.extend((ticker, name, f"{type(e).__name__}: {e}") for name in ticker_models)
+                    print(f"{ticker} failed.")
+                    continue
+                for name, forecast, metrics, error in rows:
+                    if error is not None:
+                        errors.append((ticker, name, error))
+                        continue
+                    frames.append(to_frame(ticker, name, forecast, metrics, series[ticker]))
+                print(f"{ticker} completed.")
+
+        if lstm_future is not None:
+            try:
+                for ticker, (forecast, metrics) in lstm_future.result().items():
+                    frames.append(to_frame(ticker, "LSTM", forecast, metrics, series[ticker]))
+                print("Shared LSTM completed.")
+            except Exception as e:
+                print(f"Shared LSTM failed due to: {e}")
+                traceback.print_exc()
+    finally:
+        pool.shutdown(wait=True)
+
+    for ticker, name, error in errors:
+        print(f"{ticker} {name} failed due to: {error}")
+
+    results = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+        columns=["ticker", "model", "date", "forecast", "MAE", "MSE", "RMSE"])
+    write_table(results, output_path)
+    print(f"Batch forecasts saved to {output_path}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Forecast many tickers from a long-format panel.")
+    parser.add_argument("panel", help="CSV or Parquet file with ticker, Date and OHLCV columns.")
+    parser.add_argument("--models", default="arima,sarima,prophet,lstm",
+                        help="Comma-separated models to run.")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="Maximum tickers in flight at once (default: 2 * workers).")
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    parser.add_argument("--date-format", default=None, help="strftime format of the Date column.")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_PATH)
+    args = parser.parse_args()
+
+    names = {name.lower(): name for name in list(TICKER_MODELS) + ["LSTM"]}
+    selected = [names[m.strip().lower()] for m in args.models.split(",") if m.strip()]
+    run_batch(load_panel(args.panel), models=selected, max_workers=args.workers,
+              max_pending=args.max_pending, threads_per_worker=args.threads_per_worker,
+              output_path=args.output, date_format=args.date_format)
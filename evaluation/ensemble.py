@@ -0,0 +1,205 @@
+import argparse
+import functools
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Ensure project root is in path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from evaluation.backtest import DEFAULT_OUTPUT_DIR as BACKTEST_DIR
+from models.registry import parse_models
+from utils.helpers import evaluate_forecast
+from utils.metrics import compute_metrics
+from utils.storage import FORECAST_DIR, METRICS_PATH, forecast_path, load_cleaned_data, read_table, write_table
+
+ENSEMBLE_NAME = "Ensemble"
+ENSEMBLE_METHODS = ("inverse_error", "stacking", "median")
+WEIGHTS_PATH = os.path.join(FORECAST_DIR, "ensemble_weights.json")
+# Forecast steps of the backtest folds; the final fold covers the last 30 days
+DEFAULT_HORIZON = 30
+
+
+@functools.lru_cache(maxsize=32)
+def _cached_table(path, mtime):
+    return read_table(path)
+
+
+def _read_cached(path):
+    """Reads a saved table once per file version, so refitting weights or switching methods
+    in one process only repeats the array arithmetic. Callers must not modify the result."""
+    return _cached_table(path, os.path.getmtime(path))
+
+
+def load_backtest_forecasts(models, backtest_dir=BACKTEST_DIR):
+    """
+    Loads the out-of-sample forecasts of a backtest as arrays.
+
+    Models without backtest forecasts are skipped. Only folds that every remaining
+    model completed are kept, so all components are weighted on the same errors.
+
+    Returns:
+        tuple: (names, dates, actual, forecasts); dates and actual have shape
+            (folds, horizon), forecasts (models, folds, horizon).
+    """
+    path = os.path.join(backtest_dir, "fold_forecasts.parquet")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No backtest forecasts in {backtest_dir}; run evaluation/backtest.py first.")
+    folds = _read_cached(path)
+    available = set(folds["Model"])
+    for name in models:
+        if name not in available:
+            print(f"Skipping {name} in the ensemble: no forecasts in {backtest_dir}.")
+    names = [name for name in models if name in available]
+
+    folds = folds[folds["Model"].isin(names)]
+    forecasts = folds.pivot_table(index=["Fold", "Date"], columns="Model", values="Forecast")[names].dropna()
+    sizes = forecasts.groupby(level="Fold").size()
+    complete = sizes.index[sizes == sizes.max()]
+    forecasts = forecasts.loc[complete]
+    actual = folds.groupby(["Fold", "Date"])["Actual"].first().loc[forecasts.index]
+
+    n_folds = len(complete)
+    dates = forecasts.index.get_level_values("Date").to_numpy().reshape(n_folds, -1)
+    actual = actual.to_numpy(dtype=np.float64).reshape(n_folds, -1)
+    forecasts = forecasts.to_numpy(dtype=np.float64).T.reshape(len(names), n_folds, -1)
+    return names, dates, actual, forecasts
+
+
+def fit_weights(method, actual, forecasts, power=2):
+    """
+    Fits combination weights on backtest forecasts; no model is refitted.
+
+    Parameters:
+        method (str): 'inverse_error' weights each model by 1 / RMSE**power;
+            'stacking' regresses the actuals on the component forecasts (weights
+            non-negative and summing to 1); 'median' needs no weights.
+        actual (np.ndarray): Backtest actuals, shape (folds, horizon).
+        forecasts (np.ndarray): Backtest forecasts, shape (models, folds, horizon).
+        power (int): Exponent of the inverse error (2 = inverse MSE).
+
+    Returns:
+        np.ndarray or None: Weights summing to 1, one per model (None for 'median').
+    """
+    if method == "median":
+        return None
+    if method == "inverse_error":
+        rmse = compute_metrics(actual.reshape(-1), forecasts.reshape(len(forecasts), -1))["RMSE"]
+        weights = 1.0 / np.maximum(rmse, np.finfo(float).tiny) ** power
+    elif method == "stacking":
+        from scipy.optimize import nnls
+
+        # Least squares over non-negative weights summing to 1: the constraint is appended
+        # as a heavily weighted extra equation
+        design = forecasts.reshape(len(forecasts), -1).T
+        penalty = 1e3 * np.abs(design).max()
+        weights, _ = nnls(np.vstack([design, np.full((1, len(forecasts)), penalty)]),
+                          np.append(actual.reshape(-1), penalty))
+    else:
+        raise ValueError(f"Unknown ensemble method: {method}. Available: {', '.join(ENSEMBLE_METHODS)}")
+    if weights.sum() <= 0:
+        weights = np.ones(len(forecasts))
+    return weights / weights.sum()
+
+
+def combine(forecasts, method, weights=None):
+    """Combines component forecasts of shape (models, ..., horizon) into (..., horizon)."""
+    forecasts = np.asarray(forecasts, dtype=np.float64)
+    if method == "median":
+        return np.median(forecasts, axis=0)
+    return np.tensordot(weights, forecasts, axes=1)
+
+
+def build_ensemble(close_prices, models=None, method="inverse_error", backtest_dir=BACKTEST_DIR,
+                   horizon=DEFAULT_HORIZON, power=2):
+    """
+    Combines the models' forecasts of the last `horizon` days and evaluates the result.
+
+    The components come from the backtest's final fold in `backtest_dir`, where every
+    model forecasts the same days from the same origin, out of sample. (The last rows
+    of the saved model forecasts come from different origins, or are in-sample fits.)
+    Weights are fitted on the earlier folds and written to
+    outputs/forecasts/ensemble_weights.json.
+
+    Parameters:
+        close_prices (pd.Series): Close price history; its last `horizon` values are the actuals.
+        models (str, list or None): Component models. Defaults to all.
+        method (str): One of ENSEMBLE_METHODS.
+        backtest_dir (str): Output directory of evaluation/backtest.py.
+        horizon (int): Forecast steps of the backtest folds.
+        power (int): Inverse-error exponent.
+
+    Returns:
+        tuple: (forecast, metrics) like a model's run function.
+    """
+    if method not in ENSEMBLE_METHODS:
+        raise ValueError(f"Unknown ensemble method: {method}. Available: {', '.join(ENSEMBLE_METHODS)}")
+    names, dates, actual, backtest = load_backtest_forecasts(parse_models(models), backtest_dir)
+    if len(names) < 2:
+        raise ValueError("An ensemble needs backtest forecasts of at least two models.")
+    target = close_prices[-horizon:]
+    if dates.shape[1] != horizon or not pd.DatetimeIndex(dates[-1]).equals(target.index):
+        raise ValueError(f"The last backtest fold in {backtest_dir} does not forecast the last {horizon} days "
+                         "of the data; rerun evaluation/backtest.py.")
+
+    weights = None
+    if method != "median":
+        if len(actual) < 2:
+            raise ValueError(f"Fitting {method} weights needs at least two backtest folds.")
+        # The final fold is the one evaluated, so it is left out of the fit
+        fit_actual, fit_forecasts = actual[:-1], backtest[:, :-1]
+        weights = fit_weights(method, fit_actual, fit_forecasts, power=power)
+        combined = combine(fit_forecasts, method, weights)
+        backtest_rmse = compute_metrics(fit_actual.reshape(-1), np.vstack([fit_forecasts.reshape(len(names), -1),
+                                                                            combined.reshape(1, -1)]))["RMSE"]
+        print(f"Ensemble weights ({method}, fitted on {len(fit_actual)} backtest folds):")
+        for name, weight, rmse in zip(names, weights, backtest_rmse):
+            print(f"    {name:<8} {weight:6.3f}   pooled backtest RMSE {rmse:.2f}")
+        print(f"    {ENSEMBLE_NAME:<8} {'':6}   pooled backtest RMSE {backtest_rmse[-1]:.2f}")
+
+    os.makedirs(os.path.dirname(WEIGHTS_PATH), exist_ok=True)
+    with open(WEIGHTS_PATH, "w") as f:
+        json.dump({"method": method, "models": names,
+                   "weights": None if weights is None else weights.tolist()}, f, indent=2)
+
+    components = backtest[:, -1]
+    forecast = pd.Series(combine(components, method, weights), index=target.index, name="Forecast")
+    metrics = evaluate_forecast(target.values, forecast.values, model=ENSEMBLE_NAME)
+    # The models' own metrics rows cover their own test windows; compare on this one
+    window_rmse = compute_metrics(target.values, components)["RMSE"]
+    print(f"{horizon}-step forecasts of the last {horizon} days, RMSE: " + ", ".join(
+        f"{name} {rmse:.2f}" for name, rmse in zip(names + [ENSEMBLE_NAME], [*window_rmse, metrics["RMSE"]])))
+    return forecast, metrics
+
+
+def save_ensemble(forecast, metrics):
+    """Writes the ensemble forecast and replaces its row in the saved metrics summary."""
+    write_table(forecast.rename("Forecast"), forecast_path(ENSEMBLE_NAME))
+    rows = read_table(METRICS_PATH) if os.path.exists(METRICS_PATH) else pd.DataFrame(columns=["Model"])
+    rows = rows[rows["Model"] != ENSEMBLE_NAME]
+    results_df = pd.concat([rows, pd.DataFrame([metrics])], ignore_index=True)
+    write_table(results_df, METRICS_PATH)
+    return results_df
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Combine the models' backtest forecasts into an ensemble.")
+    parser.add_argument("--method", choices=ENSEMBLE_METHODS, default="inverse_error")
+    parser.add_argument("--models", default=None, help="Comma-separated component models (default: all).")
+    parser.add_argument("--backtest-dir", default=BACKTEST_DIR, help="Output directory of backtest.py.")
+    parser.add_argument("--horizon", type=int, default=DEFAULT_HORIZON, help="Horizon of the backtest folds.")
+    parser.add_argument("--power", type=int, default=2, help="Inverse-error exponent (2 = inverse MSE).")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    close_prices = load_cleaned_data(columns=['Close'])['Close'].interpolate()
+    forecast, metrics = build_ensemble(close_prices, models=args.models, method=args.method,
+                                       backtest_dir=args.backtest_dir, horizon=args.horizon, power=args.power)
+    results_df = save_ensemble(forecast, metrics)
+    print(f"\nEvaluation summary saved to {METRICS_PATH}")
+    print(results_df.to_string(index=False))
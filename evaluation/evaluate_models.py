@@ -1,62 +1,291 @@
 import pandas as pd
+import argparse
+import hashlib
+import importlib.util
+import inspect
 import sys
 import os
+import shutil
 import traceback
 
 # Ensure project root is in path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-# Import model functions
-from models.arima_model import run_arima
-from models.sarima_model import run_sarima
-from models.prophet_model import run_prophet
-from models.lstm_model import run_lstm
+from models.model_state import DEFAULT_STATE_DIR, load_state, state_path
+from models.registry import get_model, model_target, parse_models
+from evaluation.scheduler import run_parallel
+from utils.artifact_store import ArtifactStore, hash_data
+from utils.storage import FORECAST_DIR, METRICS_PATH, forecast_path, load_cleaned_data, write_table
+from utils.tracing import enable_tracing, disable_tracing, span, summarize_trace, traced, write_chrome_trace
 
-def main():
+@traced()
+def save_forecast(name, forecast):
+    """Write a single model's forecast to outputs/forecasts/<name>_forecast.parquet."""
+    write_table(pd.Series(forecast, name='Forecast'), forecast_path(name))
+
+
+@traced()
+def save_metrics(results, model_names):
+    """Write the metrics collected so far, in model definition order."""
+    order = {name: i for i, name in enumerate(model_names)}
+    rows = sorted(results, key=lambda m: order.get(m['Model'], len(order)))
+    results_df = pd.DataFrame(rows, columns=["Model", "MAE", "MSE", "RMSE"])
+    write_table(results_df, METRICS_PATH)
+    return results_df
+
+
+ORDER_SEARCH_METHODS = ("stepwise", "grid")
+
+# In-repo modules whose code, besides the model's own module, shapes its stored forecast
+SHARED_MODEL_CODE = ("models.model_state", "utils.helpers")
+MODEL_CODE = {"ARIMA": ("models.order_search",), "SARIMA": ("models.order_search",)}
+
+
+def code_version(name):
+    """Hash of the source of a model's module and the in-repo helpers its fit uses."""
+    module = model_target(name).rsplit(".", 1)[0]
+    digest = hashlib.sha1()
+    for dependency in (module, *MODEL_CODE.get(name, ()), *SHARED_MODEL_CODE):
+        with open(importlib.util.find_spec(dependency).origin, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def model_options(name, order_search="stepwise"):
+    """Keyword arguments of a model's run function selected on the command line."""
+    if order_search not in ORDER_SEARCH_METHODS:
+        raise ValueError(f"Unknown order search method: {order_search}")
+    if name in ("ARIMA", "SARIMA"):
+        return {"search_method": order_search}
+    return {}
+
+
+def model_config(name, options=None):
+    """
+    Identifies a fitted model in the artifact key, together with the data hash: its run
+    function and code version, the arguments it runs with here (defaults overridden by
+    `options`), and the settings behind them (order search space, Prophet parameters,
+    LSTM hyperparameters).
+    """
+    ignored = ("state_dir", "full_refit")
+    params = {key: p.default for key, p in inspect.signature(get_model(name)).parameters.items()
+              if p.default is not inspect.Parameter.empty and key not in ignored}
+    params.update(options or {})
+    config = {"function": model_target(name), "code": code_version(name), "params": params}
+    if name in ("ARIMA", "SARIMA"):
+        from models.order_search import build_search_space
+
+        config["search_space"] = build_search_space(seasonal=True, m=7) if name == "SARIMA" \
+            else build_search_space()
+    elif name == "Prophet":
+        from models.prophet_model import PROPHET_PARAMS
+
+        config["prophet_params"] = PROPHET_PARAMS
+    elif name == "LSTM":
+        # A newly tuned configuration must not reuse forecasts of the old one
+        from models.lstm_model import load_config
+
+        config["hyperparameters"] = load_config()
+    return config
+
+
+@traced()
+def store_artifacts(store, name, data_hash, config, forecast, metrics):
+    """Saves a finished model's forecast, metrics, chosen orders and fitted state files."""
+    state = load_state(DEFAULT_STATE_DIR, name) or {}
+    objects = {"forecast": forecast, "metrics": metrics}
+    objects.update({k: state[k] for k in ("order", "seasonal_order") if k in state})
+    files = {}
+    for suffix in (".pkl", ".keras"):
+        path = state_path(DEFAULT_STATE_DIR, name, suffix)
+        files[os.path.basename(path)] = path
+    store.put(name, data_hash, config, objects=objects, files=files)
+
+
+@traced()
+def restore_artifacts(files):
+    """Copies a stored entry's state files back into the state directory, so incremental
+    runs and serving continue from the fit behind the stored forecast."""
+    os.makedirs(DEFAULT_STATE_DIR, exist_ok=True)
+    for name, src in files.items():
+        path = os.path.join(DEFAULT_STATE_DIR, name)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        shutil.copy2(src, tmp_path)
+        os.replace(tmp_path, path)
+
+
+def main(workers=None, timeout=None, threads_per_worker=None, full_refit=False, use_store=True, models=None,
+         trace=None, trace_memory=False, profile_dir=None, ensemble=None, order_search="stepwise"):
+    """
+    Runs every model in its own worker process and saves forecasts/metrics as each finishes.
+
+    Parameters:
+        workers (int or None): Number of models fitted concurrently. Defaults to one per model
+            (bounded by the CPU count). Use 1 to run the models sequentially.
+        timeout (float or None): Per-model time limit in seconds.
+        threads_per_worker (int or None): BLAS/TensorFlow thread cap for each worker.
+        full_refit (bool): Refit every model from scratch instead of updating the fitted
+            state saved under outputs/state with newly appended rows. Also bypasses stored artifacts.
+        use_store (bool): Reuse forecasts and metrics from the artifact store under
+            outputs/artifacts when the data and model config are unchanged.
+        models (str, list or None): Models to run, e.g. 'arima,lstm'. Defaults to all.
+            Only the selected models' modules are imported.
+        trace (str or None): Write a Chrome trace (JSON) of every stage, in this process and
+            in the model workers, to this path.
+        trace_memory (bool): Record resident memory with each traced stage.
+        profile_dir (str or None): cProfile each model run into <profile_dir>/run_<model>-<pid>.prof.
+        ensemble (str or None): Also combine the finished models' backtest forecasts of the
+            last 30 days with this method ('inverse_error', 'stacking' or 'median', see
+            evaluation/ensemble.py) and report the ensemble as an extra metrics row.
+        order_search (str): ARIMA/SARIMA order selection: 'stepwise' (auto_arima) or 'grid',
+            which fits the candidates in parallel on each model worker's share of the cores.
+    """
+    if not trace and not profile_dir:
+        return _evaluate(workers, timeout, threads_per_worker, full_refit, use_store, models, ensemble,
+                         order_search)
+
+    # Set before the workers start, so they inherit it
+    trace_dir = f"{trace}.events" if trace else None
+    enable_tracing(trace_dir, memory=trace_memory, profile_dir=profile_dir)
+    try:
+        with span("evaluate_models", models=",".join(parse_models(models))):
+            _evaluate(workers, timeout, threads_per_worker, full_refit, use_store, models, ensemble,
+                      order_search)
+    finally:
+        disable_tracing()
+        if trace:
+            events = write_chrome_trace(trace, trace_dir)
+            shutil.rmtree(trace_dir, ignore_errors=True)
+            summarize_trace(events)
+            print(f"Trace saved to {trace} (open in chrome://tracing or https://ui.perfetto.dev)")
+
+
+def _evaluate(workers, timeout, threads_per_worker, full_refit, use_store, models, ensemble=None,
+              order_search="stepwise"):
     # Load data
-    df = pd.read_csv("data/cleaned_data.csv", parse_dates=['Date'], index_col='Date')
-    close_prices = df['Close'].interpolate()
+    with span("load_data"):
+        df = load_cleaned_data(columns=['Close'])
+        close_prices = df['Close'].interpolate()
 
-    # Define models
-    models = [
-        ("ARIMA", run_arima),
-        ("SARIMA", run_sarima),
-        ("Prophet", run_prophet),
-        ("LSTM", run_lstm)
-    ]
+    model_names = parse_models(models)
 
     results = []
-    os.makedirs("outputs/forecasts", exist_ok=True)
+    os.makedirs(FORECAST_DIR, exist_ok=True)
 
-    for name, model_func in models:
-        try:
-            print(f"\nRunning {name} model...")
-            forecast, metrics = model_func(close_prices)
+    model_kwargs = {"state_dir": DEFAULT_STATE_DIR, "full_refit": full_refit}
+    store = ArtifactStore() if use_store else None
+    with span("hash_data", n_obs=len(close_prices)):
+        data_hash = hash_data(close_prices)
 
-            # Save forecast
-            forecast_path = f"outputs/forecasts/{name.lower()}_forecast.csv"
-            pd.Series(forecast).to_csv(forecast_path, header=['Forecast'])
+    tasks = []
+    configs = {}
+    for name in model_names:
+        options = model_options(name, order_search)
+        configs[name] = model_config(name, options)
+        with span("artifact_lookup", model=name):
+            cached = None if store is None or full_refit else store.get(name, data_hash, configs[name])
+        if cached is None:
+            tasks.append((name, get_model(name), (close_prices,), {**model_kwargs, **options}))
+            continue
+        restore_artifacts(cached["files"])
+        save_forecast(name, cached["forecast"])
+        results.append(cached["metrics"])
+        print(f"{name} loaded from artifact store (data unchanged).")
+    if results:
+        save_metrics(results, model_names)
 
-            # Add results
-            results.append(metrics)
-            print(f"{name} completed.")
-            print(f"    MAE:  {metrics['MAE']:.2f}")
-            print(f"    MSE:  {metrics['MSE']:.2f}")
-            print(f"    RMSE: {metrics['RMSE']:.2f}")
+    def on_result(record):
+        name = record["name"]
+        if record["status"] != "ok":
+            print(f"{name} failed due to: {record['error']}")
+            return
+
+        forecast, metrics = record["result"]
+        save_forecast(name, forecast)
+        if store is not None:
+            store_artifacts(store, name, data_hash, configs[name], forecast, metrics)
+
+        # Persist metrics incrementally so partial runs still leave a usable summary
+        results.append(metrics)
+        save_metrics(results, model_names)
+        print(f"{name} completed in {record['elapsed']:.1f}s.")
+        print(f"    MAE:  {metrics['MAE']:.2f}")
+        print(f"    MSE:  {metrics['MSE']:.2f}")
+        print(f"    RMSE: {metrics['RMSE']:.2f}")
 
+    if tasks and order_search == "grid":
+        # The grid search runs single-threaded fits, as many as the worker's share of the cores
+        cpu_count = os.cpu_count() or 1
+        share = threads_per_worker or max(1, cpu_count // min(workers or cpu_count, len(tasks), cpu_count))
+        for name, _, _, kwargs in tasks:
+            if "search_method" in kwargs:
+                kwargs["n_jobs"] = share
+
+    if tasks:
+        print(f"\nRunning {', '.join(name for name, *_ in tasks)} models...")
+        try:
+            with span("fit_models", models=len(tasks)):
+                run_parallel(tasks, max_workers=workers, timeout=timeout,
+                             threads_per_worker=threads_per_worker, on_result=on_result)
         except Exception as e:
-            print(f"{name} failed due to: {e}")
+            print(f"Model scheduling failed due to: {e}")
             traceback.print_exc()
 
+    if ensemble:
+        # Only combines backtest forecasts of the last 30 days; nothing is refitted
+        from evaluation.ensemble import ENSEMBLE_NAME, build_ensemble
+
+        try:
+            with span("ensemble", method=ensemble):
+                forecast, metrics = build_ensemble(close_prices, models=[m["Model"] for m in results],
+                                                   method=ensemble)
+            save_forecast(ENSEMBLE_NAME, forecast)
+            results.append(metrics)
+            model_names = model_names + [ENSEMBLE_NAME]
+            print(f"{ENSEMBLE_NAME} ({ensemble}) RMSE over the last 30 days: {metrics['RMSE']:.2f}")
+        except (ValueError, FileNotFoundError) as e:
+            print(f"Ensemble skipped: {e}")
+
     # Save evaluation metrics
-    results_df = pd.DataFrame(results)
-    results_df.to_csv("outputs/forecasts/model_metrics.csv", index=False)
-    print("\nEvaluation summary saved to outputs/forecasts/model_metrics.csv")
+    results_df = save_metrics(results, model_names)
+    print(f"\nEvaluation summary saved to {METRICS_PATH}")
 
     # Print best model by RMSE
     if not results_df.empty:
         best_model = results_df.sort_values(by='RMSE').iloc[0]
         print(f"\nBest Model by RMSE: {best_model['Model']} → RMSE: {best_model['RMSE']:.2f}")
 
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate all forecasting models.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of models to fit concurrently (default: one per model).")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="Per-model timeout in seconds.")
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="BLAS/TensorFlow thread cap per worker (default: cores / workers).")
+    parser.add_argument("--full-refit", action="store_true",
+                        help="Refit all models from scratch instead of updating saved state.")
+    parser.add_argument("--no-store", action="store_true",
+                        help="Do not reuse or save artifacts in outputs/artifacts.")
+    parser.add_argument("--models", default=None,
+                        help="Comma-separated models to run, e.g. arima,lstm (default: all).")
+    parser.add_argument("--order-search", choices=ORDER_SEARCH_METHODS, default="stepwise",
+                        help="ARIMA/SARIMA order selection: stepwise auto_arima or a parallel grid search.")
+    parser.add_argument("--ensemble", choices=["inverse_error", "stacking", "median"], default=None,
+                        help="Also report an ensemble of the models, weighted on backtest errors.")
+    parser.add_argument("--trace", default=None, metavar="PATH",
+                        help="Write a Chrome trace of all stages and model workers to PATH (JSON).")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Record resident memory with each traced stage.")
+    parser.add_argument("--profile-dir", default=None,
+                        help="Dump a cProfile of each model run into this directory.")
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    main(workers=args.workers, timeout=args.timeout, threads_per_worker=args.threads_per_worker,
+         full_refit=args.full_refit, use_store=not args.no_store, models=args.models,
+         trace=args.trace, trace_memory=args.trace_memory, profile_dir=args.profile_dir,
+         ensemble=args.ensemble, order_search=args.order_search)
@@ -1,87 +1,267 @@
-import pandas as pd
-import matplotlib.pyplot as plt
+import hashlib
+import json
+import multiprocessing as mp
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import matplotlib
+
+# Render straight to files; no GUI backend is needed (or wanted in worker processes)
+matplotlib.use("Agg")
+import matplotlib.dates as mdates
+from matplotlib.figure import Figure
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models.registry import parse_models
+from utils.storage import load_cleaned_data, load_forecast
+from utils.tracing import span, traced
+
+PLOT_DIR = os.path.join("outputs", "plots")
+# filename -> content hash of the last rendered plot
+HASH_INDEX = os.path.join(PLOT_DIR, ".plot_hashes.json")
+
+FORECAST_POINTS = 30
+FIGSIZE = (12, 6)
+# Series longer than this are downsampled with LTTB before drawing
+DEFAULT_MAX_POINTS = 2000
+# Bump when the figure layout changes, so every plot is redrawn once
+RENDER_VERSION = 1
+# Starting a render process costs about as much as drawing a few plots, so by
+# default smaller batches are drawn in-process
+MIN_PARALLEL_PLOTS = 8
+
+
+def lttb(x, y, n_out):
+    """
+    Downsamples a line with Largest-Triangle-Three-Buckets.
+
+    Keeps the first and last points and, from each of `n_out - 2` equal buckets,
+    the point forming the largest triangle with the previously kept point and the
+    mean of the next bucket. Peaks and troughs survive, unlike plain striding.
+
+    Parameters:
+        x (np.ndarray): Increasing x values (e.g. matplotlib date numbers).
+        y (np.ndarray): Values.
+        n_out (int): Number of points to keep.
+
+    Returns:
+        tuple: (x, y) of at most `n_out` points.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        nxt_start, nxt_end = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x = x[nxt_start:nxt_end].mean()
+        avg_y = y[nxt_start:nxt_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+    return x[keep], y[keep]
+
+
+def _line_points(series, max_points):
+    """Date numbers and values of a series, downsampled to `max_points`."""
+    x = mdates.date2num(pd.DatetimeIndex(series.index).values)
+    y = series.to_numpy(dtype=np.float64)
+    if max_points and len(x) > max_points:
+        x, y = lttb(x, y, max_points)
+    return x, y
+
+
+def _content_hash(job):
+    h = hashlib.sha1(json.dumps([RENDER_VERSION, FIGSIZE, job["title"]]).encode())
+    for key in ("actual_x", "actual_y", "forecast_x", "forecast_y"):
+        h.update(np.ascontiguousarray(job[key]).tobytes())
+    return h.hexdigest()
+
+
+def _load_hashes():
+    try:
+        with open(HASH_INDEX) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_hashes(hashes):
+    os.makedirs(PLOT_DIR, exist_ok=True)
+    tmp_path = f"{HASH_INDEX}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(hashes, f, indent=2)
+    os.replace(tmp_path, HASH_INDEX)
+
+
+# One figure per process, reused for every plot it renders
+_template = None
+
+
+def _figure_template():
+    global _template
+    if _template is None:
+        fig = Figure(figsize=FIGSIZE)
+        ax = fig.add_subplot()
+        actual_line, = ax.plot([], [], label='Actual', color='blue', linewidth=2)
+        forecast_line, = ax.plot([], [], label='Forecast', color='red', linestyle='--')
+        ax.set_xlabel('Date')
+        ax.set_ylabel('Close Price')
+        ax.legend()
+        ax.grid(True)
+        ax.xaxis_date()
+        # Fixed margins instead of tight_layout, which costs an extra draw per plot
+        fig.subplots_adjust(left=0.08, right=0.98, top=0.94, bottom=0.09)
+        _template = (fig, ax, actual_line, forecast_line)
+    return _template
+
 
-def plot_forecast(actual, predicted, title, filename):
+def _render(job):
+    """Draws one plot on this process's figure template and saves it."""
+    fig, ax, actual_line, forecast_line = _figure_template()
+    actual_line.set_data(job["actual_x"], job["actual_y"])
+    forecast_line.set_data(job["forecast_x"], job["forecast_y"])
+    ax.set_title(job["title"])
+    ax.relim()
+    ax.autoscale_view()
+    fig.savefig(job["path"])
+    return job["path"]
+
+
+def make_job(actual, predicted, title, filename, max_points=DEFAULT_MAX_POINTS):
+    """Describes one plot: downsampled actual and forecast lines, title and output path."""
+    actual_x, actual_y = _line_points(actual, max_points)
+    forecast_x, forecast_y = _line_points(predicted, max_points)
+    job = {"title": title, "path": os.path.join(PLOT_DIR, filename), "actual_x": actual_x,
+           "actual_y": actual_y, "forecast_x": forecast_x, "forecast_y": forecast_y}
+    job["hash"] = _content_hash(job)
+    return job
+
+
+@traced("render_plots")
+def render_jobs(jobs, workers=None, force=False):
+    """
+    Renders plot jobs, skipping those whose content is unchanged since the last render.
+
+    Parameters:
+        jobs (list): Plot descriptions from `make_job`.
+        workers (int or None): Render processes. Defaults to one per plot (bounded by the
+            CPU count) once there are at least MIN_PARALLEL_PLOTS to draw; 1 renders in
+            this process.
+        force (bool): Redraw every plot even if its content hash is unchanged.
+
+    Returns:
+        list: Paths of the plots that were (re)drawn.
+    """
+    os.makedirs(PLOT_DIR, exist_ok=True)
+    hashes = _load_hashes()
+    pending = []
+    for job in jobs:
+        name = os.path.basename(job["path"])
+        if not force and hashes.get(name) == job["hash"] and os.path.exists(job["path"]):
+            print(f"Plot unchanged: {job['path']}")
+        else:
+            pending.append(job)
+    if not pending:
+        return []
+
+    if workers is None:
+        workers = os.cpu_count() or 1 if len(pending) >= MIN_PARALLEL_PLOTS else 1
+    workers = min(workers, len(pending))
+    if workers <= 1:
+        paths = [_render(job) for job in pending]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")) as pool:
+            paths = list(pool.map(_render, pending))
+
+    for job, path in zip(pending, paths):
+        hashes[os.path.basename(path)] = job["hash"]
+        print(f"Plot saved: {path}")
+    _save_hashes(hashes)
+    return paths
+
+
+def plot_forecast(actual, predicted, title, filename, max_points=DEFAULT_MAX_POINTS):
     """Plot actual vs predicted values and save the figure."""
-    plt.figure(figsize=(12, 6))
-    plt.plot(actual.index, actual.values, label='Actual', color='blue', linewidth=2)
-    plt.plot(predicted.index, predicted.values, label='Forecast', color='red', linestyle='--')
-    plt.title(title)
-    plt.xlabel('Date')
-    plt.ylabel('Close Price')
-    plt.legend()
-    plt.grid(True)
-    plt.tight_layout()
-
-    output_path = os.path.join("outputs", "plots", filename)
-    plt.savefig(output_path)
-    plt.close()
-    print(f"Plot saved: {output_path}")
-
-def main():
-    # Ensure output folders exist
-    os.makedirs("outputs/plots", exist_ok=True)
+    return render_jobs([make_job(actual, predicted, title, filename, max_points)], workers=1, force=True)
 
-    # Load actual cleaned data
-    df = pd.read_csv("data/cleaned_data.csv", parse_dates=["Date"], index_col="Date")
-    close_prices = df["Close"].interpolate()
-    actual = close_prices[-30:]
 
-    # List of models and their forecast files
-    models = ["ARIMA", "SARIMA", "Prophet", "LSTM"]
+def plot_forecasts(close_prices, forecasts, history=FORECAST_POINTS, max_points=DEFAULT_MAX_POINTS,
+                   workers=None, force=False):
+    """
+    Plot each model's forecast against the actual values.
 
-    for name in models:
-        forecast_path = f"outputs/forecasts/{name.lower()}_forecast.csv"
-        try:
-            # Load forecast data and convert to Series
-            forecast_df = pd.read_csv(forecast_path, index_col=0)
-            forecast_df.index = pd.to_datetime(forecast_df.index, errors='coerce')
-            forecast_series = forecast_df.squeeze()
+    Parameters:
+        close_prices (pd.Series): Full Close price history.
+        forecasts (dict): Model name -> forecast values (Series or array).
+        history (int or None): Number of most recent actual values shown; None shows the
+            whole series (downsampled to `max_points`).
+        max_points (int or None): Downsample longer lines with LTTB; None disables it.
+        workers (int or None): Render processes (see `render_jobs`).
+        force (bool): Redraw plots whose content has not changed.
 
-            # Take only the last 30 values and align with actual
-            forecast_series = forecast_series[-30:]
-            forecast_series.index = actual.index
+    Returns:
+        list: Paths of the plots that were (re)drawn.
+    """
+    actual = close_prices if history is None else close_prices[-history:]
 
-            # Plot and save
-            plot_forecast(actual, forecast_series, f"{name} Forecast vs Actual", f"{name.lower()}_forecast.png")
+    jobs = []
+    with span("plot_jobs", plots=len(forecasts)):
+        for name, forecast in forecasts.items():
+            try:
+                # Take the last 30 forecast values and align them with the last 30 dates
+                forecast_series = pd.Series(np.asarray(forecast)[-FORECAST_POINTS:])
+                forecast_series.index = close_prices.index[-len(forecast_series):]
+                jobs.append(make_job(actual, forecast_series, f"{name} Forecast vs Actual",
+                                     f"{name.lower()}_forecast.png", max_points))
+            except Exception as e:
+                print(f"Failed to plot {name}: {e}")
 
-        except Exception as e:
-            print(f"Failed to plot {name}: {e}")
+    return render_jobs(jobs, workers=workers, force=force)
 
-def generate_plots_from_forecasts():
-    import pandas as pd
-    import matplotlib.pyplot as plt
-    import os
-
-    def plot_forecast(actual, predicted, title, filename):
-        plt.figure(figsize=(12, 6))
-        plt.plot(actual.index, actual.values, label='Actual', color='blue', linewidth=2)
-        plt.plot(predicted.index, predicted.values, label='Forecast', color='red', linestyle='--')
-        plt.title(title)
-        plt.xlabel('Date')
-        plt.ylabel('Close Price')
-        plt.legend()
-        plt.grid(True)
-        plt.tight_layout()
-        output_path = os.path.join("outputs", "plots", filename)
-        plt.savefig(output_path)
-        plt.close()
-
-    df = pd.read_csv("data/cleaned_data.csv", parse_dates=["Date"], index_col="Date")
-    actual = df["Close"].interpolate()[-30:]
-
-    models = ["ARIMA", "SARIMA", "Prophet", "LSTM"]
-    for name in models:
-        forecast_path = f"outputs/forecasts/{name.lower()}_forecast.csv"
+
+def main(history=FORECAST_POINTS, max_points=DEFAULT_MAX_POINTS, workers=None, force=False, models=None):
+    # Load actual cleaned data
+    df = load_cleaned_data(columns=["Close"])
+    close_prices = df["Close"].interpolate()
+
+    forecasts = {}
+    for name in parse_models(models):
         try:
-            forecast_df = pd.read_csv(forecast_path, index_col=0, parse_dates=True)
-            forecast_series = forecast_df.squeeze()[-30:]
-            forecast_series.index = actual.index
-            plot_forecast(actual, forecast_series, f"{name} Forecast vs Actual", f"{name.lower()}_forecast.png")
+            # Load forecast data as a Series
+            forecasts[name] = load_forecast(name)
         except Exception as e:
             print(f"Failed to plot {name}: {e}")
 
+    return plot_forecasts(close_prices, forecasts, history=history, max_points=max_points,
+                          workers=workers, force=force)
+
+
+def generate_plots_from_forecasts():
+    """Regenerates the forecast plots from the saved forecasts (used by the Streamlit app)."""
+    return main()
+
 
 if __name__ == "__main__":
-    main()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Plot each model's forecast against the actual prices.")
+    parser.add_argument("--history", type=int, default=FORECAST_POINTS,
+                        help="Recent actual values to show; 0 shows the whole series.")
+    parser.add_argument("--max-points", type=int, default=DEFAULT_MAX_POINTS,
+                        help="Downsample longer lines with LTTB; 0 disables downsampling.")
+    parser.add_argument("--workers", type=int, default=None, help="Render processes (1 renders in-process).")
+    parser.add_argument("--force", action="store_true", help="Redraw plots even if unchanged.")
+    parser.add_argument("--models", default=None, help="Comma-separated models to plot (default: all).")
+    args = parser.parse_args()
+    main(history=args.history or None, max_points=args.max_points or None, workers=args.workers, force=args.force,
+         models=args.models)
@@ -0,0 +1,148 @@
+import multiprocessing as mp
+from multiprocessing.connection import wait
+import os
+import time
+import traceback
+from contextlib import contextmanager
+
+# Environment variables read by BLAS/OpenMP runtimes and TensorFlow at import time
+THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "TF_NUM_INTRAOP_THREADS",
+    "TF_NUM_INTEROP_THREADS",
+)
+
+
+@contextmanager
+def thread_limits(threads):
+    """
+    Temporarily cap the native thread pools of processes started inside the block.
+
+    Spawned children inherit the parent's environment, so the caps are in place
+    before numpy/TensorFlow are imported in the worker.
+    """
+    previous = {var: os.environ.get(var) for var in THREAD_ENV_VARS}
+    os.environ.update({var: str(threads) for var in THREAD_ENV_VARS})
+    try:
+        yield
+    finally:
+        for var, value in previous.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+
+
+def _run_task(conn, func, args, kwargs):
+    """Worker entry point: run the task and send the outcome back to the parent."""
+    try:
+        result = func(*args, **kwargs)
+        conn.send(("ok", result))
+    except Exception:
+        conn.send(("error", traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+def run_parallel(tasks, max_workers=None, timeout=None, threads_per_worker=None, on_result=None):
+    """
+    Runs each task in its own worker process, at most `max_workers` at a time.
+
+    Parameters:
+        tasks (list): (name, func, args, kwargs) tuples. `func` must be importable
+            from the worker (a module-level function).
+        max_workers (int or None): Number of concurrent worker processes.
+            Defaults to min(len(tasks), cpu_count).
+        timeout (float or None): Per-task wall-clock limit in seconds. Workers
+            exceeding it are terminated.
+        threads_per_worker (int or None): BLAS/TensorFlow thread cap per worker.
+            Defaults to cpu_count // max_workers.
+        on_result (callable or None): Called with each result record as soon as
+            its task finishes.
+
+    Returns:
+        dict: name -> record with keys 'name', 'status' ('ok', 'error' or
+            'timeout'), 'result', 'error' and 'elapsed'.
+    """
+    cpu_count = os.cpu_count() or 1
+    if max_workers is None:
+        max_workers = min(len(tasks), cpu_count)
+    max_workers = max(1, max_workers)
+    if threads_per_worker is None:
+        threads_per_worker = max(1, cpu_count // max_workers)
+
+    ctx = mp.get_context("spawn")
+    pending = list(tasks)
+    running = {}
+    results = {}
+
+    def finish(name, status, result=None, error=None):
+        proc, conn, started = running.pop(name)
+        conn.close()
+        if status == "timeout":
+            proc.terminate()
+        proc.join()
+        record = {
+            "name": name,
+            "status": status,
+            "result": result,
+            "error": error,
+            "elapsed": time.perf_counter() - started,
+        }
+        results[name] = record
+        if on_result is not None:
+            on_result(record)
+
+    while pending or running:
+        # Fill free worker slots
+        while pending and len(running) < max_workers:
+            name, func, args, kwargs = pending.pop(0)
+            parent_conn, child_conn = ctx.Pipe(duplex=False)
+            proc = ctx.Process(target=_run_task, args=(child_conn, func, args, kwargs), name=name)
+            with thread_limits(threads_per_worker):
+                proc.start()
+            child_conn.close()
+            running[name] = (proc, parent_conn, time.perf_counter())
+
+        # Wait for the next result, process exit or timeout deadline
+        wait_for = None
+        if timeout is not None:
+            now = time.perf_counter()
+            wait_for = max(0.0, min(started + timeout - now for _, _, started in running.values()))
+        handles = {}
+        for name, (proc, conn, _) in running.items():
+            handles[conn] = name
+            handles[proc.sentinel] = name
+        ready = wait(list(handles), timeout=wait_for)
+
+        done = set()
+        for handle in ready:
+            name = handles[handle]
+            if name in done:
+                continue
+            proc, conn, _ = running[name]
+            if conn.poll():
+                try:
+                    status, payload = conn.recv()
+                except EOFError:
+                    status, payload = "error", f"worker exited with code {proc.exitcode}"
+            else:
+                proc.join()
+                status, payload = "error", f"worker exited with code {proc.exitcode}"
+            done.add(name)
+            if status == "ok":
+                finish(name, "ok", result=payload)
+            else:
+                finish(name, "error", error=payload)
+
+        if timeout is not None:
+            now = time.perf_counter()
+            for name, (_, _, started) in list(running.items()):
+                if now - started >= timeout:
+                    finish(name, "timeout", error=f"timed out after {timeout:.0f}s")
+
+    return results
@@ -6,19 +6,33 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from utils.helpers import train_test_split, evaluate_forecast
+from models.order_search import search_order
+from models.model_state import load_incremental_state, save_state, describe_series
+from utils.tracing import span, traced
 
-# Optional: Use pmdarima for better parameter selection
-from pmdarima import auto_arima
-from statsmodels.tsa.arima.model import ARIMA
 
+def fit_arima(train, order):
+    """Fits ARIMA(order) on a training series and returns the results object."""
+    from statsmodels.tsa.arima.model import ARIMA
 
-def run_arima(data, order=None):
+    return ARIMA(train, order=order).fit()
+
+
+@traced("run_arima", profile=True)
+def run_arima(data, order=None, search_method="stepwise", n_jobs=None, use_cache=True,
+              state_dir=None, full_refit=False):
     """
     Trains an ARIMA model and returns the forecast and evaluation metrics.
 
     Parameters:
         data (pd.Series): Time series data (e.g., Close prices).
         order (tuple or None): ARIMA order (p,d,q). If None, it will be auto-tuned.
+        search_method (str): 'stepwise' (auto_arima) or 'grid' (parallel) order search.
+        n_jobs (int or None): Worker processes for the grid search.
+        use_cache (bool): Reuse/store the selected order in the on-disk order cache.
+        state_dir (str or None): Directory holding the fitted state. When set, a state fitted
+            on a prefix of the training data is updated with the new rows instead of refitting.
+        full_refit (bool): Ignore any saved state and refit from scratch.
 
     Returns:
         forecast (pd.Series): Predicted values for the test set.
@@ -30,18 +44,44 @@ def run_arima(data, order=None):
 
     train, test = train_test_split(data)
 
-    if order is None:
-        print("Auto-selecting ARIMA parameters...")
-        auto_model = auto_arima(train, seasonal=False, stepwise=True, suppress_warnings=True)
-        order = auto_model.order
-        print(f"Selected ARIMA order: {order}")
+    state = load_incremental_state(state_dir, "arima", train, full_refit=full_refit)
+    # A selected order is only kept if it was selected with the same search method
+    if state is not None and (tuple(order) == state["order"] if order is not None
+                              else state.get("search_method", "stepwise") == search_method):
+        # Update the saved fit with the appended rows, keeping its parameters
+        order, method = state["order"], state.get("search_method", "stepwise")
+        new_obs = train.iloc[state["n_obs"]:]
+        print(f"Updating ARIMA{order} with {len(new_obs)} new observations...")
+        model_fit = state["results"]
+        if len(new_obs):
+            with span("arima.update", new_obs=len(new_obs)):
+                model_fit = model_fit.append(new_obs, refit=False)
+        fitted_n_obs = state["fitted_n_obs"]
+    else:
+        method = search_method if order is None else None
+        if order is None:
+            print("Auto-selecting ARIMA parameters...")
+            order, _ = search_order(train, seasonal=False, method=search_method,
+                                    n_jobs=n_jobs, use_cache=use_cache)
+            print(f"Selected ARIMA order: {order}")
+
+        # Fit model
+        with span("arima.fit", order=order, n_obs=len(train)):
+            model_fit = fit_arima(train, order)
+        fitted_n_obs = len(train)
 
-    # Fit model
-    model = ARIMA(train, order=order)
-    model_fit = model.fit()
+    if state_dir is not None:
+        save_state(state_dir, "arima", {
+            "order": tuple(order),
+            "search_method": method,
+            "results": model_fit,
+            "fitted_n_obs": fitted_n_obs,
+            **describe_series(train),
+        })
 
     # Forecast
-    forecast = model_fit.forecast(steps=len(test))
+    with span("arima.forecast", steps=len(test)):
+        forecast = model_fit.forecast(steps=len(test))
     forecast.index = test.index  # Align forecast index with actual test dates
 
     # Evaluate
@@ -1,64 +1,460 @@
+import json
+
 import numpy as np
 import pandas as pd
-from sklearn.preprocessing import MinMaxScaler
-from keras.models import Sequential
-from keras.layers import Dense, LSTM, Dropout
+from numpy.lib.stride_tricks import sliding_window_view
 import sys
 import os
+import weakref
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from utils.helpers import evaluate_forecast
+from models.model_state import load_incremental_state, save_state, describe_series, state_path
+from utils.tracing import is_enabled, span, traced
+
+# Number of most recent training windows used when fine-tuning a saved model
+FINE_TUNE_SAMPLES = 256
+
+# Above this many window elements (samples x look_back), training streams batches
+# through tf.data instead of materialising every window in memory
+STREAMING_THRESHOLD = 50_000_000
+
+# Hyperparameters used until models/lstm_tuning.py has saved a tuned configuration
+DEFAULT_CONFIG = {
+    "look_back": 60,
+    "units": 64,
+    "dropout": 0.2,
+    "batch_size": 16,
+    "learning_rate": 0.001,
+    "epochs": 50,
+}
+# Written by the tuner and read by runs from any working directory, e.g. a dashboard workspace
+TUNED_CONFIG_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "outputs", "tuning", "lstm_best.json"))
+
+# 'mixed_bfloat16' runs the LSTM layers in bfloat16 with float32 weights; whether it
+# beats float32 depends on the CPU's bf16 kernels (see benchmarks/bench_lstm_inference.py)
+PRECISIONS = ("float32", "mixed_bfloat16")
+
+
+def load_config(path=TUNED_CONFIG_PATH):
+    """LSTM hyperparameters: the best configuration saved by the tuner, else DEFAULT_CONFIG."""
+    config = dict(DEFAULT_CONFIG)
+    try:
+        with open(path) as f:
+            saved = json.load(f)["config"]
+    except (OSError, ValueError, KeyError):
+        return config
+    config.update({key: saved[key] for key in DEFAULT_CONFIG if key in saved})
+    return config
+
+
+def make_windows(series, look_back, holdout=30, horizon=1):
+    """
+    Builds supervised (X, y) pairs from a 1-D series without copying it.
+
+    X[j] = series[j:j + look_back] and y[j] = series[j + look_back] (or the next
+    `horizon` values when horizon > 1), for every window whose targets fall before
+    the last `holdout` values. X is a read-only strided view of shape
+    (samples, look_back, 1).
+    """
+    series = np.asarray(series).reshape(-1)
+    n_samples = max(len(series) - holdout - look_back - horizon + 1, 0)
+    X = sliding_window_view(series[:n_samples + look_back - 1], look_back) if n_samples else \
+        np.empty((0, look_back), dtype=series.dtype)
+    y = _targets(series, look_back, n_samples, horizon)
+    return X[..., np.newaxis], y
+
+
+def _targets(series, look_back, n_samples, horizon):
+    if horizon == 1:
+        return series[look_back:look_back + n_samples]
+    if n_samples == 0:
+        return np.empty((0, horizon), dtype=series.dtype)
+    return sliding_window_view(series[look_back:look_back + n_samples + horizon - 1], horizon)
+
+
+def make_dataset(series, look_back, holdout=30, horizon=1, batch_size=16, shuffle=True):
+    """
+    Streams the same windows as `make_windows` as a batched, prefetched tf.data pipeline.
+
+    Only the 1-D series is held in memory; windows are sliced per batch.
+    """
+    import tensorflow as tf
+    from keras.utils import timeseries_dataset_from_array
+
+    series = np.asarray(series).reshape(-1)
+    n_samples = max(len(series) - holdout - look_back - horizon + 1, 0)
+    dataset = timeseries_dataset_from_array(
+        series[:n_samples + look_back - 1, np.newaxis],
+        _targets(series, look_back, n_samples, horizon),
+        sequence_length=look_back,
+        batch_size=batch_size,
+        shuffle=shuffle
+    )
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def configure_cpu(threads=None):
+    """
+    oneDNN-friendly TensorFlow settings for CPU runs; call before TensorFlow is imported.
+
+    Enables the oneDNN kernels (already the default on x86 Linux builds) and, when
+    `threads` is given, sizes the intra-op pool to it with a single inter-op thread:
+    the LSTM's ops run one after another, so more inter-op threads only compete
+    for the same cores.
+    """
+    os.environ.setdefault("TF_ENABLE_ONEDNN_OPTS", "1")
+    if threads:
+        os.environ["TF_NUM_INTRAOP_THREADS"] = os.environ["OMP_NUM_THREADS"] = str(threads)
+        os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+
+
+def build_lstm_model(look_back, outputs=1, units=64, dropout=0.2, learning_rate=0.001, precision="float32"):
+    """
+    Builds and compiles the stacked LSTM; `outputs` > 1 predicts a whole horizon at once.
+
+    `precision` is one of PRECISIONS; the output layer always computes in float32.
+    """
+    from keras.layers import Dense, LSTM, Dropout
+    from keras.models import Sequential
+    from keras.optimizers import Adam
+
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown LSTM precision: {precision}. Available: {', '.join(PRECISIONS)}")
+    model = Sequential([
+        LSTM(units, return_sequences=True, input_shape=(look_back, 1), dtype=precision),
+        Dropout(dropout, dtype=precision),
+        LSTM(units, dtype=precision),
+        Dropout(dropout, dtype=precision),
+        Dense(outputs, dtype="float32")
+    ])
+
+    model.compile(optimizer=Adam(learning_rate=learning_rate), loss='mean_squared_error')
+    return model
+
+
+_compiled_steps = weakref.WeakKeyDictionary()
+
+
+def compiled_step(model):
+    """Returns a cached tf.function running one inference forward pass of `model`."""
+    step = _compiled_steps.get(model)
+    if step is None:
+        import tensorflow as tf
+
+        # The cached function must not keep its own key alive: hold the model weakly
+        model_ref = weakref.ref(model)
+        step = tf.function(lambda x: model_ref()(x, training=False), reduce_retracing=True)
+        _compiled_steps[model] = step
+    return step
+
+
+_compiled_rollouts = weakref.WeakKeyDictionary()
+
+
+def compiled_rollout(model):
+    """
+    Returns a cached tf.function running the whole recursive forecast in one graph call.
+
+    The loop over the horizon is a graph while-loop, so any horizon reuses the same trace.
+    """
+    rollout = _compiled_rollouts.get(model)
+    if rollout is None:
+        import tensorflow as tf
+
+        model_ref = weakref.ref(model)
+
+        @tf.function(reduce_retracing=True)
+        def rollout(x, horizon):
+            model = model_ref()
+            preds = tf.TensorArray(x.dtype, size=horizon)
+            for i in tf.range(horizon):
+                yhat = model(x, training=False)  # (batch, 1)
+                preds = preds.write(i, yhat[:, 0])
+                x = tf.concat([x[:, 1:, :], yhat[:, :, tf.newaxis]], axis=1)
+            return tf.transpose(preds.stack())
+
+        _compiled_rollouts[model] = rollout
+    return rollout
+
+
+_fixed_predictors = weakref.WeakKeyDictionary()
+
 
-def run_lstm(data, look_back=60):
+def fixed_shape_predictor(model, look_back, horizon=None, batch_size=1, jit_compile=False):
     """
-    Trains an LSTM model on the given data and forecasts the next 30 days.
+    Returns a cached predict function for inputs of exactly (batch_size, look_back).
+
+    The tf.function has a fixed float32 input_signature, so it is traced once when
+    created and never retraced. With `horizon` it runs the recursive forecast as one
+    graph loop (like `forecast_recursive`); without, a single forward pass (one step,
+    or a direct model's whole horizon). jit_compile=True compiles it with XLA.
+
+    Returns:
+        callable: windows (np.ndarray) -> scaled forecasts of shape (batch_size, steps).
+    """
+    key = (look_back, horizon, batch_size, jit_compile)
+    cache = _fixed_predictors.setdefault(model, {})
+    if key not in cache:
+        import tensorflow as tf
+
+        model_ref = weakref.ref(model)
+        signature = [tf.TensorSpec((batch_size, look_back, 1), tf.float32, name="window")]
+        if horizon is None:
+            graph = tf.function(lambda x: model_ref()(x, training=False), input_signature=signature,
+                                jit_compile=jit_compile)
+        else:
+            @tf.function(input_signature=signature, jit_compile=jit_compile)
+            def graph(x):
+                model = model_ref()
+                preds = tf.TensorArray(tf.float32, size=horizon)
+                for i in tf.range(horizon):
+                    yhat = model(x, training=False)
+                    preds = preds.write(i, yhat[:, 0])
+                    x = tf.concat([x[:, 1:, :], yhat[:, :, tf.newaxis]], axis=1)
+                return tf.transpose(preds.stack())
+
+        graph.get_concrete_function()  # trace now rather than on the first forecast
+
+        def predict(windows):
+            windows = np.asarray(windows, dtype=np.float32).reshape(batch_size, look_back, 1)
+            return graph(windows).numpy()
+
+        cache[key] = predict
+    return cache[key]
+
+
+def epoch_callbacks(name="lstm"):
+    """Keras callbacks recording each training epoch as a trace span (none when tracing is off)."""
+    if not is_enabled():
+        return []
+    from keras.callbacks import Callback
+
+    class EpochSpans(Callback):
+        def on_epoch_begin(self, epoch, logs=None):
+            self.span = span(f"{name}.epoch", "epoch", epoch=epoch)
+            self.span.__enter__()
+
+        def on_epoch_end(self, epoch, logs=None):
+            self.span.set(**{key: float(value) for key, value in (logs or {}).items()})
+            self.span.__exit__(None, None, None)
+
+    return [EpochSpans()]
+
+
+def forecast_recursive(model, windows, horizon):
+    """
+    Forecasts `horizon` steps by feeding each one-step prediction back as input.
+
+    Parameters:
+        model: One-output LSTM from `build_lstm_model`.
+        windows (np.ndarray): Scaled input windows, shape (batch, look_back) or (batch, look_back, 1).
+        horizon (int): Number of steps to forecast.
+
+    Returns:
+        np.ndarray: Scaled forecasts of shape (batch, horizon).
+    """
+    import tensorflow as tf
+
+    windows = np.asarray(windows, dtype=np.float32)
+    x = tf.convert_to_tensor(windows.reshape(windows.shape[0], -1, 1))
+    return compiled_rollout(model)(x, tf.constant(horizon)).numpy()
+
+
+def forecast_direct(model, windows):
+    """Forecasts the whole horizon of a multi-output model in one forward pass."""
+    windows = np.asarray(windows, dtype=np.float32)
+    x = windows.reshape(windows.shape[0], -1, 1)
+    return np.asarray(compiled_step(model)(x))
+
+
+def _load_warm_model(data, config, horizon, mode, precision, state_dir, full_refit):
+    """Returns (model, scaler, n_new) from a saved state, or (None, None, 0) if unusable."""
+    state = load_incremental_state(state_dir, "lstm", data.values, full_refit=full_refit)
+    # A newly tuned configuration retrains from scratch
+    if state is None or state["look_back"] != config["look_back"] or state.get("config") != config:
+        return None, None, 0
+    # Direct models are trained for one specific horizon
+    if state.get("mode", "recursive") != mode or (mode == "direct" and state.get("horizon") != horizon):
+        return None, None, 0
+    if state.get("precision", "float32") != precision:
+        return None, None, 0
+
+    # New values outside the fitted scaling range would shift the input distribution
+    scaler = state["scaler"]
+    if data.min() < scaler.data_min_[0] or data.max() > scaler.data_max_[0]:
+        return None, None, 0
+
+    model_path = state_path(state_dir, "lstm", ".keras")
+    if not os.path.exists(model_path):
+        return None, None, 0
+    from keras.models import load_model
+
+    return load_model(model_path), scaler, len(data) - state["n_obs"]
+
+
+@traced("run_lstm", profile=True)
+def run_lstm(data, look_back=None, horizon=30, mode="recursive", state_dir=None, full_refit=False,
+             fine_tune_epochs=3, streaming=None, config=None, precision="float32"):
+    """
+    Trains an LSTM model on the given data and forecasts the next `horizon` days.
     
     Args:
         data (pd.Series): Time series (e.g., Close prices).
-        look_back (int): Sequence length for LSTM input.
+        look_back (int or None): Sequence length for LSTM input. Overrides the configuration.
+        horizon (int): Number of days forecast (and held out for evaluation).
+        mode (str): 'recursive' trains a one-step model and feeds predictions back;
+            'direct' trains a multi-output model predicting the horizon in one pass.
+        state_dir (str or None): Directory holding the saved model. When set and the data
+            only gained new rows, the saved model is fine-tuned instead of retrained.
+        full_refit (bool): Ignore any saved model and train from scratch.
+        fine_tune_epochs (int): Epochs used when fine-tuning a saved model.
+        streaming (bool or None): Feed training windows through tf.data instead of an
+            in-memory array. None enables it automatically for very long series.
+        config (dict or None): Hyperparameters (keys of DEFAULT_CONFIG) overriding the
+            tuned configuration from outputs/tuning/lstm_best.json, or the defaults.
+        precision (str): 'float32', or 'mixed_bfloat16' to train and predict the LSTM
+            layers in bfloat16.
     
     Returns:
         tuple: (forecast, metrics)
     """
-    # Normalize the data
-    scaler = MinMaxScaler()
-    scaled_data = scaler.fit_transform(data.values.reshape(-1, 1))
+    if mode not in ("recursive", "direct"):
+        raise ValueError(f"Unknown LSTM forecast mode: {mode}")
+    target_steps = horizon if mode == "direct" else 1
+    config = {**load_config(), **(config or {})}
+    if look_back is not None:
+        config["look_back"] = look_back
+    look_back, batch_size, epochs = config["look_back"], config["batch_size"], config["epochs"]
 
-    # Split into train/test (train to N-30, predict 30 future days)
-    X, y = [], []
-    for i in range(look_back, len(scaled_data) - 30):
-        X.append(scaled_data[i - look_back:i, 0])
-        y.append(scaled_data[i, 0])
+    model, scaler, n_new = _load_warm_model(data, config, horizon, mode, precision, state_dir, full_refit)
 
-    X = np.array(X)
-    y = np.array(y)
-    X = X.reshape((X.shape[0], X.shape[1], 1))  # (samples, time steps, features)
+    # Normalize the data; the scaler keeps float64 so prices map back exactly, while
+    # the network sees float32 windows and needs no per-batch casts
+    if model is None:
+        from sklearn.preprocessing import MinMaxScaler
 
-    # LSTM Model architecture
-    model = Sequential([
-        LSTM(64, return_sequences=True, input_shape=(look_back, 1)),
-        Dropout(0.2),
-        LSTM(64),
-        Dropout(0.2),
-        Dense(1)
-    ])
+        scaler = MinMaxScaler()
+        scaled_data = scaler.fit_transform(data.values.reshape(-1, 1)).astype(np.float32)
+    else:
+        scaled_data = scaler.transform(data.values.reshape(-1, 1)).astype(np.float32)
+
+    # Split into train/test (train to N-horizon, predict `horizon` future days)
+    X, y = make_windows(scaled_data, look_back, holdout=horizon, horizon=target_steps)  # (samples, time steps, features)
+    if streaming is None:
+        streaming = X.shape[0] * look_back > STREAMING_THRESHOLD
+
+    if model is None:
+        # LSTM Model architecture
+        model = build_lstm_model(look_back, outputs=target_steps, units=config["units"],
+                                 dropout=config["dropout"], learning_rate=config["learning_rate"],
+                                 precision=precision)
+        with span("lstm.fit", samples=X.shape[0], epochs=epochs, streaming=streaming):
+            if streaming:
+                dataset = make_dataset(scaled_data, look_back, holdout=horizon, horizon=target_steps,
+                                       batch_size=batch_size)
+                model.fit(dataset, epochs=epochs, verbose=0, callbacks=epoch_callbacks())
+            else:
+                model.fit(X, y, epochs=epochs, batch_size=batch_size, verbose=0, callbacks=epoch_callbacks())
+    elif n_new > 0:
+        # Fine-tune on the most recent windows, which include the appended rows
+        print(f"Fine-tuning saved LSTM on {n_new} new observations...")
+        n_recent = max(FINE_TUNE_SAMPLES, n_new)
+        with span("lstm.fine_tune", samples=n_recent, epochs=fine_tune_epochs):
+            model.fit(X[-n_recent:], y[-n_recent:], epochs=fine_tune_epochs, batch_size=batch_size, verbose=0,
+                      callbacks=epoch_callbacks())
+    else:
+        print("Reusing saved LSTM (no new observations).")
 
-    model.compile(optimizer='adam', loss='mean_squared_error')
-    model.fit(X, y, epochs=50, batch_size=16, verbose=0)
+    if state_dir is not None:
+        os.makedirs(state_dir, exist_ok=True)
+        model.save(state_path(state_dir, "lstm", ".keras"))
+        save_state(state_dir, "lstm", {
+            "scaler": scaler,
+            "look_back": look_back,
+            "config": config,
+            "mode": mode,
+            "precision": precision,
+            "horizon": horizon,
+            "fitted_n_obs": len(data),
+            **describe_series(data.values),
+        })
 
-    # Forecast next 30 days
-    last_input = scaled_data[-look_back:]
-    preds = []
-    for _ in range(30):
-        x_input = last_input.reshape((1, look_back, 1))
-        yhat = model.predict(x_input, verbose=0)[0][0]
-        preds.append(yhat)
-        last_input = np.append(last_input[1:], yhat)
+    # Forecast next `horizon` days
+    last_input = scaled_data[-look_back:].reshape(1, look_back)
+    with span("lstm.forecast", mode=mode, horizon=horizon):
+        if mode == "direct":
+            preds = forecast_direct(model, last_input)[0]
+        else:
+            preds = forecast_recursive(model, last_input, horizon)[0]
 
     # Inverse transform predictions
-    preds = scaler.inverse_transform(np.array(preds).reshape(-1, 1)).flatten()
-    true_values = data[-30:].values
+    preds = scaler.inverse_transform(np.asarray(preds, dtype=np.float64).reshape(-1, 1)).flatten()
+    true_values = data[-horizon:].values
 
     # Evaluate
     metrics = evaluate_forecast(true_values, preds, model="LSTM")
     return preds, metrics
+
+
+def run_shared_lstm(series_by_key, look_back=60, horizon=30, epochs=50, batch_size=16, streaming=None):
+    """
+    Trains one LSTM across many series and forecasts each of them.
+
+    Every series is scaled with its own MinMaxScaler; the training windows of all
+    series are stacked into one batched tensor (or interleaved through tf.data for
+    very large panels), and all forecasts come from a single batched recursive pass.
+
+    Args:
+        series_by_key (dict): key (e.g. ticker) -> pd.Series of prices.
+        look_back (int): Sequence length for LSTM input.
+        horizon (int): Number of days forecast and held out for evaluation.
+        epochs (int): Training epochs.
+        batch_size (int): Training batch size.
+        streaming (bool or None): Interleave per-series tf.data pipelines instead of
+            stacking windows in memory. None decides from the total window size.
+
+    Returns:
+        dict: key -> (forecast, metrics). Series too short for a single window are skipped.
+    """
+    from sklearn.preprocessing import MinMaxScaler
+
+    scalers, scaled = {}, {}
+    for key, data in series_by_key.items():
+        if len(data) < look_back + horizon + 1:
+            print(f"Skipping LSTM for {key}: series too short")
+            continue
+        scalers[key] = MinMaxScaler()
+        scaled[key] = scalers[key].fit_transform(data.values.reshape(-1, 1)).astype(np.float32)
+    if not scaled:
+        return {}
+
+    n_windows = sum(len(values) - horizon - look_back for values in scaled.values())
+    if streaming is None:
+        streaming = n_windows * look_back > STREAMING_THRESHOLD
+
+    model = build_lstm_model(look_back)
+    if streaming:
+        import tensorflow as tf
+
+        datasets = [make_dataset(values, look_back, holdout=horizon, batch_size=batch_size).unbatch()
+                    for values in scaled.values()]
+        dataset = tf.data.Dataset.sample_from_datasets(datasets).batch(batch_size).prefetch(tf.data.AUTOTUNE)
+        model.fit(dataset, epochs=epochs, verbose=0)
+    else:
+        windows = [make_windows(values, look_back, holdout=horizon) for values in scaled.values()]
+        X = np.concatenate([w[0] for w in windows])
+        y = np.concatenate([w[1] for w in windows])
+        model.fit(X, y, epochs=epochs, batch_size=batch_size, verbose=0)
+
+    # Forecast every series in one batched pass
+    keys = list(scaled)
+    last_inputs = np.stack([scaled[key][-look_back:, 0] for key in keys])
+    preds = forecast_recursive(model, last_inputs, horizon)
+
+    results = {}
+    for key, pred in zip(keys, preds):
+        forecast = scalers[key].inverse_transform(pred.astype(np.float64).reshape(-1, 1)).flatten()
+        true_values = series_by_key[key][-horizon:].values
+        results[key] = (forecast, evaluate_forecast(true_values, forecast, model="LSTM"))
+    return results
@@ -0,0 +1,150 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models.model_state import DEFAULT_STATE_DIR, load_state, state_path
+
+
+def _unrolled_copy(model):
+    """A copy of the model with its LSTM layers unrolled over the fixed look_back, same weights."""
+    from keras.models import Sequential
+
+    config = model.get_config()
+    for layer in config["layers"]:
+        if layer["class_name"] == "LSTM":
+            layer["config"]["unroll"] = True
+    unrolled = Sequential.from_config(config)
+    unrolled.set_weights(model.get_weights())
+    return unrolled
+
+
+def _frozen_step(model, look_back):
+    """One forward pass over a fixed (1, look_back, 1) float32 input, weights folded into constants."""
+    import tensorflow as tf
+    from tensorflow.python.framework.convert_to_constants import convert_variables_to_constants_v2
+
+    step = tf.function(lambda x: model(x, training=False),
+                       input_signature=[tf.TensorSpec((1, look_back, 1), tf.float32, name="window")])
+    return convert_variables_to_constants_v2(step.get_concrete_function())
+
+
+def export_tflite(model, path, look_back, quantize=True):
+    """
+    Converts a trained LSTM to a TFLite model for single-window CPU inference.
+
+    The LSTM layers are unrolled over the fixed look_back, so the graph is plain
+    matrix ops that the builtin TFLite kernels (and XNNPACK) run; Keras' looped
+    LSTM would need TensorList ops. With `quantize`, dynamic-range quantization
+    stores the weights as int8 and the interpreter quantizes activations on the
+    fly, so no calibration data is needed. Should the builtin conversion fail, the
+    looped model is converted with TensorFlow ops (Flex), which needs a runtime
+    with the Flex delegate.
+
+    Returns:
+        str: `path`.
+    """
+    import tensorflow as tf
+
+    def convert(graph, select_ops=False):
+        converter = tf.lite.TFLiteConverter.from_concrete_functions([graph])
+        if quantize:
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if select_ops:
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS, tf.lite.OpsSet.SELECT_TF_OPS]
+            converter._experimental_lower_tensor_list_ops = False
+        return converter.convert()
+
+    try:
+        content = convert(_frozen_step(_unrolled_copy(model), look_back))
+    except Exception as e:
+        print(f"Builtin-only TFLite conversion failed ({type(e).__name__}); retrying with TensorFlow ops.")
+        content = convert(_frozen_step(model, look_back), select_ops=True)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _interpreter_class():
+    """The standalone LiteRT interpreter when installed, else the one bundled with TensorFlow."""
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteForecaster:
+    """
+    LSTM forecasts from an exported TFLite model.
+
+    Recursive forecasts make one interpreter call per step on the preallocated
+    input tensor and feed the prediction back into the window in NumPy; a direct
+    model's horizon comes from a single `predict`. A model with more than one
+    output is a direct model (see run_lstm's `mode`).
+    """
+
+    def __init__(self, path, num_threads=None):
+        self.interpreter = _interpreter_class()(model_path=path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self.input_index = self.interpreter.get_input_details()[0]["index"]
+        self.output_index = self.interpreter.get_output_details()[0]["index"]
+        self.look_back = int(self.interpreter.get_input_details()[0]["shape"][1])
+        self.outputs = int(self.interpreter.get_output_details()[0]["shape"][-1])
+
+    def predict(self, window):
+        """One forward pass on a single scaled window; returns the model's outputs."""
+        self.interpreter.set_tensor(self.input_index, np.asarray(window, dtype=np.float32).reshape(1, -1, 1))
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output_index)[0]
+
+    def forecast(self, windows, horizon):
+        """
+        Forecasts `horizon` steps for each window, like `forecast_recursive` (or `forecast_direct`).
+
+        Parameters:
+            windows (np.ndarray): Scaled input windows, shape (batch, look_back) or (batch, look_back, 1).
+            horizon (int): Number of steps to forecast.
+
+        Returns:
+            np.ndarray: Scaled forecasts of shape (batch, horizon).
+        """
+        windows = np.asarray(windows, dtype=np.float32).reshape(-1, self.look_back)
+        if self.outputs > 1:
+            if horizon > self.outputs:
+                raise ValueError(f"Direct model forecasts {self.outputs} steps, not {horizon}.")
+            return np.stack([self.predict(window)[:horizon] for window in windows])
+        preds = np.empty((len(windows), horizon), dtype=np.float32)
+        for row, window in enumerate(windows):
+            x = window.copy()
+            for i in range(horizon):
+                preds[row, i] = self.predict(x)[0]
+                x[:-1] = x[1:]
+                x[-1] = preds[row, i]
+        return preds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the saved LSTM to TFLite.")
+    parser.add_argument("--state-dir", default=DEFAULT_STATE_DIR)
+    parser.add_argument("--output", default=None, help="Defaults to lstm.tflite in the state directory.")
+    parser.add_argument("--no-quantize", action="store_true", help="Keep float32 weights.")
+    args = parser.parse_args()
+
+    state = load_state(args.state_dir, "LSTM")
+    if state is None:
+        sys.exit(f"No saved LSTM in {args.state_dir}; run evaluation/evaluate_models.py first.")
+    from keras.models import load_model
+
+    model = load_model(state_path(args.state_dir, "LSTM", ".keras"))
+    path = export_tflite(model, args.output or state_path(args.state_dir, "LSTM", ".tflite"), state["look_back"],
+                         quantize=not args.no_quantize)
+    print(f"TFLite model saved to {path} ({os.path.getsize(path) / 1024:.0f} KiB)")
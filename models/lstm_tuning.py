@@ -0,0 +1,303 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from evaluation.scheduler import thread_limits
+from models.lstm_model import DEFAULT_CONFIG, TUNED_CONFIG_PATH
+from models.order_search import series_fingerprint
+from utils.tracing import span
+
+# Discrete choices, except learning_rate: a (low, high) range sampled log-uniformly
+SEARCH_SPACE = {
+    "look_back": [30, 60, 90],
+    "units": [32, 64, 128],
+    "dropout": [0.0, 0.1, 0.2, 0.3],
+    "batch_size": [16, 32, 64],
+    "learning_rate": (1e-4, 1e-2),
+}
+DEFAULT_TUNING_DIR = os.path.dirname(TUNED_CONFIG_PATH)
+
+
+def sample_configs(n_trials, seed=0):
+    """
+    Draws `n_trials` random configurations from SEARCH_SPACE.
+
+    The first one is DEFAULT_CONFIG, so the untuned model is always measured
+    alongside the sampled ones.
+    """
+    rng = np.random.default_rng(seed)
+    configs = [{key: DEFAULT_CONFIG[key] for key in SEARCH_SPACE}]
+    low, high = SEARCH_SPACE["learning_rate"]
+    while len(configs) < n_trials:
+        config = {key: choices[rng.integers(len(choices))] for key, choices in SEARCH_SPACE.items()
+                  if key != "learning_rate"}
+        config["learning_rate"] = float(np.exp(rng.uniform(np.log(low), np.log(high))))
+        # numpy scalars are not JSON-serialisable
+        configs.append({key: value.item() if hasattr(value, "item") else value for key, value in config.items()})
+    return configs[:n_trials]
+
+
+def rung_budgets(min_epochs, max_epochs, eta):
+    """Cumulative epoch budgets of the successive-halving rungs, e.g. 5, 15, 45, 50."""
+    budgets = []
+    budget = min_epochs
+    while budget < max_epochs:
+        budgets.append(budget)
+        budget *= eta
+    return budgets + [max_epochs]
+
+
+def prepare_series(data, horizon=30, val_fraction=0.2):
+    """
+    Scales a price series for tuning and sizes its validation split.
+
+    The last `horizon` values, on which run_lstm is evaluated, are dropped. The
+    validation targets are the last `val_fraction` of the rest (at least
+    `horizon` values); scaling uses the training part only.
+
+    Returns:
+        tuple: (scaled float32 array, number of validation targets)
+    """
+    values = np.asarray(data, dtype=np.float64).reshape(-1)[:-horizon]
+    n_val = max(horizon, int(len(values) * val_fraction))
+    train = values[:-n_val]
+    low, high = train.min(), train.max()
+    return ((values - low) / max(high - low, np.finfo(float).tiny)).astype(np.float32), n_val
+
+
+def _train_trial(trial, config, budget, start_epoch, values, n_val, checkpoint, patience, seed, previous=None):
+    """
+    Trains one trial up to `budget` total epochs, resuming from its checkpoint.
+
+    Training stops early once the validation loss has not improved for `patience`
+    epochs, counted across rungs from `previous` (the trial's last result). The
+    best weights are saved for the next rung; if no new epoch beats `previous`,
+    its checkpoint and validation loss are kept.
+    """
+    import keras
+    from keras.callbacks import EarlyStopping
+    from models.lstm_model import build_lstm_model, make_windows
+
+    started = time.perf_counter()
+    keras.utils.set_random_seed(seed + trial)
+    look_back = config["look_back"]
+    X, y = make_windows(values, look_back, holdout=0)
+    X_train, y_train = X[:-n_val], y[:-n_val]
+    X_val, y_val = X[-n_val:], y[-n_val:]
+
+    if start_epoch:
+        model = keras.models.load_model(checkpoint)
+    else:
+        model = build_lstm_model(look_back, units=config["units"], dropout=config["dropout"],
+                                 learning_rate=config["learning_rate"])
+    if previous:
+        # Only epochs beating the previous best reset the patience, which the epochs
+        # since that best have already partly used up
+        waited = previous["epochs"] - previous["best_epoch"]
+        stop = EarlyStopping(monitor="val_loss", patience=max(1, patience - waited),
+                             baseline=previous["val_loss"], restore_best_weights=True)
+    else:
+        stop = EarlyStopping(monitor="val_loss", patience=patience, restore_best_weights=True)
+    history = model.fit(X_train, y_train, validation_data=(X_val, y_val), epochs=budget,
+                        initial_epoch=start_epoch, batch_size=config["batch_size"], verbose=0, callbacks=[stop])
+
+    val_loss = history.history["val_loss"]
+    best = int(np.argmin(val_loss))
+    result = {
+        "trial": trial,
+        "val_loss": float(val_loss[best]),
+        "best_epoch": start_epoch + best + 1,
+        "epochs": start_epoch + len(val_loss),
+        "stopped": bool(stop.stopped_epoch),
+    }
+    if previous and result["val_loss"] >= previous["val_loss"]:
+        # No improvement: keep the previous checkpoint and best result
+        result.update(val_loss=previous["val_loss"], best_epoch=previous["best_epoch"])
+    else:
+        model.save(checkpoint)
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+class AshaScheduler:
+    """
+    Asynchronous successive halving (ASHA) over a fixed list of configurations.
+
+    Each trial first trains for the smallest budget. Whenever a worker is free, the
+    best not yet promoted trial in the top 1/eta of its rung is promoted to the next
+    budget (highest rung first); otherwise a new trial is started. The remaining
+    trials are pruned. A trial whose early stopping already fired is promoted
+    without further training, since its validation loss no longer improves.
+    """
+
+    def __init__(self, configs, budgets, eta=3):
+        self.configs = configs
+        self.budgets = budgets
+        self.eta = eta
+        self.rungs = [[] for _ in budgets]
+        self.promoted = [set() for _ in budgets]
+        self.latest = {}
+        self.next_trial = 0
+
+    def next_job(self):
+        """(trial, rung) to run next, or None when nothing is runnable right now."""
+        for rung in reversed(range(len(self.budgets) - 1)):
+            ranked = sorted(self.rungs[rung], key=lambda r: r["val_loss"])
+            for result in ranked[:len(ranked) // self.eta]:
+                trial = result["trial"]
+                if trial in self.promoted[rung]:
+                    continue
+                self.promoted[rung].add(trial)
+                if result["stopped"]:
+                    self.report(dict(result, rung=rung + 1))
+                    return self.next_job()
+                return trial, rung + 1
+        if self.next_trial < len(self.configs):
+            self.next_trial += 1
+            return self.next_trial - 1, 0
+        return None
+
+    def report(self, result):
+        self.rungs[result["rung"]].append(result)
+        self.latest[result["trial"]] = result
+
+    def best(self):
+        """Best result of the highest rung reached by any trial."""
+        top = next(rung for rung in reversed(self.rungs) if rung)
+        return min(top, key=lambda r: r["val_loss"])
+
+
+def tune_lstm(data, n_trials=27, horizon=30, val_fraction=0.2, min_epochs=5, max_epochs=50, eta=3,
+              patience=5, n_jobs=None, threads_per_trial=None, seed=0, output_dir=DEFAULT_TUNING_DIR):
+    """
+    Searches LSTM hyperparameters with a validation split, early stopping and ASHA pruning.
+
+    Parameters:
+        data (pd.Series): Price series; its last `horizon` values are never used.
+        n_trials (int): Number of sampled configurations.
+        horizon (int): Evaluation window of run_lstm, held out here.
+        val_fraction (float): Share of the remaining values used as validation targets.
+        min_epochs, max_epochs (int): Smallest and largest rung budget in epochs.
+        eta (int): Reduction factor; the top 1/eta of a rung is promoted.
+        patience (int): Early-stopping patience in epochs.
+        n_jobs (int or None): Trials trained side by side in worker processes.
+            Defaults to the CPU count; 1 trains in this process.
+        threads_per_trial (int or None): TensorFlow/BLAS threads per worker.
+            Defaults to cpu_count // n_jobs.
+        seed (int): Seeds the sampled configurations and each trial's weights.
+        output_dir (str): Holds the trial checkpoints while the search runs.
+
+    Returns:
+        dict: The saved result: best configuration, its validation loss and every trial.
+    """
+    values, n_val = prepare_series(data, horizon, val_fraction)
+    configs = sample_configs(n_trials, seed)
+    max_look_back = max(config["look_back"] for config in configs)
+    if len(values) - max_look_back <= 2 * n_val:
+        raise ValueError(f"Series too short to tune look_back up to {max_look_back} "
+                         f"with {n_val} validation values.")
+
+    budgets = rung_budgets(min_epochs, max_epochs, eta)
+    cpu_count = os.cpu_count() or 1
+    n_jobs = max(1, min(n_jobs or cpu_count, n_trials))
+    threads_per_trial = threads_per_trial or max(1, cpu_count // n_jobs)
+    checkpoint_dir = os.path.join(output_dir, "checkpoints")
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    print(f"Tuning LSTM: {n_trials} trials, epoch budgets {budgets}, {n_jobs} worker(s) "
+          f"x {threads_per_trial} thread(s).")
+
+    scheduler = AshaScheduler(configs, budgets, eta)
+
+    def job_args(trial, rung):
+        previous = scheduler.latest.get(trial)
+        return dict(trial=trial, config=configs[trial], budget=budgets[rung],
+                    start_epoch=previous["epochs"] if previous else 0, values=values, n_val=n_val,
+                    checkpoint=os.path.join(checkpoint_dir, f"trial_{trial}.keras"), patience=patience, seed=seed,
+                    previous=previous)
+
+    def record(result, rung):
+        result["rung"] = rung
+        scheduler.report(result)
+        print(f"Trial {result['trial']:>3} rung {rung} ({result['epochs']:>2} epochs): "
+              f"val_loss {result['val_loss']:.6f}  {configs[result['trial']]}")
+
+    started = time.perf_counter()
+    with span("lstm_tuning", trials=n_trials, workers=n_jobs):
+        if n_jobs <= 1:
+            while (job := scheduler.next_job()) is not None:
+                record(_train_trial(**job_args(*job)), job[1])
+        else:
+            with thread_limits(threads_per_trial), \
+                    ProcessPoolExecutor(max_workers=n_jobs, mp_context=mp.get_context("spawn")) as pool:
+                running = {}
+                while True:
+                    while len(running) < n_jobs and (job := scheduler.next_job()) is not None:
+                        running[pool.submit(_train_trial, **job_args(*job))] = job[1]
+                    if not running:
+                        break
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        record(future.result(), running.pop(future))
+
+    best = scheduler.best()
+    result = {
+        # Retraining on all data runs for as many epochs as the best trial needed
+        "config": {**configs[best["trial"]], "epochs": best["best_epoch"]},
+        "val_loss": best["val_loss"],
+        "baseline_val_loss": scheduler.latest[0]["val_loss"],
+        "data_fingerprint": series_fingerprint(np.asarray(data, dtype=np.float64)),
+        "search": {"n_trials": n_trials, "budgets": budgets, "eta": eta, "patience": patience,
+                   "val_fraction": val_fraction, "horizon": horizon, "seed": seed},
+        "seconds": time.perf_counter() - started,
+        "trials": [dict(scheduler.latest[trial], config=configs[trial]) for trial in sorted(scheduler.latest)],
+    }
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    return result
+
+
+def save_best_config(result, path=TUNED_CONFIG_PATH):
+    """Writes the tuning result; run_lstm picks up its 'config' on the next run."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(result, f, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Tune the LSTM hyperparameters used by run_lstm.")
+    parser.add_argument("--trials", type=int, default=27, help="Number of sampled configurations.")
+    parser.add_argument("--min-epochs", type=int, default=5, help="Epoch budget of the first rung.")
+    parser.add_argument("--max-epochs", type=int, default=50, help="Epoch budget of the last rung.")
+    parser.add_argument("--eta", type=int, default=3, help="Keep the top 1/eta of each rung.")
+    parser.add_argument("--patience", type=int, default=5, help="Early-stopping patience in epochs.")
+    parser.add_argument("--val-fraction", type=float, default=0.2)
+    parser.add_argument("--workers", type=int, default=None, help="Parallel trials (1 trains in-process).")
+    parser.add_argument("--threads-per-trial", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=TUNED_CONFIG_PATH, help="Where the best configuration is saved.")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    from utils.storage import load_cleaned_data
+
+    args = parse_args()
+    close_prices = load_cleaned_data(columns=['Close'])['Close'].interpolate()
+    result = tune_lstm(close_prices, n_trials=args.trials, val_fraction=args.val_fraction,
+                       min_epochs=args.min_epochs, max_epochs=args.max_epochs, eta=args.eta,
+                       patience=args.patience, n_jobs=args.workers, threads_per_trial=args.threads_per_trial,
+                       seed=args.seed, output_dir=os.path.dirname(args.output) or ".")
+    path = save_best_config(result, args.output)
+    print(f"\nBest configuration (val_loss {result['val_loss']:.6f}, default "
+          f"{result['baseline_val_loss']:.6f}) saved to {path}:")
+    print(json.dumps(result["config"], indent=2))
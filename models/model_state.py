@@ -0,0 +1,65 @@
+import os
+import pickle
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models.order_search import series_fingerprint
+
+DEFAULT_STATE_DIR = "outputs/state"
+
+# Force a full refit once more than this fraction of new observations has been
+# absorbed incrementally, so parameters don't drift too far from the data.
+MAX_INCREMENTAL_GROWTH = 0.1
+
+
+def state_path(state_dir, name, suffix=".pkl"):
+    return os.path.join(state_dir, f"{name.lower()}{suffix}")
+
+
+def save_state(state_dir, name, state):
+    """Pickles a model's fitted state to <state_dir>/<name>.pkl."""
+    os.makedirs(state_dir, exist_ok=True)
+    path = state_path(state_dir, name)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def load_state(state_dir, name):
+    """Returns the saved state for `name`, or None if missing or unreadable."""
+    try:
+        with open(state_path(state_dir, name), "rb") as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+
+
+def describe_series(values):
+    """Metadata stored alongside a fitted state to recognise appended data later."""
+    return {"n_obs": len(values), "fingerprint": series_fingerprint(values)}
+
+
+def load_incremental_state(state_dir, name, values, full_refit=False):
+    """
+    Returns a saved state that can be updated with `values`, or None if a full refit is needed.
+
+    The state is reusable when `values` starts with exactly the series the state was
+    fitted on (i.e. rows were only appended) and the number of observations added
+    since the last full fit stays within MAX_INCREMENTAL_GROWTH.
+    """
+    if state_dir is None or full_refit:
+        return None
+    values = np.asarray(values, dtype=np.float64)
+    state = load_state(state_dir, name)
+    if state is None:
+        return None
+
+    n_obs = state["n_obs"]
+    if len(values) < n_obs or series_fingerprint(values[:n_obs]) != state["fingerprint"]:
+        return None
+    if len(values) - state["fitted_n_obs"] > state["fitted_n_obs"] * MAX_INCREMENTAL_GROWTH:
+        return None
+    return state
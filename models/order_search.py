@@ -0,0 +1,254 @@
+import hashlib
+import itertools
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from evaluation.scheduler import thread_limits
+from utils.tracing import span
+
+# Keyed by the series content, so one cache under the project root serves every working directory
+DEFAULT_CACHE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "outputs", "cache", "orders"))
+
+
+def build_search_space(seasonal=False, m=1, max_p=5, max_q=5, max_P=2, max_Q=2, max_d=2, max_D=1, max_order=5):
+    """
+    Describes the (p,d,q)(P,D,Q,m) candidates explored by `search_order`.
+
+    The defaults are pmdarima's auto_arima bounds, including `max_order`, the largest
+    p+q+P+Q of a grid candidate. The returned dict is JSON-serialisable and is part
+    of the cache key, so changing any bound triggers a fresh search.
+    """
+    return {
+        "seasonal": bool(seasonal),
+        "m": int(m) if seasonal else 1,
+        "max_p": max_p,
+        "max_q": max_q,
+        "max_P": max_P if seasonal else 0,
+        "max_Q": max_Q if seasonal else 0,
+        "max_d": max_d,
+        "max_D": max_D if seasonal else 0,
+        "max_order": max_order,
+    }
+
+
+def series_fingerprint(values):
+    """Returns a stable hash of a numeric series' values."""
+    arr = np.ascontiguousarray(np.asarray(values, dtype=np.float64))
+    return hashlib.sha1(arr.tobytes()).hexdigest()
+
+
+def _space_key(space, method):
+    return hashlib.sha1(json.dumps({"space": space, "method": method}, sort_keys=True).encode()).hexdigest()
+
+
+class OrderCache:
+    """
+    On-disk cache of selected ARIMA/SARIMA orders.
+
+    Entries are keyed by the search space and a fingerprint of the training
+    series. A lookup also hits when the series is an extension of a cached one
+    by at most `max_growth` (fraction of the cached length), so daily appends
+    reuse the previous search. The least recently used entries are evicted once
+    more than `max_entries` are stored.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_entries=64, max_growth=0.05):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_growth = max_growth
+        self.index_path = os.path.join(cache_dir, "index.json")
+
+    def _load(self):
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, index):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def lookup(self, values, space, method="grid"):
+        """Returns the cached entry for `values`, or None on a miss."""
+        values = np.asarray(values, dtype=np.float64)
+        space_key = _space_key(space, method)
+        index = self._load()
+
+        # Longest matching prefix first: it is the closest to the current data
+        candidates = sorted(
+            (item for item in index.items() if item[1]["space_key"] == space_key),
+            key=lambda item: item[1]["n_obs"],
+            reverse=True,
+        )
+        for key, entry in candidates:
+            n_obs = entry["n_obs"]
+            if not n_obs <= len(values) <= n_obs * (1 + self.max_growth):
+                continue
+            if series_fingerprint(values[:n_obs]) == entry["fingerprint"]:
+                entry["last_used"] = time.time()
+                self._save(index)
+                return entry
+        return None
+
+    def store(self, values, space, order, seasonal_order, aic=None, method="grid"):
+        """Adds a search result and evicts least recently used entries over the limit."""
+        values = np.asarray(values, dtype=np.float64)
+        fingerprint = series_fingerprint(values)
+        space_key = _space_key(space, method)
+        now = time.time()
+
+        index = self._load()
+        index[f"{space_key[:16]}-{fingerprint[:16]}"] = {
+            "space_key": space_key,
+            "fingerprint": fingerprint,
+            "n_obs": int(len(values)),
+            "order": list(order),
+            "seasonal_order": list(seasonal_order),
+            "aic": None if aic is None else float(aic),
+            "created": now,
+            "last_used": now,
+        }
+        if len(index) > self.max_entries:
+            by_age = sorted(index, key=lambda k: index[k]["last_used"])
+            for key in by_age[:len(index) - self.max_entries]:
+                del index[key]
+        self._save(index)
+
+
+def _fit_candidate(values, order, seasonal_order, trend):
+    """Fits one SARIMAX candidate and returns its AIC (inf if the fit fails)."""
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    with warnings.catch_warnings(), span("order_search.candidate", "search", order=order,
+                                         seasonal_order=seasonal_order):
+        warnings.simplefilter("ignore")
+        try:
+            fit = SARIMAX(values, order=order, seasonal_order=seasonal_order, trend=trend).fit(disp=False)
+            aic = fit.aic
+        except Exception:
+            aic = np.inf
+    if not np.isfinite(aic):
+        aic = np.inf
+    return order, seasonal_order, aic
+
+
+def _default_jobs():
+    """All cores, unless this already is a worker process (e.g. one model of a parallel
+    evaluation): a nested pool per model would oversubscribe the cores and bypass the
+    scheduler's per-worker thread caps."""
+    if mp.parent_process() is not None:
+        return 1
+    return os.cpu_count() or 1
+
+
+def _grid_search(values, space, n_jobs):
+    from pmdarima.arima import ndiffs, nsdiffs
+
+    m = space["m"]
+    d = ndiffs(values, test="kpss", max_d=space["max_d"])
+    D = nsdiffs(values, m=m, max_D=space["max_D"]) if space["seasonal"] and m > 1 else 0
+    # Match auto_arima: only include an intercept when the series is not differenced twice
+    trend = "c" if d + D < 2 else None
+
+    orders = [(p, d, q) for p, q in itertools.product(range(space["max_p"] + 1), range(space["max_q"] + 1))]
+    if space["seasonal"]:
+        seasonal_orders = [(P, D, Q, m) for P, Q in
+                           itertools.product(range(space["max_P"] + 1), range(space["max_Q"] + 1))]
+    else:
+        seasonal_orders = [(0, 0, 0, 0)]
+    candidates = [(order, seasonal_order) for order, seasonal_order in itertools.product(orders, seasonal_orders)
+                  if order[0] + order[2] + seasonal_order[0] + seasonal_order[2] <= space["max_order"]]
+
+    n_jobs = min(n_jobs or _default_jobs(), len(candidates))
+    args = ([values] * len(candidates), [c[0] for c in candidates],
+            [c[1] for c in candidates], [trend] * len(candidates))
+    if n_jobs <= 1:
+        results = list(map(_fit_candidate, *args))
+    else:
+        # One BLAS thread per worker: the parallelism comes from fitting candidates side by side
+        with thread_limits(1):
+            with ProcessPoolExecutor(max_workers=n_jobs, mp_context=mp.get_context("spawn")) as pool:
+                results = list(pool.map(_fit_candidate, *args,
+                                        chunksize=max(1, len(candidates) // (n_jobs * 4))))
+
+    return min(results, key=lambda r: r[2])
+
+
+def _stepwise_search(values, space):
+    from pmdarima import auto_arima
+
+    # auto_arima rejects seasonal bounds below its start values, so they are only passed when used
+    seasonal_bounds = {key: space[key] for key in ("max_P", "max_Q", "max_D")} if space["seasonal"] else {}
+    model = auto_arima(
+        values,
+        seasonal=space["seasonal"],
+        m=space["m"],
+        max_p=space["max_p"],
+        max_q=space["max_q"],
+        max_d=space["max_d"],
+        max_order=space["max_order"],
+        **seasonal_bounds,
+        stepwise=True,
+        suppress_warnings=True,
+        error_action='ignore',
+        trace=False
+    )
+    return model.order, model.seasonal_order, model.aic()
+
+
+def search_order(train, seasonal=False, m=1, method="stepwise", n_jobs=None, use_cache=True,
+                 cache_dir=DEFAULT_CACHE_DIR, space=None):
+    """
+    Selects ARIMA/SARIMA orders for a training series, reusing cached results when possible.
+
+    Parameters:
+        train (pd.Series or np.ndarray): Training series.
+        seasonal (bool): Whether to search seasonal orders.
+        m (int): Seasonal period (ignored if not seasonal).
+        method (str): 'stepwise' runs pmdarima's stepwise auto_arima (the original
+            selection); 'grid' fits every candidate in parallel and picks the lowest AIC.
+        n_jobs (int or None): Worker processes for the grid search. Defaults to all cores,
+            or 1 inside a worker process.
+        use_cache (bool): Read and write the on-disk order cache.
+        cache_dir (str): Location of the order cache.
+        space (dict or None): Search space from `build_search_space`.
+
+    Returns:
+        tuple: (order, seasonal_order)
+    """
+    values = np.asarray(train, dtype=np.float64)
+    if space is None:
+        space = build_search_space(seasonal=seasonal, m=m)
+    cache = OrderCache(cache_dir) if use_cache else None
+
+    if cache is not None:
+        with span("order_search.cache_lookup", "search") as lookup:
+            entry = cache.lookup(values, space, method=method)
+            lookup.set(hit=entry is not None)
+        if entry is not None:
+            print("Using cached order selection.")
+            return tuple(entry["order"]), tuple(entry["seasonal_order"])
+
+    if method not in ("grid", "stepwise"):
+        raise ValueError(f"Unknown order search method: {method}")
+    with span(f"order_search.{method}", "search", n_obs=len(values), seasonal=space["seasonal"]):
+        if method == "grid":
+            order, seasonal_order, aic = _grid_search(values, space, n_jobs)
+        else:
+            order, seasonal_order, aic = _stepwise_search(values, space)
+
+    if cache is not None:
+        cache.store(values, space, order, seasonal_order, aic=aic, method=method)
+    return tuple(order), tuple(seasonal_order)
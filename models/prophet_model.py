@@ -1,33 +1,171 @@
+import functools
+import multiprocessing as mp
+import numpy as np
 import pandas as pd
-from prophet import Prophet
 import sys
 import os
+from concurrent.futures import ProcessPoolExecutor
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from utils.helpers import evaluate_forecast
+from utils.storage import write_table
+from models.model_state import load_incremental_state, save_state, describe_series
+from utils.tracing import span, traced
 
-def run_prophet(data):
+# Model settings shared by training, backtesting and serving
+PROPHET_PARAMS = {
+    "daily_seasonality": False,
+    "weekly_seasonality": True,
+    "yearly_seasonality": True,
+    "changepoint_prior_scale": 0.05,
+}
+# Prophet's default number of draws for uncertainty intervals
+INTERVAL_SAMPLES = 1000
+# A worker process needs ~2 s to start and import Prophet, while ~5M draws (rows x
+# samples) take about a second, so smaller jobs are sampled in-process by default
+PARALLEL_MIN_DRAWS = 20_000_000
+
+# Stan backend (compiled model) loaded once per process and shared by all Prophet objects
+_stan_backend = None
+
+
+def stan_init(model):
+    """Extracts a fitted Prophet model's parameters in the form accepted by `fit(init=...)`."""
+    res = {}
+    for pname in ['k', 'm', 'sigma_obs']:
+        res[pname] = model.params[pname][0][0]
+    for pname in ['delta', 'beta']:
+        res[pname] = model.params[pname][0]
+    return res
+
+
+@functools.lru_cache(maxsize=None)
+def _prophet_class():
+    from prophet import Prophet
+
+    class CachedBackendProphet(Prophet):
+        """Prophet that reuses the process-wide Stan backend instead of loading it per instance."""
+
+        def _load_stan_backend(self, stan_backend):
+            global _stan_backend
+            if _stan_backend is None or stan_backend not in (None, _stan_backend.get_type()):
+                super()._load_stan_backend(stan_backend)
+                _stan_backend = self.stan_backend
+            self.stan_backend = _stan_backend
+
+    return CachedBackendProphet
+
+
+def make_prophet(uncertainty_samples=0, **params):
+    """
+    Builds a Prophet model with the project's settings.
+
+    Fits are MAP estimates (no MCMC). With `uncertainty_samples=0`, the default,
+    `predict` skips the simulation behind yhat_lower/yhat_upper, which otherwise
+    dominates prediction time; use `predict_intervals` when intervals are needed.
+    """
+    return _prophet_class()(uncertainty_samples=uncertainty_samples, **{**PROPHET_PARAMS, **params})
+
+
+def _sample_yhat(model_json, future, samples, seed):
+    """Worker: draws `samples` posterior predictive samples of yhat for `future`."""
+    from prophet.serialize import model_from_json
+
+    model = model_from_json(model_json)
+    model.uncertainty_samples = samples
+    np.random.seed(seed)
+    return model.predictive_samples(future)["yhat"]
+
+
+def predict_intervals(model, future, samples=INTERVAL_SAMPLES, n_jobs=None, seed=0):
+    """
+    Uncertainty intervals for a fitted model, with the sampling split across processes.
+
+    Each worker draws an equal share of the `samples` posterior predictive draws
+    for all rows; the quantiles are taken over the pooled draws.
+
+    Parameters:
+        model: Fitted Prophet model.
+        future (pd.DataFrame): Rows to predict (column 'ds').
+        samples (int): Total number of draws.
+        n_jobs (int or None): Worker processes. Defaults to all cores once rows x samples
+            reaches PARALLEL_MIN_DRAWS; 1 samples in-process.
+        seed (int): Base random seed; worker i uses seed + i.
+
+    Returns:
+        pd.DataFrame: ds, yhat_lower and yhat_upper at the model's interval_width.
+    """
+    from prophet.serialize import model_to_json
+    from evaluation.scheduler import thread_limits
+
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1 if len(future) * samples >= PARALLEL_MIN_DRAWS else 1
+    n_jobs = max(1, min(n_jobs, samples))
+    shares = [len(chunk) for chunk in np.array_split(np.arange(samples), n_jobs)]
+    model_json = model_to_json(model)
+    if n_jobs == 1:
+        draws = [_sample_yhat(model_json, future, samples, seed)]
+    else:
+        with thread_limits(1):
+            with ProcessPoolExecutor(max_workers=n_jobs, mp_context=mp.get_context("spawn")) as pool:
+                draws = list(pool.map(_sample_yhat, [model_json] * n_jobs, [future] * n_jobs, shares,
+                                      [seed + i for i in range(n_jobs)]))
+    draws = np.concatenate(draws, axis=1)
+    tail = (1 - model.interval_width) / 2 * 100
+    lower, upper = np.nanpercentile(draws, [tail, 100 - tail], axis=1)
+    return pd.DataFrame({"ds": future["ds"].values, "yhat_lower": lower, "yhat_upper": upper})
+
+
+@traced("run_prophet", profile=True)
+def run_prophet(data, state_dir=None, full_refit=False, horizon_only=False, horizon=30,
+                intervals_path=None, n_jobs=None):
     """
     Run Prophet model on stock Close prices.
     Assumes input is a pandas Series or DataFrame with datetime index and a 'Close' column.
+
+    When `state_dir` is set and the data only gained new rows since the saved fit, the
+    optimizer is initialised from the previous parameters. `full_refit` disables this.
+
+    The fit is a MAP estimate and no uncertainty draws are simulated unless
+    `intervals_path` is given.
+
+    Parameters:
+        horizon_only (bool): Predict (and evaluate) only the last `horizon` days instead of
+            the whole history. Those are the only rows the plots and the ensemble use.
+        horizon (int): Rows predicted when `horizon_only` is set.
+        intervals_path (str or None): Also compute uncertainty intervals for the predicted
+            rows, in parallel, and write them to this table.
+        n_jobs (int or None): Worker processes for the interval sampling.
     """
     # Prepare DataFrame with required Prophet format
     df = data.reset_index()[['Date', 'Close']].rename(columns={'Date': 'ds', 'Close': 'y'})
 
     # Initialize Prophet
-    model = Prophet(
-        daily_seasonality=False,
-        weekly_seasonality=True,
-        yearly_seasonality=True,
-        changepoint_prior_scale=0.05
-    )
-
-    # Fit model
-    model.fit(df)
-
-    # Make future predictions
-    future = model.make_future_dataframe(periods=30)
-    forecast = model.predict(future)
+    model = make_prophet()
+
+    # Fit model, warm-starting from the previous parameters when possible
+    state = load_incremental_state(state_dir, "prophet", df['y'], full_refit=full_refit)
+    with span("prophet.fit", n_obs=len(df), warm_start=state is not None):
+        if state is not None:
+            print("Warm-starting Prophet from previous fit...")
+            model.fit(df, init=state["init"])
+        else:
+            model.fit(df)
+
+    if state_dir is not None:
+        save_state(state_dir, "prophet", {
+            "init": stan_init(model),
+            "fitted_n_obs": len(df),
+            **describe_series(df['y']),
+        })
+
+    # Make predictions; future rows beyond the data are not evaluated, so they are skipped
+    future = df[['ds']].iloc[-horizon:] if horizon_only else df[['ds']]
+    with span("prophet.predict", rows=len(future)):
+        forecast = model.predict(future)
+    if intervals_path is not None:
+        with span("prophet.intervals", rows=len(future)):
+            write_table(predict_intervals(model, future, n_jobs=n_jobs).set_index('ds'), intervals_path)
 
     # Extract predicted values for last 30 days
     forecast_result = forecast.set_index('ds')['yhat']
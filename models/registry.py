@@ -0,0 +1,54 @@
+import importlib
+
+# Model name -> (module, function). Modules are only imported when a model is
+# requested, and import their heavy dependencies (statsmodels, Prophet,
+# TensorFlow) inside the functions that use them.
+MODEL_REGISTRY = {
+    "ARIMA": ("models.arima_model", "run_arima"),
+    "SARIMA": ("models.sarima_model", "run_sarima"),
+    "Prophet": ("models.prophet_model", "run_prophet"),
+    "LSTM": ("models.lstm_model", "run_lstm"),
+}
+
+# Reporting order
+MODEL_NAMES = tuple(MODEL_REGISTRY)
+
+
+def canonical_name(name):
+    """Maps a case-insensitive model name (e.g. 'lstm') to its registry name."""
+    names = {key.lower(): key for key in MODEL_REGISTRY}
+    try:
+        return names[name.strip().lower()]
+    except KeyError:
+        raise ValueError(f"Unknown model: {name!r}. Available: {', '.join(MODEL_NAMES)}") from None
+
+
+def parse_models(spec=None):
+    """
+    Resolves a model selection to registry names in reporting order.
+
+    Parameters:
+        spec (str, iterable or None): Comma-separated names ('arima,lstm'), a list of
+            names, or None for all models.
+
+    Returns:
+        list: Selected model names.
+    """
+    if spec is None:
+        return list(MODEL_NAMES)
+    if isinstance(spec, str):
+        spec = [name for name in spec.split(",") if name.strip()]
+    selected = {canonical_name(name) for name in spec}
+    return [name for name in MODEL_NAMES if name in selected]
+
+
+def model_target(name):
+    """Dotted path of a model's run function, e.g. 'models.arima_model.run_arima'."""
+    module, function = MODEL_REGISTRY[canonical_name(name)]
+    return f"{module}.{function}"
+
+
+def get_model(name):
+    """Imports and returns a model's run function."""
+    module, function = MODEL_REGISTRY[canonical_name(name)]
+    return getattr(importlib.import_module(module), function)
@@ -1,21 +1,38 @@
 import pandas as pd
-from statsmodels.tsa.statespace.sarimax import SARIMAX
-from pmdarima import auto_arima
 import sys
 import os
 
 # Allow imports from project root
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from utils.helpers import train_test_split, evaluate_forecast
+from models.order_search import search_order
+from models.model_state import load_incremental_state, save_state, describe_series
+from utils.tracing import span, traced
 
-def run_sarima(data, order=None, seasonal_order=None):
+def fit_sarima(train, order, seasonal_order):
+    """Fits SARIMA(order)(seasonal_order) on a training series and returns the results object."""
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    model = SARIMAX(train, order=order, seasonal_order=seasonal_order,
+                    enforce_stationarity=False, enforce_invertibility=False)
+    return model.fit(disp=False)
+
+@traced("run_sarima", profile=True)
+def run_sarima(data, order=None, seasonal_order=None, search_method="stepwise", n_jobs=None, use_cache=True,
+               state_dir=None, full_refit=False):
     """
     Trains a SARIMA model on the input data and forecasts the next 30 days.
 
     Parameters:
         data (pd.Series): Time series data with datetime index.
         order (tuple or None): (p,d,q) - non-seasonal ARIMA order. If None, it will be auto-selected.
-        seasonal_order (tuple or None): (P,D,Q,s) - seasonal order. If None, auto-selected via auto_arima.
+        seasonal_order (tuple or None): (P,D,Q,s) - seasonal order. If None, auto-selected.
+        search_method (str): 'stepwise' (auto_arima) or 'grid' (parallel) order search.
+        n_jobs (int or None): Worker processes for the grid search.
+        use_cache (bool): Reuse/store the selected orders in the on-disk order cache.
+        state_dir (str or None): Directory holding the fitted state. When set, a state fitted
+            on a prefix of the training data is updated with the new rows instead of refitting.
+        full_refit (bool): Ignore any saved state and refit from scratch.
 
     Returns:
         tuple: (forecast, metrics)
@@ -26,29 +43,55 @@ def run_sarima(data, order=None, seasonal_order=None):
 
     train, test = train_test_split(data)
 
-    # Auto-tune if no manual order provided
-    if order is None or seasonal_order is None:
-        print("Auto-selecting SARIMA parameters...")
-        model_auto = auto_arima(
-            train,
-            seasonal=True,
-            m=7,  # Weekly seasonality
-            stepwise=True,
-            suppress_warnings=True,
-            error_action='ignore',
-            trace=False
-        )
-        order = model_auto.order
-        seasonal_order = model_auto.seasonal_order
-        print(f"Selected SARIMA order: {order} seasonal_order: {seasonal_order}")
-
-    # Fit SARIMA model
-    model = SARIMAX(train, order=order, seasonal_order=seasonal_order,
-                    enforce_stationarity=False, enforce_invertibility=False)
-    model_fit = model.fit(disp=False)
+    state = load_incremental_state(state_dir, "sarima", train, full_refit=full_refit)
+    searched = order is None or seasonal_order is None
+    # Selected orders are only kept if they were selected with the same search method
+    if state is not None and (order is None or tuple(order) == state["order"]) \
+            and (seasonal_order is None or tuple(seasonal_order) == state["seasonal_order"]) \
+            and (not searched or state.get("search_method", "stepwise") == search_method):
+        # Update the saved fit with the appended rows, keeping its parameters
+        order, seasonal_order = state["order"], state["seasonal_order"]
+        method = state.get("search_method", "stepwise")
+        new_obs = train.iloc[state["n_obs"]:]
+        print(f"Updating SARIMA{order}{seasonal_order} with {len(new_obs)} new observations...")
+        model_fit = state["results"]
+        if len(new_obs):
+            with span("sarima.update", new_obs=len(new_obs)):
+                model_fit = model_fit.append(new_obs, refit=False)
+        fitted_n_obs = state["fitted_n_obs"]
+    else:
+        method = search_method if searched else None
+        # Auto-tune if no manual order provided
+        if searched:
+            print("Auto-selecting SARIMA parameters...")
+            order, seasonal_order = search_order(
+                train,
+                seasonal=True,
+                m=7,  # Weekly seasonality
+                method=search_method,
+                n_jobs=n_jobs,
+                use_cache=use_cache
+            )
+            print(f"Selected SARIMA order: {order} seasonal_order: {seasonal_order}")
+
+        # Fit SARIMA model
+        with span("sarima.fit", order=order, seasonal_order=seasonal_order, n_obs=len(train)):
+            model_fit = fit_sarima(train, order, seasonal_order)
+        fitted_n_obs = len(train)
+
+    if state_dir is not None:
+        save_state(state_dir, "sarima", {
+            "order": tuple(order),
+            "seasonal_order": tuple(seasonal_order),
+            "search_method": method,
+            "results": model_fit,
+            "fitted_n_obs": fitted_n_obs,
+            **describe_series(train),
+        })
 
     # Forecast
-    forecast = model_fit.forecast(steps=len(test))
+    with span("sarima.forecast", steps=len(test)):
+        forecast = model_fit.forecast(steps=len(test))
     forecast.index = test.index  # Align forecast with test period
 
     # Evaluate
@@ -1,28 +1,122 @@
-import subprocess
+import argparse
+import functools
 import os
 
-def run_script(script_path):
-    """Run a Python script as a subprocess."""
+from data_preprocess import preprocess_yahoo_data
+from evaluation import evaluate_models
+from models.model_state import DEFAULT_STATE_DIR
+from models.registry import MODEL_NAMES, get_model, parse_models
+from utils.dag import DagRunner, Stage, content_hash
+from utils.storage import CLEANED_DATA_CSV, CLEANED_DATA_PATH, FORECAST_DIR, METRICS_PATH, load_cleaned_data
+
+RAW_DATA_PATH = "data/yahoo_data.csv"
+TIMINGS_PATH = "outputs/pipeline_timings.json"
+
+
+def preprocess(raw_path=RAW_DATA_PATH, cleaned_path=CLEANED_DATA_PATH):
+    """
+    Clean the raw export and return the Close prices.
+
+    The DAG only runs this stage when the raw file's content changed, so the cleaned
+    data is always rebuilt here. Without a raw export, the existing cleaned data is used.
+    """
+    if os.path.exists(raw_path):
+        df = preprocess_yahoo_data(raw_path, cleaned_path)
+    else:
+        df = load_cleaned_data(columns=['Close'], path=cleaned_path)
+    return df['Close'].interpolate()
+
+
+def preprocess_inputs(raw_path=RAW_DATA_PATH):
+    """Files whose content decides whether the preprocess stage reruns."""
+    if os.path.exists(raw_path):
+        return [raw_path]
+    return [CLEANED_DATA_PATH, CLEANED_DATA_CSV]
+
+
+def fit_model(name, close_prices, full_refit=False, options=None):
+    """
+    Fit one model. Failures are returned rather than raised so other models still report;
+    the DAG runner does not cache them, so the model is retried on the next run.
+    """
+    model_func = get_model(name)
     try:
-        print(f"\nRunning: {script_path}")
-        subprocess.run(["python", script_path], check=True)
-        print(f"Completed: {script_path}")
-    except subprocess.CalledProcessError as e:
-        print(f"Error while running {script_path}")
-        print(e)
-
-def main():
+        forecast, metrics = model_func(close_prices, state_dir=DEFAULT_STATE_DIR, full_refit=full_refit,
+                                       **(options or {}))
+    except Exception as e:
+        print(f"{name} failed due to: {e}")
+        return {"name": name, "error": str(e)}
+    return {"name": name, "forecast": forecast, "metrics": metrics}
+
+
+def collect_metrics(*fits):
+    """Save forecasts and the metrics summary, and report the best model."""
+    os.makedirs(FORECAST_DIR, exist_ok=True)
+    results = []
+    for fit in fits:
+        if "forecast" in fit:
+            evaluate_models.save_forecast(fit["name"], fit["forecast"])
+            results.append(fit["metrics"])
+    results_df = evaluate_models.save_metrics(results, MODEL_NAMES)
+    print(f"\nEvaluation summary saved to {METRICS_PATH}")
+
+    if not results_df.empty:
+        best_model = results_df.sort_values(by='RMSE').iloc[0]
+        print(f"\nBest Model by RMSE: {best_model['Model']} → RMSE: {best_model['RMSE']:.2f}")
+    return results_df
+
+
+def render_plots(close_prices, *fits):
+    # matplotlib is only imported once plotting starts
+    from evaluation import plot_models
+
+    plot_models.plot_forecasts(close_prices, {fit["name"]: fit["forecast"] for fit in fits if "forecast" in fit})
+
+
+def build_stages(full_refit=False, models=None, order_search="stepwise", workers=None):
+    """preprocess -> one fit stage per selected model -> metrics, plots."""
+    model_names = parse_models(models)
+    fit_stages = [f"fit_{name.lower()}" for name in model_names]
+    stages = [Stage("preprocess", preprocess, files=preprocess_inputs())]
+    for name, stage_name in zip(model_names, fit_stages):
+        options = evaluate_models.model_options(name, order_search)
+        # Model code and settings (search space, Prophet parameters, tuned LSTM config)
+        # invalidate a cached fit like the data does
+        version = content_hash(evaluate_models.model_config(name, options))
+        if "search_method" in options and order_search == "grid":
+            # The fit stages run side by side; each grid search gets its stage's share of the cores
+            cpu_count = os.cpu_count() or 1
+            options["n_jobs"] = max(1, cpu_count // min(workers or cpu_count, len(model_names), cpu_count))
+        stages.append(Stage(stage_name, functools.partial(fit_model, name, full_refit=full_refit, options=options),
+                            deps=["preprocess"], version=version, cache=not full_refit, executor="process"))
+    stages.append(Stage("metrics", collect_metrics, deps=fit_stages))
+    stages.append(Stage("plots", render_plots, deps=["preprocess"] + fit_stages))
+    return stages
+
+
+def main(workers=None, full_refit=False, models=None, order_search="stepwise"):
     # Ensure required directories exist
     os.makedirs("outputs/forecasts", exist_ok=True)
     os.makedirs("outputs/plots", exist_ok=True)
 
-    # Step 1: Run evaluation script
-    run_script("evaluation/evaluate_models.py")
+    runner = DagRunner(build_stages(full_refit=full_refit, models=models, order_search=order_search,
+                                    workers=workers), max_workers=workers)
+    runner.run(timings_path=TIMINGS_PATH)
 
-    # Step 2: Run plot generation script
-    run_script("evaluation/plot_models.py")
+    print("\nStage timings:")
+    for name, timing in runner.timings.items():
+        status = "cached" if timing["cached"] else ("failed" if "error" in timing else "ran")
+        print(f"    {name:<12} {timing['seconds']:8.1f}s  {status}")
+    print(f"Timings saved to {TIMINGS_PATH}")
 
     print("\nPipeline completed successfully.")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Run the forecasting pipeline.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of stages run concurrently.")
+    parser.add_argument("--full-refit", action="store_true", help="Refit all models from scratch.")
+    parser.add_argument("--models", default=None, help="Comma-separated models to run, e.g. arima,lstm (default: all).")
+    parser.add_argument("--order-search", choices=evaluate_models.ORDER_SEARCH_METHODS, default="stepwise",
+                        help="ARIMA/SARIMA order selection: stepwise auto_arima or a parallel grid search.")
+    args = parser.parse_args()
+    main(workers=args.workers, full_refit=args.full_refit, models=args.models, order_search=args.order_search)
@@ -0,0 +1,335 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models.lstm_model import configure_cpu
+from models.model_state import DEFAULT_STATE_DIR, load_state
+from serving.online import DEFAULT_HORIZON, LSTMStream, StateSpaceStream, load_history, load_streams
+from utils.latency import LatencyRecorder
+
+API_MODELS = ("ARIMA", "SARIMA", "Prophet", "LSTM")
+DEFAULT_SERIES = "default"
+MAX_HORIZON = 365
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ProphetForecaster:
+    """Prophet refitted once at startup from its saved parameters (warm start), without intervals."""
+
+    def __init__(self, history, init):
+        from models.prophet_model import make_prophet
+
+        self.model = make_prophet()
+        self.model.fit(pd.DataFrame({'ds': history.index, 'y': history.values}), init=init)
+        self.last_date = history.index[-1]
+        self.freq = history.index.freq or pd.infer_freq(history.index) or 'D'
+
+    def forecast(self, steps):
+        dates = pd.date_range(self.last_date, periods=steps + 1, freq=self.freq)[1:]
+        return self.model.predict(pd.DataFrame({'ds': dates}))['yhat'].to_numpy(dtype=np.float64)
+
+
+class LSTMBatcher:
+    """
+    Collects concurrent LSTM requests for a short window and answers them with one
+    batched forward pass per model.
+
+    Requests for the same model are stacked into one (batch, look_back) array and
+    forecast to the longest requested horizon; each request gets its own prefix.
+    """
+
+    def __init__(self, window_ms=5.0, max_batch=64):
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.queue = asyncio.Queue()
+        # TensorFlow calls run off the event loop, one batch at a time
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.batches = 0
+        self.batched_requests = 0
+
+    async def submit(self, stream, window, horizon):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((stream, window, horizon, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(pending) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    pending.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            groups = {}
+            for request in pending:
+                groups.setdefault(id(request[0]), []).append(request)
+            for requests in groups.values():
+                try:
+                    preds = await loop.run_in_executor(self.executor, self._predict, requests)
+                except Exception as e:
+                    for *_, future in requests:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                self.batches += 1
+                self.batched_requests += len(requests)
+                for (_, _, horizon, future), row in zip(requests, preds):
+                    if not future.done():
+                        future.set_result(row[:horizon])
+
+    @staticmethod
+    def _predict(requests):
+        from models.lstm_model import forecast_direct, forecast_recursive
+
+        stream = requests[0][0]
+        windows = np.stack([window for _, window, _, _ in requests])
+        if stream.mode == "direct":
+            preds = forecast_direct(stream.model, windows)
+        else:
+            preds = forecast_recursive(stream.model, windows, max(h for _, _, h, _ in requests))
+        return (np.asarray(preds, dtype=np.float64) - stream.offset) / stream.scale
+
+
+def load_series_models(name, history, models, state_dir):
+    """Preloads the fitted models of one series; returns model name -> forecaster."""
+    print(f"Loading models for series {name} from {state_dir}...")
+    loaded = load_streams(history, [m for m in models if m != "Prophet"], state_dir=state_dir)
+    if "Prophet" in models:
+        state = load_state(state_dir, "prophet")
+        if state is None:
+            print(f"No saved state for Prophet in {state_dir}; run the model first. Skipping.")
+        else:
+            loaded["Prophet"] = ProphetForecaster(history.dropna(), state["init"])
+            print("Prophet ready for serving.")
+    return loaded
+
+
+class ForecastAPI:
+    """
+    Minimal HTTP/1.1 JSON API over preloaded forecasters.
+
+    Endpoints:
+        GET  /health
+        GET  /models                  series -> available models
+        GET  /forecast?series=&model=&horizon=
+        POST /forecast                {"series", "model", "horizon", "values"}
+        GET  /metrics                 latency percentiles, throughput and batching counters
+
+    `values` optionally appends recent observations (after the data the model has
+    seen) before forecasting, without changing the stored state.
+    """
+
+    def __init__(self, series_models, batch_window_ms=5.0, max_batch=64):
+        self.series_models = series_models
+        self.batcher = LSTMBatcher(window_ms=batch_window_ms, max_batch=max_batch)
+        self.executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+        self.latency = LatencyRecorder()
+        self.model_latency = {}
+        self.errors = 0
+
+    async def forecast(self, request):
+        series = str(request.get("series", DEFAULT_SERIES))
+        models = self.series_models.get(series)
+        if models is None:
+            raise HTTPError(404, f"Unknown series: {series}")
+        names = {m.lower(): m for m in models}
+        model = names.get(str(request.get("model", "")).lower())
+        if model is None:
+            raise HTTPError(404, f"Model {request.get('model')!r} not loaded for {series}; available: {sorted(models)}")
+        try:
+            horizon = int(request.get("horizon", DEFAULT_HORIZON))
+            values = request.get("values")
+            values = None if values is None else np.asarray(values, dtype=np.float64).reshape(-1)
+        except (TypeError, ValueError):
+            raise HTTPError(400, "horizon must be an integer and values a list of numbers")
+        if not 1 <= horizon <= MAX_HORIZON:
+            raise HTTPError(400, f"horizon must be between 1 and {MAX_HORIZON}")
+
+        forecaster = models[model]
+        recorder = self.model_latency.setdefault(model, LatencyRecorder())
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        if isinstance(forecaster, LSTMStream):
+            if forecaster.mode == "direct" and horizon > forecaster.horizon:
+                raise HTTPError(400, f"Direct LSTM forecasts at most {forecaster.horizon} steps")
+            window = forecaster.buffer
+            if values is not None:
+                scaled = (values * forecaster.scale + forecaster.offset).astype(np.float32)
+                window = np.concatenate([window, scaled])[-forecaster.look_back:]
+            preds = await self.batcher.submit(forecaster, window, horizon)
+        elif isinstance(forecaster, StateSpaceStream):
+            results = forecaster.results
+            preds = await loop.run_in_executor(self.executor, lambda: np.asarray(
+                (results if values is None else results.extend(values)).forecast(steps=horizon)))
+        else:
+            if values is not None:
+                raise HTTPError(400, "Prophet forecasts do not accept values")
+            preds = await loop.run_in_executor(self.executor, forecaster.forecast, horizon)
+        recorder.record(time.perf_counter() - started)
+        return {"series": series, "model": model, "horizon": horizon,
+                "forecast": np.asarray(preds, dtype=np.float64).tolist()}
+
+    def metrics(self):
+        batches = self.batcher.batches
+        return {
+            "requests": self.latency.summary(percentiles=(50, 99)),
+            "errors": self.errors,
+            "models": {name: rec.summary(percentiles=(50, 99)) for name, rec in self.model_latency.items()},
+            "lstm_batches": batches,
+            "lstm_mean_batch_size": self.batcher.batched_requests / batches if batches else None,
+        }
+
+    async def route(self, method, target, body):
+        url = urlsplit(target)
+        if url.path == "/health":
+            return {"status": "ok"}
+        if url.path == "/models":
+            return {series: sorted(models) for series, models in self.series_models.items()}
+        if url.path == "/metrics":
+            return self.metrics()
+        if url.path == "/forecast":
+            if method == "GET":
+                request = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            elif method == "POST":
+                try:
+                    request = json.loads(body or b"{}")
+                except ValueError:
+                    raise HTTPError(400, "Body must be JSON")
+                if not isinstance(request, dict):
+                    raise HTTPError(400, "Body must be a JSON object")
+            else:
+                raise HTTPError(405, f"Method {method} not allowed")
+            return await self.forecast(request)
+        raise HTTPError(404, f"Not found: {url.path}")
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                started = time.perf_counter()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0) or 0))
+
+                parts = request_line.decode("latin-1").split()
+                version = parts[2] if len(parts) == 3 else "HTTP/1.0"
+                try:
+                    if len(parts) != 3:
+                        raise HTTPError(400, "Malformed request line")
+                    status, payload = 200, await self.route(parts[0].upper(), parts[1], body)
+                except HTTPError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except Exception as e:
+                    status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+                if status != 200:
+                    self.errors += 1
+
+                keep_alive = (headers.get("connection", "").lower() != "close"
+                              and version.upper() == "HTTP/1.1")
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {_REASONS.get(status, 'Error')}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data)
+                await writer.drain()
+                self.latency.record(time.perf_counter() - started)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8000):
+        batcher = asyncio.create_task(self.batcher.run())
+        server = await asyncio.start_server(self.handle_client, host, port)
+        print(f"Forecast API listening on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+def load_api(models=API_MODELS, state_dir=DEFAULT_STATE_DIR, panel=None, batch_window_ms=5.0, max_batch=64):
+    """
+    Preloads every series' fitted models and warms them up.
+
+    The default series is the cleaned Close data with state in `state_dir`. With a
+    panel file, each ticker is also served from the per-ticker state that
+    `evaluation/batch_forecast.py` saves under `state_dir/<ticker>`.
+    """
+    series_models = {}
+    loaded = load_series_models(DEFAULT_SERIES, load_history(), models, state_dir)
+    if loaded:
+        series_models[DEFAULT_SERIES] = loaded
+    if panel is not None:
+        from evaluation.batch_forecast import clean_panel, load_panel
+
+        for ticker, close_prices in clean_panel(load_panel(panel)).items():
+            if close_prices.index.inferred_freq is None:
+                close_prices = close_prices.asfreq('D')
+            loaded = load_series_models(str(ticker), close_prices, models, os.path.join(state_dir, str(ticker)))
+            if loaded:
+                series_models[str(ticker)] = loaded
+    return ForecastAPI(series_models, batch_window_ms=batch_window_ms, max_batch=max_batch)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve forecasts from preloaded models over HTTP.")
+    parser.add_argument("--models", default="arima,sarima,prophet,lstm", help="Comma-separated models to load.")
+    parser.add_argument("--state-dir", default=DEFAULT_STATE_DIR)
+    parser.add_argument("--panel", default=None, help="Long-format panel; serves each ticker's saved state too.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--batch-window-ms", type=float, default=5.0,
+                        help="How long concurrent LSTM requests are collected into one batch.")
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=None, help="TensorFlow intra-op threads for the LSTM.")
+    args = parser.parse_args()
+    # Before the LSTM state is loaded, which imports TensorFlow
+    configure_cpu(args.threads)
+
+    names = {name.lower(): name for name in API_MODELS}
+    selected = [names[m.strip().lower()] for m in args.models.split(",") if m.strip()]
+    api = load_api(selected, state_dir=args.state_dir, panel=args.panel,
+                   batch_window_ms=args.batch_window_ms, max_batch=args.max_batch)
+    if not api.series_models:
+        sys.exit("No fitted models found; run evaluation/evaluate_models.py first.")
+    try:
+        asyncio.run(api.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"\nServed {api.latency.format()}")
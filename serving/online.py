@@ -0,0 +1,244 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models.lstm_model import configure_cpu
+from models.model_state import DEFAULT_STATE_DIR, load_state, state_path
+from models.order_search import series_fingerprint
+from utils.latency import LatencyRecorder
+from utils.storage import load_cleaned_data
+
+ONLINE_MODELS = ("ARIMA", "SARIMA", "LSTM")
+DEFAULT_HORIZON = 30
+
+
+class StateSpaceStream:
+    """
+    Online ARIMA/SARIMA forecaster.
+
+    Keeps the Kalman filter state of a fitted results object and advances it by one
+    observation per tick with `extend`, which filters only the new value with the
+    fitted parameters, so the cost per tick does not grow with the history.
+    """
+
+    def __init__(self, results, horizon=DEFAULT_HORIZON):
+        # Re-filter once without the date index so ticks don't need timestamps
+        endog = np.asarray(results.model.endog, dtype=np.float64).reshape(-1)
+        self.results = results.apply(endog, refit=False)
+        self.horizon = horizon
+
+    def catch_up(self, values):
+        """Absorbs observations that arrived after the fit, in one filter pass."""
+        values = np.asarray(values, dtype=np.float64)
+        if len(values):
+            self.results = self.results.extend(values)
+
+    def update(self, value):
+        self.results = self.results.extend(np.array([value], dtype=np.float64))
+        return self.forecast()
+
+    def forecast(self, steps=None):
+        return np.asarray(self.results.forecast(steps=steps or self.horizon), dtype=np.float64)
+
+
+class LSTMStream:
+    """
+    Online LSTM forecaster over a fixed-size rolling buffer of the last `look_back`
+    scaled values.
+    """
+
+    def __init__(self, model, scaler, look_back, history, horizon=DEFAULT_HORIZON, mode="recursive",
+                 jit_compile=False):
+        self.model = model
+        self.look_back = look_back
+        self.horizon = horizon
+        self.mode = mode
+        # MinMaxScaler as a plain affine map; avoids sklearn input validation per tick
+        self.scale = float(scaler.scale_[0])
+        self.offset = float(scaler.min_[0])
+        history = np.asarray(history, dtype=np.float64)[-look_back:]
+        if len(history) < look_back:
+            raise ValueError(f"LSTM needs at least {look_back} observations of history.")
+        self.buffer = (history * self.scale + self.offset).astype(np.float32)
+        from models.lstm_model import fixed_shape_predictor
+
+        # Every tick forecasts from one window of the same shape: trace the graph once
+        self.predict = fixed_shape_predictor(model, look_back, horizon=None if mode == "direct" else horizon,
+                                             jit_compile=jit_compile)
+
+    def update(self, value):
+        self.buffer[:-1] = self.buffer[1:]
+        self.buffer[-1] = value * self.scale + self.offset
+        return self.forecast()
+
+    def forecast(self):
+        preds = self.predict(self.buffer)[0]
+        return (np.asarray(preds, dtype=np.float64) - self.offset) / self.scale
+
+
+def load_history():
+    """Close prices as seen by the models when they were fitted."""
+    close_prices = load_cleaned_data(columns=['Close'])['Close'].interpolate()
+    if close_prices.index.inferred_freq is None:
+        close_prices = close_prices.asfreq('D')
+    return close_prices
+
+
+def load_streams(history, models=ONLINE_MODELS, horizon=DEFAULT_HORIZON, state_dir=DEFAULT_STATE_DIR,
+                 jit_compile=False):
+    """
+    Builds online forecasters from the fitted state saved by the run_* functions.
+
+    ARIMA/SARIMA states fitted on a prefix of `history` are caught up with the
+    remaining observations; the LSTM buffer is filled with the last values.
+    Models without a usable saved state are skipped. `jit_compile` compiles the
+    LSTM's per-tick forecast with XLA.
+    """
+    values = np.asarray(history, dtype=np.float64)
+    streams = {}
+    for name in models:
+        state = load_state(state_dir, name)
+        if state is None:
+            print(f"No saved state for {name} in {state_dir}; run the model first. Skipping.")
+            continue
+
+        if name in ("ARIMA", "SARIMA"):
+            n_obs = state["n_obs"]
+            if len(values) < n_obs or series_fingerprint(values[:n_obs]) != state["fingerprint"]:
+                print(f"Saved {name} state was fitted on different data. Skipping.")
+                continue
+            stream = StateSpaceStream(state["results"], horizon=horizon)
+            stream.catch_up(values[n_obs:])
+        elif name == "LSTM":
+            from keras.models import load_model
+
+            mode = state.get("mode", "recursive")
+            if mode == "direct" and state.get("horizon") != horizon:
+                print(f"Saved direct LSTM forecasts {state.get('horizon')} steps, not {horizon}. Skipping.")
+                continue
+            model = load_model(state_path(state_dir, name, ".keras"))
+            stream = LSTMStream(model, state["scaler"], state["look_back"], values,
+                                horizon=horizon, mode=mode, jit_compile=jit_compile)
+        else:
+            raise ValueError(f"Unknown online model: {name}")
+
+        stream.forecast()  # warm-up: first forecast compiles/allocates
+        streams[name] = stream
+        print(f"{name} ready for streaming.")
+    return streams
+
+
+class OnlineService:
+    """
+    Applies each incoming tick to every stream and returns the updated forecasts.
+
+    Ticks are processed one at a time in arrival order. Per-model and end-to-end
+    tick latencies are recorded.
+    """
+
+    def __init__(self, streams):
+        self.streams = streams
+        self.ticks = 0
+        self.latency = LatencyRecorder()
+        self.model_latency = {name: LatencyRecorder() for name in streams}
+
+    def process(self, value):
+        value = float(value)
+        with self.latency.time():
+            forecasts = {}
+            for name, stream in self.streams.items():
+                with self.model_latency[name].time():
+                    forecasts[name] = stream.update(value)
+            self.ticks += 1
+        return {"tick": self.ticks, "forecasts": {k: v.tolist() for k, v in forecasts.items()}}
+
+    def stats(self):
+        return {
+            "ticks": self.ticks,
+            "latency": self.latency.summary(),
+            "models": {name: rec.summary() for name, rec in self.model_latency.items()},
+        }
+
+    async def serve_queue(self, ticks, results):
+        """Consumes tick values from one asyncio queue and puts results on another; None stops."""
+        while True:
+            value = await ticks.get()
+            if value is None:
+                break
+            await results.put(self.process(value))
+
+    async def handle_client(self, reader, writer):
+        """
+        Line protocol: each line is a number or {"value": x}; {"stats": true} returns
+        latency statistics. Every line is answered with one JSON line.
+        """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    message = json.loads(line)
+                    if isinstance(message, dict) and message.get("stats"):
+                        response = self.stats()
+                    else:
+                        value = message["value"] if isinstance(message, dict) else message
+                        response = self.process(value)
+                except (ValueError, TypeError, KeyError) as e:
+                    response = {"error": f"invalid tick: {e}"}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve_socket(self, host="127.0.0.1", port=8765, unix_path=None):
+        if unix_path:
+            server = await asyncio.start_unix_server(self.handle_client, path=unix_path)
+            print(f"Streaming forecasts on unix socket {unix_path}")
+        else:
+            server = await asyncio.start_server(self.handle_client, host, port)
+            print(f"Streaming forecasts on {host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+def print_stats(service):
+    print(f"\nProcessed {service.ticks} ticks: {service.latency.format()}")
+    for name, recorder in service.model_latency.items():
+        print(f"    {name:<8} {recorder.format()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve per-tick forecasts from fitted models.")
+    parser.add_argument("--models", default="arima,sarima,lstm", help="Comma-separated models to stream.")
+    parser.add_argument("--horizon", type=int, default=DEFAULT_HORIZON)
+    parser.add_argument("--state-dir", default=DEFAULT_STATE_DIR)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None, help="Listen on a unix socket path instead of TCP.")
+    parser.add_argument("--threads", type=int, default=None, help="TensorFlow intra-op threads for the LSTM.")
+    parser.add_argument("--xla", action="store_true", help="Compile the LSTM forecast with XLA.")
+    args = parser.parse_args()
+    # Before the LSTM state is loaded, which imports TensorFlow
+    configure_cpu(args.threads)
+
+    names = {name.lower(): name for name in ONLINE_MODELS}
+    selected = [names[m.strip().lower()] for m in args.models.split(",") if m.strip()]
+    service = OnlineService(load_streams(load_history(), selected, horizon=args.horizon,
+                                         state_dir=args.state_dir, jit_compile=args.xla))
+    if not service.streams:
+        sys.exit("No models available to stream.")
+    try:
+        asyncio.run(service.serve_socket(args.host, args.port, unix_path=args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print_stats(service)
@@ -1,15 +1,22 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
+import hashlib
+import io
 import os
 import sys
-import subprocess
+import time
 
 # Add root directory for imports
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 
-# Import forecast plot generator
-from evaluation.plot_models import generate_plots_from_forecasts
+from models.registry import MODEL_NAMES
+from utils.jobs import JobQueue, workspace_dir
+from utils.storage import CLEANED_DATA_PATH, METRICS_PATH, forecast_path, read_table, write_table
+
+# How often a running job's results are refreshed
+REFRESH_SECONDS = 2
+# Evaluation jobs run concurrently across all sessions
+MAX_CONCURRENT_JOBS = int(os.environ.get("DASHBOARD_MAX_JOBS", 1))
 
 # --------------------- Settings ---------------------
 st.set_page_config(page_title="📈 Stock Forecasting", layout="wide")
@@ -27,62 +34,157 @@ def clean_data(df):
     df['Close'] = df['Close'].interpolate(method='linear')
     return df
 
-# --------------------- Upload CSV ---------------------
-st.sidebar.header("📁 Upload Data")
-uploaded = st.sidebar.file_uploader("Upload Yahoo Finance CSV", type=["csv"])
-
-if uploaded:
-    raw_df = pd.read_csv(uploaded)
-    df = clean_data(raw_df)
-    close_prices = df['Close']
 
-    # Save cleaned version
-    os.makedirs("data", exist_ok=True)
-    df.to_csv("data/cleaned_data.csv")
-
-    st.success("✅ Data cleaned and ready for forecasting!")
-
-    # --------------------- Historical Plot ---------------------
-    st.subheader("📈 Historical Closing Price")
-    st.line_chart(close_prices)
-
-    # --------------------- Model Evaluation ---------------------
-    with st.spinner("🔄 Running forecasting models..."):
-        subprocess.run(["python", "evaluation/evaluate_models.py"], check=True)
-
-    with st.spinner("🖼️ Generating plots..."):
-        generate_plots_from_forecasts()
-
-    st.success("✅ Models evaluated and plots generated.")
+@st.cache_data(show_spinner=False, max_entries=16)
+def load_upload(upload_hash, _raw):
+    """Parses and cleans an upload once per distinct file; `_raw` is not hashed, `upload_hash` is the key."""
+    return clean_data(pd.read_csv(io.BytesIO(_raw)))
+
+
+@st.cache_resource
+def job_queue():
+    """Background evaluation queue shared by every session of this server."""
+    return JobQueue(max_workers=MAX_CONCURRENT_JOBS)
+
+
+@st.cache_resource(show_spinner=False)
+def prepare_workspace(upload_hash, _df):
+    """
+    Creates the workspace of an upload and writes its cleaned data there once.
+
+    Workspaces are keyed by the upload's content hash: sessions working on different
+    files never share outputs, and re-uploading a file reuses its fitted models.
+    """
+    workspace = workspace_dir(upload_hash)
+    data_path = os.path.join(workspace, CLEANED_DATA_PATH)
+    if not os.path.exists(data_path):
+        write_table(_df, data_path)
+    return workspace
+
+
+def read_workspace_table(workspace, path):
+    """Reads a table from the workspace, or None while it has not been written yet."""
+    full_path = os.path.join(workspace, path)
+    if not os.path.exists(full_path):
+        return None
+    try:
+        return read_table(full_path)
+    except Exception:
+        # Written atomically, but tolerate a file replaced between the check and the read
+        return None
+
+
+def show_job_status(job):
+    if job.status == "queued":
+        st.info("⏳ Waiting for a free worker...")
+    elif job.status == "running":
+        st.info(f"🔄 Running forecasting models... ({time.time() - job.started:.0f}s)")
+    elif job.status == "done":
+        st.success(f"✅ Models evaluated and plots generated in {job.finished - job.started:.0f}s.")
+    else:
+        st.error(f"❌ Evaluation failed: {job.error}")
+    if job.status in ("running", "failed") and os.path.exists(job.log_path):
+        with st.expander("📜 Job log", expanded=job.status == "failed"):
+            with open(job.log_path) as f:
+                st.code("".join(f.readlines()[-40:]))
+
+
+def show_results(workspace, close_prices, models):
+    """Shows the job status and every model result written so far; re-runs while the job is active."""
+    job = job_queue().get(workspace)
+    if job is None:
+        return
+    show_job_status(job)
 
     # --------------------- Metrics Summary ---------------------
-    st.subheader("📊 Model Performance Metrics")
+    # evaluate_models rewrites the metrics file as each model finishes
+    metrics_df = read_workspace_table(workspace, METRICS_PATH)
+    if metrics_df is not None:
+        metrics_df = metrics_df[metrics_df['Model'].isin(models)].reset_index(drop=True)
 
-    metrics_df = pd.read_csv("outputs/forecasts/model_metrics.csv")
-    st.dataframe(metrics_df.style.format({"MAE": "{:.2f}", "MSE": "{:.2f}", "RMSE": "{:.2f}"}), use_container_width=True)
+    if metrics_df is not None and not metrics_df.empty:
+        st.subheader("📊 Model Performance Metrics")
+        st.dataframe(metrics_df.style.format({"MAE": "{:.2f}", "MSE": "{:.2f}", "RMSE": "{:.2f}"}),
+                     use_container_width=True)
 
-    # --------------------- Metrics Cards ---------------------
-    st.markdown("### 📌 Summary (Last 30 Days)")
-    cols = st.columns(3)
+        # --------------------- Metrics Cards ---------------------
+        st.markdown("### 📌 Summary (Last 30 Days)")
+        cols = st.columns(3)
 
-    for i, metric in enumerate(['MAE', 'MSE', 'RMSE']):
-        with cols[i]:
-            for _, row in metrics_df.iterrows():
-                st.metric(label=f"{row['Model']} {metric}", value=f"{row[metric]:.2f}")
+        for i, metric in enumerate(['MAE', 'MSE', 'RMSE']):
+            with cols[i]:
+                for _, row in metrics_df.iterrows():
+                    st.metric(label=f"{row['Model']} {metric}", value=f"{row[metric]:.2f}")
 
     # --------------------- Forecast Plots ---------------------
     st.subheader("📉 Forecast Plots")
 
-    models = ["ARIMA", "SARIMA", "Prophet", "LSTM"]
+    finished = set(metrics_df['Model']) if metrics_df is not None else set()
     for model in models:
-        plot_path = f"outputs/plots/{model.lower()}_forecast.png"
-        if os.path.exists(plot_path):
+        plot_path = os.path.join(workspace, "outputs", "plots", f"{model.lower()}_forecast.png")
+        forecast = read_workspace_table(workspace, forecast_path(model)) if model in finished else None
+        if job.status == "done" and os.path.exists(plot_path):
             with st.expander(f"🔮 {model} Forecast", expanded=False):
-                st.image(plot_path, use_column_width=True)
-        else:
+                st.image(plot_path, use_container_width=True)
+        elif forecast is not None:
+            # Shown until the final plots are rendered
+            actual = close_prices[-30:]
+            chart = pd.DataFrame({"Actual": actual.values,
+                                  "Forecast": forecast["Forecast"].to_numpy()[-30:]}, index=actual.index)
+            with st.expander(f"🔮 {model} Forecast", expanded=False):
+                st.line_chart(chart)
+        elif job.done:
             st.warning(f"{model} forecast plot not found.")
+        else:
+            st.caption(f"⏳ {model} is still running...")
 
     # --------------------- Best Model ---------------------
-    best = metrics_df.sort_values('RMSE').iloc[0]
-    st.subheader("🏆 Best Model (Lowest RMSE)")
-    st.success(f"**{best['Model']}** with RMSE = {best['RMSE']:.2f}")
+    if job.done and metrics_df is not None and not metrics_df.empty:
+        best = metrics_df.sort_values('RMSE').iloc[0]
+        st.subheader("🏆 Best Model (Lowest RMSE)")
+        st.success(f"**{best['Model']}** with RMSE = {best['RMSE']:.2f}")
+
+    # Leave polling mode once the job has finished
+    if job.done and st.session_state.get("polling"):
+        st.session_state["polling"] = False
+        st.rerun()
+
+
+# --------------------- Upload CSV ---------------------
+st.sidebar.header("📁 Upload Data")
+uploaded = st.sidebar.file_uploader("Upload Yahoo Finance CSV", type=["csv"])
+models = st.sidebar.multiselect("Models", MODEL_NAMES, default=list(MODEL_NAMES))
+
+if uploaded:
+    raw = uploaded.getvalue()
+    upload_hash = hashlib.sha1(raw).hexdigest()[:16]
+    df = load_upload(upload_hash, raw)
+    close_prices = df['Close']
+
+    # Save cleaned version into this upload's workspace
+    workspace = prepare_workspace(upload_hash, df)
+
+    st.success("✅ Data cleaned and ready for forecasting!")
+
+    # --------------------- Historical Plot ---------------------
+    st.subheader("📈 Historical Closing Price")
+    st.line_chart(close_prices)
+
+    # --------------------- Model Evaluation ---------------------
+    # Runs in the background; a finished job for the same models is reused
+    queue = job_queue()
+    job = queue.get(workspace)
+    retry = job is not None and job.status == "failed" and st.sidebar.button("🔁 Retry evaluation")
+    if models and (job is None or retry or job.key != ",".join(models)):
+        try:
+            job = queue.submit(workspace, ",".join(models), models)
+        except RuntimeError as e:
+            st.warning(f"{e} for {job.key.replace(',', ', ')}. "
+                       "The new selection is evaluated once it finishes.")
+
+    if job is not None:
+        polling = not job.done
+        st.session_state["polling"] = polling
+        # Show the models of the job actually running, not the (possibly changed) selection
+        job_models = job.key.split(",")
+        st.fragment(show_results, run_every=REFRESH_SECONDS if polling else None)(workspace, close_prices, job_models)
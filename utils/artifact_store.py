@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+
+import pandas as pd
+
+# Entries are keyed by content, so all working directories (and dashboard workspaces) share one store
+DEFAULT_STORE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "outputs", "artifacts"))
+
+# Bump when the layout or the meaning of stored artifacts changes; entries from
+# other versions are ignored and eventually evicted.
+STORE_VERSION = 1
+
+
+def hash_data(data):
+    """Returns a content hash of a pandas Series/DataFrame, including its index."""
+    hashed = pd.util.hash_pandas_object(data, index=True).values
+    return hashlib.sha1(hashed.tobytes()).hexdigest()
+
+
+def artifact_key(model, data_hash, config=None):
+    """Builds the store key for a model fitted on `data_hash` with `config`."""
+    payload = {
+        "version": STORE_VERSION,
+        "model": model.lower(),
+        "data_hash": data_hash,
+        "config": config or {},
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _dir_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            total += os.path.getsize(os.path.join(dirpath, name))
+    return total
+
+
+class ArtifactStore:
+    """
+    Versioned on-disk store of fitted models and their outputs.
+
+    Each entry lives in <root>/v<STORE_VERSION>/<key>/ and holds pickled objects
+    (forecast, metrics, chosen orders, ...) plus copies of model files such as
+    pickled results, scalers or Keras models. Entries are keyed by a hash of the
+    input data and the model configuration. When the store exceeds `max_bytes`
+    or `max_entries`, the least recently used entries are removed.
+    """
+
+    def __init__(self, root=DEFAULT_STORE_DIR, max_bytes=2 * 1024 ** 3, max_entries=100):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.entries_dir = os.path.join(root, f"v{STORE_VERSION}")
+        self.manifest_path = os.path.join(root, "manifest.json")
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self, manifest):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def entry_dir(self, key):
+        return os.path.join(self.entries_dir, key)
+
+    def get(self, model, data_hash, config=None):
+        """
+        Loads a stored entry.
+
+        Returns:
+            dict or None: The pickled objects plus 'files' (name -> path of stored file),
+                or None if no entry exists for this model, data and config.
+        """
+        key = artifact_key(model, data_hash, config)
+        manifest = self._load_manifest()
+        entry = manifest.get(key)
+        path = self.entry_dir(key)
+        if entry is None or entry.get("version") != STORE_VERSION or not os.path.isdir(path):
+            return None
+
+        try:
+            with open(os.path.join(path, "objects.pkl"), "rb") as f:
+                objects = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        objects["files"] = {name: os.path.join(path, name) for name in entry["files"]}
+
+        entry["last_access"] = time.time()
+        self._save_manifest(manifest)
+        return objects
+
+    def put(self, model, data_hash, config=None, objects=None, files=None):
+        """
+        Stores objects and files for a fitted model, replacing any existing entry.
+
+        Parameters:
+            model (str): Model name.
+            data_hash (str): Hash of the training data (see `hash_data`).
+            config (dict or None): Model configuration included in the key.
+            objects (dict or None): Picklable objects, e.g. forecast and metrics.
+            files (dict or None): name -> source path of files to copy into the entry.
+                Missing source files are skipped.
+
+        Returns:
+            str: The entry key.
+        """
+        key = artifact_key(model, data_hash, config)
+        path = self.entry_dir(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        with open(os.path.join(tmp_path, "objects.pkl"), "wb") as f:
+            pickle.dump(objects or {}, f)
+        stored_files = []
+        for name, src in (files or {}).items():
+            if os.path.exists(src):
+                shutil.copy2(src, os.path.join(tmp_path, name))
+                stored_files.append(name)
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+
+        now = time.time()
+        manifest = self._load_manifest()
+        manifest[key] = {
+            "version": STORE_VERSION,
+            "model": model,
+            "data_hash": data_hash,
+            "config": config or {},
+            "files": stored_files,
+            "size": _dir_size(path),
+            "created": now,
+            "last_access": now,
+        }
+        self._evict(manifest)
+        self._save_manifest(manifest)
+        return key
+
+    def _evict(self, manifest):
+        """Drops stale-version entries, then least recently used ones over the limits."""
+        for key in [k for k, e in manifest.items() if e.get("version") != STORE_VERSION]:
+            del manifest[key]
+
+        by_age = sorted(manifest, key=lambda k: manifest[k]["last_access"])
+        total = sum(e["size"] for e in manifest.values())
+        while by_age and (len(manifest) > self.max_entries or total > self.max_bytes):
+            key = by_age.pop(0)
+            total -= manifest.pop(key)["size"]
+            shutil.rmtree(self.entry_dir(key), ignore_errors=True)
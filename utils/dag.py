@@ -0,0 +1,226 @@
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import pickle
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from evaluation.scheduler import thread_limits
+
+DEFAULT_CACHE_DIR = "outputs/cache/stages"
+
+
+def content_hash(obj):
+    """Hashes pandas/numpy objects by content and anything else by its pickle."""
+    h = hashlib.sha1()
+
+    def update(value):
+        if isinstance(value, (pd.Series, pd.DataFrame)):
+            h.update(b"pandas")
+            h.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+            if isinstance(value, pd.DataFrame):
+                h.update(repr(list(value.columns)).encode())
+        elif isinstance(value, np.ndarray):
+            h.update(b"ndarray")
+            h.update(str(value.dtype).encode())
+            h.update(np.ascontiguousarray(value).tobytes())
+        elif isinstance(value, dict):
+            h.update(b"dict")
+            for key in sorted(value, key=repr):
+                update(key)
+                update(value[key])
+        elif isinstance(value, (list, tuple)):
+            h.update(type(value).__name__.encode())
+            for item in value:
+                update(item)
+        else:
+            h.update(pickle.dumps(value))
+
+    update(obj)
+    return h.hexdigest()
+
+
+def file_hash(path):
+    """Hashes a file's bytes; missing files hash to a fixed marker."""
+    h = hashlib.sha1()
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    except OSError:
+        return "missing"
+    return h.hexdigest()
+
+
+class Stage:
+    """
+    A pipeline step.
+
+    Parameters:
+        name (str): Unique stage name.
+        func (callable): Called with the outputs of `deps`, in order.
+        deps (list): Names of upstream stages.
+        files (list): Input files whose content is part of the stage's cache key.
+        version (str): Bump to invalidate cached outputs after changing `func`.
+        cache (bool): Whether the output may be reused when inputs are unchanged.
+        executor (str): 'thread' to run in the driver process, 'process' to run in a
+            spawned worker (the function and its inputs/outputs must be picklable).
+    """
+
+    def __init__(self, name, func, deps=(), files=(), version="1", cache=True, executor="thread"):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.files = list(files)
+        self.version = version
+        self.cache = cache
+        self.executor = executor
+
+
+class DagRunner:
+    """
+    Runs stages in dependency order, in-process, passing outputs in memory.
+
+    Independent stages run concurrently. A stage is skipped, and its cached output
+    reused, when the content hash of its inputs (upstream outputs, input files and
+    stage version) matches the previous run. A stage can also report a failure by
+    returning a dict with an 'error' key: the output is still passed downstream (so a
+    summary stage can report the other results) but is not cached, and the stage is
+    retried on the next run. Per-stage timings are recorded in `self.timings` and
+    optionally written to JSON.
+    """
+
+    def __init__(self, stages, cache_dir=DEFAULT_CACHE_DIR, max_workers=None, threads_per_worker=None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.max_workers)
+        self.timings = {}
+        for stage in stages:
+            missing = [d for d in stage.deps if d not in self.stages]
+            if missing:
+                raise ValueError(f"Stage {stage.name} depends on unknown stages: {missing}")
+
+    def _cache_path(self, name):
+        return os.path.join(self.cache_dir, f"{name}.pkl")
+
+    def _stage_key(self, stage, inputs):
+        return content_hash({
+            "stage": stage.name,
+            "version": stage.version,
+            "inputs": [content_hash(value) for value in inputs],
+            "files": {path: file_hash(path) for path in stage.files},
+        })
+
+    def _load_cached(self, stage, key):
+        if not stage.cache:
+            return False, None
+        try:
+            with open(self._cache_path(stage.name), "rb") as f:
+                cached = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return False, None
+        if cached.get("key") != key:
+            return False, None
+        return True, cached["output"]
+
+    def _save_cached(self, stage, key, output):
+        if not stage.cache:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._cache_path(stage.name)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"key": key, "output": output}, f)
+        os.replace(tmp_path, path)
+
+    def run(self, timings_path=None):
+        """
+        Executes all stages.
+
+        Returns:
+            dict: stage name -> output. Stages that failed, or whose upstream failed,
+                are absent; their errors are in `self.timings[name]['error']`.
+        """
+        outputs = {}
+        remaining = dict(self.stages)
+        running = {}
+        self.timings = {}
+
+        thread_pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        process_pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=mp.get_context("spawn"))
+        try:
+            while remaining or running:
+                # Drop stages whose upstream failed
+                for name, stage in list(remaining.items()):
+                    failed = [d for d in stage.deps if d in self.timings and d not in outputs]
+                    if failed:
+                        del remaining[name]
+                        self.timings[name] = {"seconds": 0.0, "cached": False,
+                                              "error": f"skipped: upstream {failed} failed"}
+                        print(f"Skipped stage {name} (upstream failed)")
+
+                # Start every stage whose dependencies are done
+                progressed = False
+                for name, stage in list(remaining.items()):
+                    if not all(d in outputs for d in stage.deps):
+                        continue
+                    del remaining[name]
+                    progressed = True
+                    inputs = [outputs[d] for d in stage.deps]
+                    key = self._stage_key(stage, inputs)
+                    hit, output = self._load_cached(stage, key)
+                    if hit:
+                        outputs[name] = output
+                        self.timings[name] = {"seconds": 0.0, "cached": True}
+                        print(f"Stage {name}: inputs unchanged, reusing cached output")
+                        continue
+                    print(f"Stage {name}: running")
+                    if stage.executor == "process":
+                        # Workers are spawned on submit and inherit the thread caps
+                        with thread_limits(self.threads_per_worker):
+                            future = process_pool.submit(stage.func, *inputs)
+                    else:
+                        future = thread_pool.submit(stage.func, *inputs)
+                    running[future] = (name, key, time.perf_counter())
+
+                if not running:
+                    if remaining and not progressed:
+                        raise ValueError(f"Dependency cycle among stages: {sorted(remaining)}")
+                    continue
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, key, started = running.pop(future)
+                    elapsed = time.perf_counter() - started
+                    try:
+                        output = future.result()
+                    except Exception:
+                        error = traceback.format_exc()
+                        self.timings[name] = {"seconds": elapsed, "cached": False, "error": error}
+                        print(f"Stage {name} failed after {elapsed:.1f}s:\n{error}")
+                        continue
+                    outputs[name] = output
+                    if isinstance(output, dict) and "error" in output:
+                        self.timings[name] = {"seconds": elapsed, "cached": False, "error": output["error"]}
+                        print(f"Stage {name} failed after {elapsed:.1f}s: {output['error']}")
+                        continue
+                    self.timings[name] = {"seconds": elapsed, "cached": False}
+                    self._save_cached(self.stages[name], key, output)
+                    print(f"Stage {name}: completed in {elapsed:.1f}s")
+        finally:
+            thread_pool.shutdown(wait=True)
+            process_pool.shutdown(wait=True)
+
+        if timings_path is not None:
+            os.makedirs(os.path.dirname(timings_path) or ".", exist_ok=True)
+            with open(timings_path, "w") as f:
+                json.dump(self.timings, f, indent=2)
+        return outputs
@@ -1,19 +1,22 @@
 import numpy as np
-from sklearn.metrics import mean_absolute_error, mean_squared_error
-from sklearn.metrics import mean_absolute_error, mean_squared_error
-import numpy as np
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.metrics import compute_metrics
+
 
 def train_test_split(data, test_size=0.2):
     split_idx = int(len(data) * (1 - test_size))
     return data[:split_idx], data[split_idx:]
 
 
-def evaluate_forecast(true, pred, model="Model"):
-    mae = mean_absolute_error(true, pred)
-    mse = mean_squared_error(true, pred)
-    rmse = np.sqrt(mse)
+def evaluate_forecast(true, pred, model="Model", verbose=False):
+    metrics = compute_metrics(np.asarray(true), np.asarray(pred))
+    mae, mse, rmse = (float(metrics[name]) for name in ("MAE", "MSE", "RMSE"))
 
-    print(f"{model} - MAE: {mae:.4f}, MSE: {mse:.4f}, RMSE: {rmse:.4f}")
+    if verbose:
+        print(f"{model} - MAE: {mae:.4f}, MSE: {mse:.4f}, RMSE: {rmse:.4f}")
 
     return {
         "Model": model,
@@ -21,4 +24,3 @@ def evaluate_forecast(true, pred, model="Model"):
         "MSE": mse,
         "RMSE": rmse
     }
-
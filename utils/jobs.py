@@ -0,0 +1,197 @@
+import json
+import multiprocessing as mp
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROJECT_ROOT)
+from evaluation.scheduler import THREAD_ENV_VARS
+
+DEFAULT_WORKSPACE_ROOT = os.path.join("outputs", "workspaces")
+JOB_FILE = "job.json"
+LOG_FILE = "job.log"
+
+
+def workspace_dir(key, root=DEFAULT_WORKSPACE_ROOT):
+    """Directory of the workspace for `key` (e.g. an upload hash), created on first use."""
+    path = os.path.abspath(os.path.join(root, key))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _init_worker(threads):
+    """Caps the native thread pools of a job worker before numpy/TensorFlow are imported."""
+    os.environ.update({var: str(threads) for var in THREAD_ENV_VARS})
+
+
+def run_evaluation(workspace, models, log_path, threads=None):
+    """
+    Fits the selected models and renders their plots inside a workspace.
+
+    Runs in a job worker process: the working directory becomes the workspace, so the
+    relative data/ and outputs/ paths resolve inside it, while the tuned LSTM config,
+    the order cache and the artifact store live under the project root and are shared
+    by all workspaces. Output, including that of the model workers, goes to `log_path`.
+    """
+    from evaluation import evaluate_models, plot_models
+
+    os.chdir(workspace)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved_fds = os.dup(1), os.dup(2)
+    with open(log_path, "w") as log:
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+        try:
+            evaluate_models.main(models=models, threads_per_worker=threads)
+            plot_models.main(models=models)
+        except Exception:
+            traceback.print_exc()
+            raise
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(saved_fds[0], 1)
+            os.dup2(saved_fds[1], 2)
+            for fd in saved_fds:
+                os.close(fd)
+
+
+class Job:
+    """Status of one background job; mirrored to <workspace>/job.json so it survives restarts."""
+
+    def __init__(self, workspace, key, status="queued"):
+        self.workspace = workspace
+        self.key = key
+        self.status = status
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.error = None
+
+    @property
+    def done(self):
+        return self.status in ("done", "failed")
+
+    @property
+    def log_path(self):
+        return os.path.join(self.workspace, LOG_FILE)
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in ("key", "status", "submitted", "started", "finished", "error")}
+
+    def save(self):
+        tmp_path = os.path.join(self.workspace, f"{JOB_FILE}.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp_path, os.path.join(self.workspace, JOB_FILE))
+
+    @classmethod
+    def load(cls, workspace):
+        try:
+            with open(os.path.join(workspace, JOB_FILE)) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return None
+        job = cls(workspace, saved["key"], saved["status"])
+        for k in ("submitted", "started", "finished", "error"):
+            setattr(job, k, saved.get(k))
+        return job
+
+
+class JobQueue:
+    """
+    Background queue running evaluation jobs, one workspace each.
+
+    Jobs call `run_evaluation` in a pool of long-lived worker processes, which keep
+    their imports between jobs. Each job runs with its workspace as working
+    directory, so concurrent jobs never touch each other's files. Submitting a job
+    that is already queued, running or finished for the same workspace and key
+    returns the existing job instead of starting another one.
+    """
+
+    def __init__(self, max_workers=1, threads_per_job=None):
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.threads_per_job = threads_per_job or max(1, (os.cpu_count() or 1) // max_workers)
+        self.pool = self._new_pool()
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=mp.get_context("spawn"),
+                                   initializer=_init_worker, initargs=(self.threads_per_job,))
+
+    def get(self, workspace):
+        """
+        The current job of a workspace (also one finished before a restart), or None.
+
+        A job saved as queued or running that this queue does not know about was
+        interrupted by a restart; it is marked failed, so it can be resubmitted.
+        """
+        with self.lock:
+            job = self.jobs.get(workspace)
+            if job is not None:
+                return job
+            job = Job.load(workspace)
+            if job is not None and not job.done:
+                job.status, job.error = "failed", "Interrupted by a server restart"
+                job.finished = time.time()
+                job.save()
+            return job
+
+    def submit(self, workspace, key, models):
+        """
+        Queues an evaluation of `models` in `workspace`.
+
+        Parameters:
+            workspace (str): Working directory of the job.
+            key (str): Identifies the work (e.g. the selected models); a finished job
+                with the same key is reused.
+            models (list): Models to fit and plot.
+
+        Returns:
+            Job
+        """
+        with self.lock:
+            current = self.jobs.get(workspace)
+            if current is not None and not current.done:
+                if current.key == key:
+                    return current
+                raise RuntimeError(f"A job is already running in {workspace}")
+            finished = current or Job.load(workspace)
+            if finished is not None and finished.status == "done" and finished.key == key:
+                return finished
+            job = Job(workspace, key)
+            job.save()
+            self.jobs[workspace] = job
+        self.executor.submit(self._run, job, models)
+        return job
+
+    def _run(self, job, models):
+        job.status, job.started = "running", time.time()
+        job.save()
+        pool = self.pool
+        try:
+            # Concurrent jobs share the cores through the per-job thread cap
+            pool.submit(run_evaluation, job.workspace, models, job.log_path, self.threads_per_job).result()
+            job.status = "done"
+        except BrokenProcessPool:
+            job.status, job.error = "failed", "The job worker process died"
+            with self.lock:
+                # Later jobs get fresh workers
+                if self.pool is pool:
+                    self.pool = self._new_pool()
+        except Exception as e:
+            job.status, job.error = "failed", f"{type(e).__name__}: {e}"
+        job.finished = time.time()
+        job.save()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.pool.shutdown(wait=False, cancel_futures=True)
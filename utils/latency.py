@@ -0,0 +1,61 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class LatencyRecorder:
+    """
+    Collects request latencies and reports percentiles and throughput.
+
+    Only the most recent `window` samples are kept, so memory stays bounded in
+    long-running services; the total count covers the whole lifetime.
+    """
+
+    def __init__(self, window=10_000):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+            self.count += 1
+
+    def time(self):
+        """Context manager recording the duration of its block."""
+        return _Timer(self)
+
+    def summary(self, percentiles=(50, 90, 99)):
+        """Returns count, throughput (per second since start) and latency percentiles in ms."""
+        with self._lock:
+            samples = np.fromiter(self.samples, dtype=np.float64, count=len(self.samples))
+            count = self.count
+        elapsed = time.perf_counter() - self.started
+        summary = {"count": count, "throughput": count / elapsed if elapsed > 0 else 0.0}
+        for p in percentiles:
+            summary[f"p{p}_ms"] = float(np.percentile(samples, p) * 1000) if len(samples) else None
+        return summary
+
+    def format(self):
+        summary = self.summary()
+        if not summary["count"]:
+            return "no requests"
+        return (f"{summary['count']} requests, {summary['throughput']:.1f}/s, "
+                f"p50 {summary['p50_ms']:.2f}ms, p90 {summary['p90_ms']:.2f}ms, p99 {summary['p99_ms']:.2f}ms")
+
+
+class _Timer:
+    def __init__(self, recorder):
+        self.recorder = recorder
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.started
+        self.recorder.record(self.elapsed)
+        return False
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+METRIC_NAMES = ("MAE", "MSE", "RMSE", "MAPE", "sMAPE", "MASE", "Directional Accuracy")
+
+
+def mase_scale(insample, season=1):
+    """
+    In-sample mean absolute error of the seasonal naive forecast, the MASE denominator.
+
+    Parameters:
+        insample (np.ndarray): Training values, shape (..., n_obs).
+        season (int): Seasonal period of the naive forecast (1 = random walk).
+
+    Returns:
+        np.ndarray: Scale of shape (...).
+    """
+    insample = np.asarray(insample, dtype=np.float64)
+    return np.abs(insample[..., season:] - insample[..., :-season]).mean(axis=-1)
+
+
+def compute_metrics(actual, forecast, scale=None, last_actual=None):
+    """
+    Computes all forecast metrics over the last axis in one pass over the errors.
+
+    Parameters:
+        actual (np.ndarray): True values, shape (..., horizon).
+        forecast (np.ndarray): Predictions, broadcastable to `actual`.
+        scale (np.ndarray or None): MASE denominator per series, shape (...), see
+            `mase_scale`. MASE is NaN when omitted.
+        last_actual (np.ndarray or None): Last observed value before each horizon, shape (...).
+            When given, the first step's direction counts towards directional accuracy.
+
+    Returns:
+        dict: metric name -> np.ndarray of shape (...). MAPE, sMAPE and directional
+            accuracy are percentages.
+    """
+    actual = np.asarray(actual, dtype=np.float64)
+    forecast = np.asarray(forecast, dtype=np.float64)
+    error = forecast - actual
+    abs_error = np.abs(error)
+
+    mae = abs_error.mean(axis=-1)
+    mse = np.mean(error * error, axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mape = 100.0 * np.mean(abs_error / np.abs(actual), axis=-1)
+        smape = 100.0 * np.mean(2.0 * abs_error / (np.abs(actual) + np.abs(forecast)), axis=-1)
+        mase = mae / np.asarray(scale, dtype=np.float64) if scale is not None else np.full_like(mae, np.nan)
+
+    # Direction of each step relative to the previous actual value
+    if last_actual is not None:
+        previous = np.concatenate([np.asarray(last_actual, dtype=np.float64)[..., np.newaxis],
+                                   actual[..., :-1]], axis=-1)
+    else:
+        previous = actual[..., :-1]
+        actual, forecast = actual[..., 1:], forecast[..., 1:]
+    with np.errstate(invalid="ignore"):
+        hits = np.sign(actual - previous) == np.sign(forecast - previous)
+        direction = 100.0 * hits.mean(axis=-1) if hits.shape[-1] else np.full_like(mae, np.nan)
+    direction = np.where(np.isnan(mae), np.nan, direction)
+
+    return {
+        "MAE": mae,
+        "MSE": mse,
+        "RMSE": np.sqrt(mse),
+        "MAPE": mape,
+        "sMAPE": smape,
+        "MASE": mase,
+        "Directional Accuracy": direction,
+    }
+
+
+def metrics_frame(actual, forecast, models=None, folds=None, scale=None, last_actual=None):
+    """
+    Evaluates a whole (models x folds x horizon) array of forecasts in one call.
+
+    Parameters:
+        actual (np.ndarray): True values, shape (folds, horizon) shared by all models,
+            or (models, folds, horizon).
+        forecast (np.ndarray): Predictions, shape (models, folds, horizon). NaN forecasts
+            (e.g. failed folds) yield NaN metrics.
+        models (list or None): Model labels; defaults to 0..n-1.
+        folds (list or None): Fold labels; defaults to 0..n-1.
+        scale (np.ndarray or None): MASE denominators, broadcastable to (models, folds).
+        last_actual (np.ndarray or None): Last observed values, broadcastable to (models, folds).
+
+    Returns:
+        pd.DataFrame: One row per (model, fold) with columns Model, Fold and METRIC_NAMES.
+    """
+    forecast = np.asarray(forecast, dtype=np.float64)
+    if forecast.ndim == 1:
+        forecast = forecast[np.newaxis, np.newaxis, :]
+    elif forecast.ndim == 2:
+        forecast = forecast[np.newaxis]
+    n_models, n_folds, _ = forecast.shape
+    metrics = compute_metrics(actual, forecast, scale=scale, last_actual=last_actual)
+
+    models = list(range(n_models)) if models is None else list(models)
+    folds = list(range(n_folds)) if folds is None else list(folds)
+    frame = pd.DataFrame({
+        "Model": np.repeat(np.asarray(models), n_folds),
+        "Fold": np.tile(np.asarray(folds), n_models),
+    })
+    for name in METRIC_NAMES:
+        frame[name] = np.broadcast_to(metrics[name], (n_models, n_folds)).reshape(-1)
+    return frame
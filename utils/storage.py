@@ -0,0 +1,142 @@
+import argparse
+import os
+import sys
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.tracing import traced
+
+CLEANED_DATA_PATH = "data/cleaned_data.parquet"
+CLEANED_DATA_CSV = "data/cleaned_data.csv"
+FORECAST_DIR = "outputs/forecasts"
+METRICS_PATH = os.path.join(FORECAST_DIR, "model_metrics.parquet")
+
+IPC_EXTENSIONS = (".arrow", ".feather", ".ipc")
+
+
+def _index_columns(schema):
+    """Names of the stored columns that hold the pandas index."""
+    metadata = schema.pandas_metadata or {}
+    return [c for c in metadata.get("index_columns", []) if isinstance(c, str)]
+
+
+@traced("io.write_table", category="io")
+def write_table(df, path):
+    """
+    Writes a DataFrame/Series to Parquet, Arrow IPC or CSV, chosen by file extension.
+
+    The index is preserved. Parquet and Arrow files are written atomically.
+    """
+    if isinstance(df, pd.Series):
+        df = df.to_frame()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if path.endswith(".csv"):
+        df.to_csv(path)
+        return
+
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if path.endswith(IPC_EXTENSIONS):
+        with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+
+
+@traced("io.read_table", category="io")
+def read_table(path, columns=None, memory_map=True):
+    """
+    Reads a table written by `write_table`, restoring its index.
+
+    Parameters:
+        path (str): .parquet, Arrow IPC (.arrow/.feather/.ipc) or .csv file.
+        columns (list or None): Only read these columns (the index is always included).
+        memory_map (bool): Memory-map Parquet/Arrow files instead of reading them into memory.
+            Arrow IPC files are then read zero-copy.
+
+    Returns:
+        pd.DataFrame
+    """
+    if path.endswith(".csv"):
+        df = pd.read_csv(path, index_col=0)
+        return df if columns is None else df[list(columns)]
+
+    if path.endswith(IPC_EXTENSIONS):
+        source = pa.memory_map(path, "r") if memory_map else pa.OSFile(path, "rb")
+        table = pa.ipc.open_file(source).read_all()
+        if columns is not None:
+            table = table.select(list(columns) + [c for c in _index_columns(table.schema) if c not in columns])
+    else:
+        table = pq.read_table(path, columns=columns, memory_map=memory_map, use_pandas_metadata=True)
+    return table.to_pandas()
+
+
+def import_csv(csv_path, path, parse_dates=("Date",), index_col="Date"):
+    """Converts a CSV file (e.g. the legacy cleaned_data.csv) to Parquet/Arrow."""
+    df = pd.read_csv(csv_path, parse_dates=list(parse_dates), index_col=index_col)
+    write_table(df, path)
+    return df
+
+
+def export_csv(path, csv_path):
+    """Writes a Parquet/Arrow table out as CSV."""
+    df = read_table(path)
+    df.to_csv(csv_path)
+    return df
+
+
+def forecast_path(name):
+    """Location of a model's saved forecast."""
+    return os.path.join(FORECAST_DIR, f"{name.lower()}_forecast.parquet")
+
+
+def load_forecast(name):
+    """Loads a model's saved forecast as a Series."""
+    return read_table(forecast_path(name))["Forecast"]
+
+
+def load_metrics():
+    """Loads the saved model metrics summary."""
+    return read_table(METRICS_PATH).reset_index(drop=True)
+
+
+def load_cleaned_data(columns=None, path=CLEANED_DATA_PATH, csv_path=CLEANED_DATA_CSV):
+    """
+    Loads the cleaned price data indexed by Date.
+
+    Reads the Parquet copy when it is up to date; otherwise (re-)imports the CSV
+    once, so CSV files dropped in by hand are still picked up.
+    """
+    csv_newer = os.path.exists(csv_path) and (
+        not os.path.exists(path) or os.path.getmtime(csv_path) > os.path.getmtime(path))
+    if csv_newer:
+        df = import_csv(csv_path, path)
+        return df if columns is None else df[list(columns)]
+    return read_table(path, columns=columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert between CSV and Parquet/Arrow tables.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="CSV -> Parquet/Arrow (Date column becomes the index).")
+    imp.add_argument("csv_path")
+    imp.add_argument("path")
+    exp = sub.add_parser("export", help="Parquet/Arrow -> CSV.")
+    exp.add_argument("path")
+    exp.add_argument("csv_path")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        import_csv(args.csv_path, args.path)
+        print(f"Imported {args.csv_path} -> {args.path}")
+    else:
+        export_csv(args.path, args.csv_path)
+        print(f"Exported {args.path} -> {args.csv_path}")
+
+
+if __name__ == "__main__":
+    main()
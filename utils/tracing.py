@@ -0,0 +1,258 @@
+import cProfile
+import functools
+import glob
+import json
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import threading
+import time
+
+# Spawned workers inherit these, so tracing follows the work into every process
+TRACE_DIR_ENV = "FORECAST_TRACE_DIR"
+TRACE_MEMORY_ENV = "FORECAST_TRACE_MEMORY"
+PROFILE_DIR_ENV = "FORECAST_PROFILE_DIR"
+
+
+class _NoopSpan:
+    """Returned by `span` when tracing is off; entering and leaving it does nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class _Tracer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.events = []
+        self.configure()
+
+    def configure(self):
+        self.trace_dir = os.environ.get(TRACE_DIR_ENV) or None
+        self.memory = os.environ.get(TRACE_MEMORY_ENV) == "1"
+        self.profile_dir = os.environ.get(PROFILE_DIR_ENV) or None
+        self.enabled = self.trace_dir is not None
+        self.named = False
+
+    def depth(self):
+        return getattr(self.local, "depth", 0)
+
+    def emit(self, event):
+        with self.lock:
+            if not self.named:
+                # Label the process in the trace viewer (scheduler workers are named after their task)
+                self.events.append({"name": "process_name", "ph": "M", "pid": os.getpid(),
+                                    "args": {"name": f"{mp.current_process().name} ({os.getpid()})"}})
+                self.named = True
+            self.events.append(event)
+
+    def flush(self):
+        """Appends buffered events to this process's event file."""
+        with self.lock:
+            events, self.events = self.events, []
+        if not events or self.trace_dir is None:
+            return
+        os.makedirs(self.trace_dir, exist_ok=True)
+        with open(os.path.join(self.trace_dir, f"events-{os.getpid()}.jsonl"), "a") as f:
+            for event in events:
+                f.write(json.dumps(event, default=str) + "\n")
+
+
+_tracer = _Tracer()
+
+
+def _rss_mb():
+    """
+    Current resident set size in MiB: from /proc, else psutil when installed, else the
+    peak from `resource`. None where none of them is available.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        pass
+    try:
+        # POSIX only
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+class _Span:
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def set(self, **args):
+        """Attaches extra fields (e.g. sizes known only inside the block) to the span."""
+        self.args.update(args)
+
+    def __enter__(self):
+        _tracer.local.depth = _tracer.depth() + 1
+        self.rss_before = _rss_mb() if _tracer.memory else None
+        self.wall_start = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        args = dict(self.args)
+        if exc_type is not None:
+            args["error"] = f"{exc_type.__name__}: {exc}"
+        pid, tid = os.getpid(), threading.get_native_id()
+        rss = _rss_mb() if _tracer.memory else None
+        if rss is not None and self.rss_before is not None:
+            args["rss_mb"] = round(rss, 1)
+            args["rss_delta_mb"] = round(rss - self.rss_before, 1)
+            _tracer.emit({"name": "memory", "ph": "C", "pid": pid, "tid": tid,
+                          "ts": (self.wall_start + duration) * 1e6, "args": {"rss_mb": rss}})
+        _tracer.emit({"name": self.name, "cat": self.category, "ph": "X", "pid": pid, "tid": tid,
+                      "ts": self.wall_start * 1e6, "dur": duration * 1e6, "args": args})
+        _tracer.local.depth -= 1
+        if _tracer.depth() == 0:
+            # Worker processes exit without running atexit hooks, so write as soon as
+            # the outermost span of a thread completes
+            _tracer.flush()
+        return False
+
+
+def is_enabled():
+    return _tracer.enabled
+
+
+def span(name, category="stage", **args):
+    """
+    Times a block as a trace event.
+
+    Usage:
+        with span("arima.fit", order=order):
+            ...
+
+    When tracing is disabled this returns a shared no-op context manager.
+    """
+    if not _tracer.enabled:
+        return _NOOP
+    return _Span(name, category, args)
+
+
+def traced(name=None, category="stage", profile=False):
+    """
+    Decorator wrapping every call of a function in a span.
+
+    With `profile=True` the call is also run under cProfile when profiling is
+    enabled, and the stats are dumped to <profile_dir>/<name>-<pid>.prof.
+    """
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _tracer.enabled and not (profile and _tracer.profile_dir):
+                return func(*args, **kwargs)
+            with span(span_name, category):
+                if profile and _tracer.profile_dir:
+                    return _profiled(span_name, func, args, kwargs)
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _profiled(name, func, args, kwargs):
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        os.makedirs(_tracer.profile_dir, exist_ok=True)
+        path = os.path.join(_tracer.profile_dir, f"{name}-{os.getpid()}.prof")
+        profiler.dump_stats(path)
+        print(f"Profile saved to {path} (inspect with: python -m pstats {path})")
+
+
+def enable_tracing(trace_dir, memory=False, profile_dir=None):
+    """
+    Turns tracing on for this process and for every process it starts afterwards.
+
+    Parameters:
+        trace_dir (str or None): Directory collecting the per-process event files. Cleared
+            first. None leaves span tracing off (e.g. to only profile).
+        memory (bool): Record RSS with each span and as a memory counter track.
+        profile_dir (str or None): Also cProfile each model run into this directory.
+    """
+    settings = {TRACE_DIR_ENV: trace_dir, TRACE_MEMORY_ENV: "1" if memory else None,
+                PROFILE_DIR_ENV: profile_dir}
+    if trace_dir:
+        shutil.rmtree(trace_dir, ignore_errors=True)
+    for var, value in settings.items():
+        if value:
+            os.environ[var] = value
+        else:
+            os.environ.pop(var, None)
+    _tracer.configure()
+
+
+def disable_tracing():
+    _tracer.flush()
+    for var in (TRACE_DIR_ENV, TRACE_MEMORY_ENV, PROFILE_DIR_ENV):
+        os.environ.pop(var, None)
+    _tracer.configure()
+
+
+def write_chrome_trace(output, trace_dir=None):
+    """
+    Merges the event files of all processes into one Chrome trace JSON file.
+
+    The file opens in chrome://tracing or https://ui.perfetto.dev.
+
+    Returns:
+        list: The merged events.
+    """
+    trace_dir = trace_dir or _tracer.trace_dir
+    _tracer.flush()
+    events = []
+    for path in sorted(glob.glob(os.path.join(trace_dir, "events-*.jsonl"))):
+        with open(path) as f:
+            events.extend(json.loads(line) for line in f if line.strip())
+    events.sort(key=lambda e: e.get("ts", 0))
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    return events
+
+
+def summarize_trace(events, top=15):
+    """Prints total time, call count and peak RSS per span name, slowest first."""
+    totals = {}
+    for event in events:
+        if event.get("ph") != "X":
+            continue
+        entry = totals.setdefault(event["name"], {"seconds": 0.0, "calls": 0, "rss_mb": None})
+        entry["seconds"] += event["dur"] / 1e6
+        entry["calls"] += 1
+        rss = event.get("args", {}).get("rss_mb")
+        if rss is not None:
+            entry["rss_mb"] = max(rss, entry["rss_mb"] or 0)
+    print("\nTrace summary (total time per span):")
+    for name, entry in sorted(totals.items(), key=lambda item: item[1]["seconds"], reverse=True)[:top]:
+        rss = f"  peak RSS {entry['rss_mb']:.0f} MB" if entry["rss_mb"] is not None else ""
+        print(f"    {entry['seconds']:9.2f}s  {entry['calls']:5d}x  {name}{rss}")
+    return totals